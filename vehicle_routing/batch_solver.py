@@ -0,0 +1,128 @@
+import os
+import time
+import importlib
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+# Caches shared by all instances solved in a worker process, set by initialize_worker
+WORKER_CACHES = {}
+
+
+def initialize_worker(module):
+
+    """Initializes a worker process by importing the solver module, and with it the heavy quantum and annealing
+    libraries, once per worker, and by creating the embedding and QAOA caches shared by all instances it solves.
+    Args:
+        module: Name of the module defining the solver class.
+    """
+
+    # Import solver module and caches
+    importlib.import_module(module)
+    from embedding_cache import EmbeddingCache
+    from qaoa_cache import QaoaCache
+
+    # Create worker caches
+    WORKER_CACHES['embedding_cache'] = EmbeddingCache()
+    WORKER_CACHES['qaoa_cache'] = QaoaCache()
+
+
+def solve_instance(index, solver_cls, args, solver_params, solve_params):
+
+    """Builds and solves a single instance and summarizes its result. Defined at module level so that it can be sent to
+    worker processes. Errors are recorded in the result instead of being raised, so that one failing instance does
+    not stop a batch. Times are in microseconds.
+    Args:
+        index: Position of the instance in the batch.
+        solver_cls: Solver class, e.g. FullQuboSolver.
+        args: Tuple of positional arguments of the solver class, e.g. (n, m, cost).
+        solver_params: Dictionary of parameters sent to the solver class.
+        solve_params: Dictionary of parameters sent to the backend solver.
+    Returns:
+        Dictionary containing the index, the routes of the selected solution or None if the formulation does not
+        support route decoding, its cost, whether it is feasible, the build and solve times, the timing dictionary of
+        the solver, the worker process id and the error if any.
+    """
+
+    # Initialization
+    result = {'index': index, 'routes': None, 'cost': None, 'feasible': None, 'build_time': None,
+              'solve_time': None, 'timing': None, 'pid': os.getpid(), 'error': None}
+    solver_params = {**WORKER_CACHES, **solver_params}
+
+    try:
+
+        # Build
+        clock = time.perf_counter_ns()
+        vrp = solver_cls(*args, **solver_params)
+        result['build_time'] = (time.perf_counter_ns() - clock) / 1e3
+
+        # Solve
+        clock = time.perf_counter_ns()
+        vrp.solve(**solve_params)
+        result['solve_time'] = (time.perf_counter_ns() - clock) / 1e3
+
+        # Summarize solution, with routes only for formulations that support route decoding
+        result['cost'] = float(vrp.evaluate_vrp_cost())
+        if vrp.sample_metrics is not None:
+            result['feasible'] = bool(vrp.sample_metrics['feasible'][vrp.sample_index])
+        result['timing'] = vrp.timing
+        result['routes'] = vrp.decode_solution_routes()
+
+    except Exception as error:
+        result['error'] = f'{type(error).__name__}: {error}'
+
+    # Return output
+    return result
+
+
+def solve_many(solver_cls, instances, backend='sa', workers=None, solver_params=None, solve_params=None,
+               max_pending=None):
+
+    """Builds and solves a batch of instances on a pool of worker processes and yields their results as they complete.
+    Every worker imports the solver libraries once and shares its embedding and QAOA caches across the instances it
+    solves. Instances are submitted lazily with at most max_pending instances in flight, so instances may be a
+    generator of a large batch.
+    Args:
+        solver_cls: Solver class, e.g. FullQuboSolver. Must be importable by the workers.
+        instances: Iterable of tuples of positional arguments of the solver class, e.g. (n, m, cost) or
+            (n, m, cost, capacity, demand).
+        backend: Backend solver. Defaults to 'sa'.
+        workers: No. of worker processes. Defaults to the number of CPU cores.
+        solver_params: Dictionary of parameters sent to the solver class of every instance. Defaults to {}.
+        solve_params: Dictionary of parameters sent to the backend solver of every instance. Defaults to {} with one
+            simulated annealing worker per instance, as the instances are already solved in parallel.
+        max_pending: Max no. of instances in flight. Defaults to 4 per worker.
+    Yields:
+        One result per instance in order of completion, as returned by solve_instance. The index of the instance in
+        the batch is stored in result['index'].
+    """
+
+    # Resolve parameters
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 4 * workers
+    solver_params = {**({} if solver_params is None else solver_params), 'solver': backend}
+    solve_params = {'workers': 1, **({} if solve_params is None else solve_params)}
+    instances = enumerate(instances)
+
+    # Solve instances with bounded submission
+    with ProcessPoolExecutor(max_workers=workers, initializer=initialize_worker,
+                             initargs=(solver_cls.__module__,)) as executor:
+        pending = set()
+        exhausted = False
+        while pending or not exhausted:
+
+            # Submit instances up to the bound
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    index, args = next(instances)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(solve_instance, index, solver_cls, tuple(args), solver_params,
+                                            solve_params))
+
+            # Stream completed results
+            if pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
@@ -0,0 +1,236 @@
+import os
+import csv
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import matplotlib
+
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from utility import generate_vrp_instance, generate_cvrp_instance
+from full_qubo_solver import FullQuboSolver, CapcFullQuboSolver
+from average_partition_solver import AveragePartitionSolver, CapcAveragePartitionSolver
+from solution_partition_solver import SolutionPartitionSolver, CapcSolutionPartitionSolver
+from route_activation_solver import RouteActivationSolver, CapcRouteActivationSolver
+from clustered_tsp_solver import ClusteredTspSolver, CapcClusteredTspSolver
+from qiskit_native_solver import QiskitNativeSolver
+
+
+# Solver classes by tag, with the capacity format of capacitated solvers - 'vector' for one capacity per vehicle and
+# 'scalar' for a single capacity shared by all vehicles, for which the smallest generated capacity is used
+SOLVERS = {'fqs': (FullQuboSolver, None),
+           'aps': (AveragePartitionSolver, None),
+           'sps': (SolutionPartitionSolver, None),
+           'ras': (RouteActivationSolver, None),
+           'cts': (ClusteredTspSolver, None),
+           'qns': (QiskitNativeSolver, None),
+           'capc_fqs': (CapcFullQuboSolver, 'vector'),
+           'capc_aps': (CapcAveragePartitionSolver, 'vector'),
+           'capc_sps': (CapcSolutionPartitionSolver, 'scalar'),
+           'capc_ras': (CapcRouteActivationSolver, 'scalar'),
+           'capc_cts': (CapcClusteredTspSolver, 'vector')}
+
+# Columns of the CSV output
+COLUMNS = ['solver', 'n', 'm', 'seed', 'backend', 'build_time', 'num_variables', 'num_interactions', 'bqm_nbytes',
+           'peak_memory', 'solve_time', 'feasibility_rate', 'feasible', 'route_cost', 'error']
+
+
+def run_benchmark(tag, n, m, seed=0, backend='sa', track_memory=True, solver_params=None, solve_params=None):
+
+    """Builds and solves a single random instance and records its metrics. Times are in microseconds.
+    Args:
+        tag: Key of the solver class in SOLVERS.
+        n: No. of clients.
+        m: No. of vehicles.
+        seed: Seed for the instance and the sampler. Defaults to 0.
+        backend: Backend solver, which should be a local sampler for reproducible results. Defaults to 'sa'.
+        track_memory: Set to False to skip measuring the peak memory of the build, which builds the instance a
+            second time under tracemalloc. Defaults to True.
+        solver_params: Dictionary of parameters sent to the solver class. Defaults to {}.
+        solve_params: Dictionary of parameters sent to the backend solver. Defaults to {}.
+    Returns:
+        Dictionary with one entry per column in COLUMNS.
+    """
+
+    # Initialization
+    solver_class, capacity_format = SOLVERS[tag]
+    solver_params = {'solver': backend, **({} if solver_params is None else solver_params)}
+    solve_params = {'seed': seed, **({} if solve_params is None else solve_params)}
+    if tag in ('cts', 'capc_cts'):
+        solver_params.setdefault('clustering_solver', 'kmedoids')
+        solver_params.setdefault('clustering_params', {'seed': seed})
+    record = dict.fromkeys(COLUMNS)
+    record.update({'solver': tag, 'n': n, 'm': m, 'seed': seed, 'backend': backend})
+
+    # Generate instance
+    if capacity_format is not None:
+        cost, _, _, capacity, demand = generate_cvrp_instance(n, m, seed)
+        capacity = int(capacity.min()) if capacity_format == 'scalar' else capacity
+        args = (n, m, cost, capacity, demand)
+    else:
+        cost, _, _ = generate_vrp_instance(n, seed)
+        args = (n, m, cost)
+
+    try:
+
+        # Build
+        vrp = solver_class(*args, **solver_params)
+        size = vrp.bqm_size()
+        record.update({'build_time': vrp.timing['qubo_build_time'], 'num_variables': size['num_variables'],
+                       'num_interactions': size['num_interactions'], 'bqm_nbytes': size['nbytes']})
+
+        # Measure peak memory of a second build
+        if track_memory:
+            tracemalloc.start()
+            solver_class(*args, **solver_params)
+            record['peak_memory'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        # Solve
+        clock = time.perf_counter_ns()
+        vrp.solve(**solve_params)
+        record['solve_time'] = (time.perf_counter_ns() - clock) / 1e3
+
+        # Evaluate solution
+        record['route_cost'] = float(vrp.evaluate_vrp_cost())
+        if vrp.sample_metrics is not None:
+            record['feasibility_rate'] = float(np.mean(vrp.sample_metrics['feasible']))
+            record['feasible'] = bool(vrp.sample_metrics['feasible'][vrp.sample_index])
+
+    except Exception as error:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        record['error'] = f'{type(error).__name__}: {error}'
+
+    # Return output
+    return record
+
+
+def sweep(tags, ns, ms, seeds=(0,), **params):
+
+    """Runs run_benchmark over all combinations of solvers, clients, vehicles and seeds, skipping instances with more
+    vehicles than clients.
+    Args:
+        tags: Keys of the solver classes in SOLVERS.
+        ns: No. of clients to sweep.
+        ms: No. of vehicles to sweep.
+        seeds: Seeds to sweep. Defaults to (0,).
+        params: Additional parameters sent to run_benchmark.
+    Yields:
+        One record per run.
+    """
+
+    # Sweep
+    for tag in tags:
+        for n in ns:
+            for m in ms:
+                if m > n:
+                    continue
+                for seed in seeds:
+                    yield run_benchmark(tag, n, m, seed, **params)
+
+
+def write_json(records, path):
+
+    """Writes records to a JSON file."""
+
+    with open(path, 'w') as file:
+        json.dump(records, file, indent=2)
+
+
+def write_csv(records, path):
+
+    """Writes records to a CSV file with the columns in COLUMNS."""
+
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def plot_complexity(records, directory):
+
+    """Plots the no. of BQM variables against the no. of clients, as one figure per solver with one line per no. of
+    vehicles saved as <solver>_complexity.png, and one figure comparing all solvers at the smallest no. of vehicles
+    saved as qubit_complexity.png.
+    Args:
+        records: Records returned by run_benchmark.
+        directory: Output directory.
+    """
+
+    # Initialization
+    os.makedirs(directory, exist_ok=True)
+    records = [record for record in records if record['num_variables'] is not None]
+    tags = list(dict.fromkeys(record['solver'] for record in records))
+
+    # Plot complexity per solver
+    for tag in tags:
+        plt.figure()
+        for m in sorted({record['m'] for record in records if record['solver'] == tag}):
+            points = sorted({(record['n'], record['num_variables']) for record in records
+                             if record['solver'] == tag and record['m'] == m})
+            plt.plot(*zip(*points), marker='o', label=f'{m} Vehicles')
+        plt.title(f'{tag.upper()} Complexity')
+        plt.xlabel('No. of Clients')
+        plt.ylabel('No. of Qubits')
+        plt.legend()
+        plt.grid(True)
+        plt.savefig(os.path.join(directory, f'{tag}_complexity.png'))
+        plt.close()
+
+    # Plot complexity of all solvers
+    if records:
+        m = min(record['m'] for record in records)
+        plt.figure()
+        for tag in tags:
+            points = sorted({(record['n'], record['num_variables']) for record in records
+                             if record['solver'] == tag and record['m'] == m})
+            plt.plot(*zip(*points), marker='o', label=tag.upper())
+        plt.title(f'Qubit Complexity - {m} Vehicles')
+        plt.xlabel('No. of Clients')
+        plt.ylabel('No. of Qubits')
+        plt.legend()
+        plt.grid(True)
+        plt.savefig(os.path.join(directory, 'qubit_complexity.png'))
+        plt.close()
+
+
+def main():
+
+    """Runs a benchmark sweep from the command line."""
+
+    # Parse arguments
+    parser = argparse.ArgumentParser(description='Benchmark VRP solvers on random instances with local samplers.')
+    parser.add_argument('--solvers', nargs='+', default=['fqs', 'aps', 'sps', 'ras', 'cts', 'qns'],
+                        choices=list(SOLVERS))
+    parser.add_argument('--n', nargs='+', type=int, default=[3, 4, 5, 6])
+    parser.add_argument('--m', nargs='+', type=int, default=[1, 2, 3])
+    parser.add_argument('--seeds', nargs='+', type=int, default=[0])
+    parser.add_argument('--backend', default='sa')
+    parser.add_argument('--num-reads', type=int, default=100)
+    parser.add_argument('--num-sweeps', type=int, default=1000)
+    parser.add_argument('--no-memory', action='store_true', help='Skip measuring peak build memory.')
+    parser.add_argument('--output', default='benchmark_results', help='Output directory.')
+    parser.add_argument('--plots', default=None, help='Directory for complexity plots. Defaults to the output.')
+    args = parser.parse_args()
+
+    # Run sweep
+    records = []
+    for record in sweep(args.solvers, args.n, args.m, args.seeds, backend=args.backend,
+                        track_memory=not args.no_memory, solver_params={'num_reads': args.num_reads},
+                        solve_params={'num_sweeps': args.num_sweeps}):
+        records.append(record)
+        print(', '.join(f'{key}={record[key]}' for key in COLUMNS if record[key] is not None))
+
+    # Write outputs
+    os.makedirs(args.output, exist_ok=True)
+    write_json(records, os.path.join(args.output, 'benchmark.json'))
+    write_csv(records, os.path.join(args.output, 'benchmark.csv'))
+    plot_complexity(records, args.output if args.plots is None else args.plots)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import os
+import hashlib
+import numpy as np
+
+from collections import OrderedDict
+
+
+class BuildCache:
+
+    """Cache of built quadratic structures keyed by a content hash of all solver inputs. Entries are dictionaries of
+    NumPy arrays as returned by VehicleRouter.export_build. Recently used entries are kept in memory with LRU eviction
+    and, if a directory is supplied, every entry is also stored on disk as a compressed .npz file so that it survives
+    restarts."""
+
+    def __init__(self, directory=None, max_size=32):
+
+        """Initializes the in-memory store and creates the on-disk store if required.
+        Args:
+            directory: Directory of the on-disk store. Defaults to None, which keeps entries in memory only.
+            max_size: Max no. of entries kept in memory. Defaults to 32.
+        """
+
+        # Store inputs
+        self.directory = directory
+        self.max_size = max_size
+
+        # Initialize stores
+        self.entries = OrderedDict()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(vrp):
+
+        """Evaluates the content hash of a solver instance from its class and the inputs returned by its build_inputs
+        function.
+        Args:
+            vrp: The VehicleRouter instance.
+        Returns:
+            The hash as a hexadecimal string.
+        """
+
+        # Hash class and inputs
+        digest = hashlib.sha256(f'{type(vrp).__module__}.{type(vrp).__qualname__}'.encode())
+        for value in vrp.build_inputs():
+            array = np.asarray(value)
+            if array.dtype.kind in 'biuf':
+                array = np.ascontiguousarray(array)
+                digest.update(f'|{array.dtype.str}{array.shape}|'.encode())
+                digest.update(array.tobytes())
+            else:
+                digest.update(f'|{value!r}|'.encode())
+
+        # Return output
+        return digest.hexdigest()
+
+    def path(self, key):
+
+        """Returns the path of the on-disk entry for the given key."""
+
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+
+        """Looks up an entry in memory and then on disk.
+        Args:
+            key: The fingerprint of the solver instance.
+        Returns:
+            The dictionary of arrays stored for the key, or None if the key is not cached.
+        """
+
+        # Look up in memory
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        # Look up on disk
+        if self.directory is None or not os.path.exists(self.path(key)):
+            return None
+        with np.load(self.path(key), allow_pickle=False) as archive:
+            data = {name: archive[name] for name in archive.files}
+
+        # Store in memory and return output
+        self.store(key, data)
+        return data
+
+    def put(self, key, data):
+
+        """Adds an entry in memory and on disk.
+        Args:
+            key: The fingerprint of the solver instance.
+            data: Dictionary of NumPy arrays to be cached.
+        """
+
+        # Store in memory
+        self.store(key, data)
+
+        # Store on disk, writing to a temporary file first so that readers never see partial entries
+        if self.directory is not None:
+            temporary = f'{self.path(key)}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as file:
+                np.savez_compressed(file, **data)
+            os.replace(temporary, self.path(key))
+
+    def store(self, key, data):
+
+        """Adds an entry in memory and evicts the least recently used entries beyond max_size."""
+
+        # Insert entry
+        self.entries[key] = data
+        self.entries.move_to_end(key)
+
+        # Evict entries
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+
+        """Removes all entries from memory and disk."""
+
+        # Clear stores
+        self.entries.clear()
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                if name.endswith('.npz'):
+                    os.remove(os.path.join(self.directory, name))
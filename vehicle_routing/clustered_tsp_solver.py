@@ -1,15 +1,15 @@
 import time
 import numpy as np
-import networkx as nx
-import matplotlib.pyplot as plt
 
 from itertools import product
 from collections import Counter
-from matplotlib.colors import rgb2hex
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from vehicle_routing import VehicleRouter
+from variable_registry import VariableRegistry
+from sparse_model import build_position_objective
 from node_clustering import NodeClustering
 from node_clustering import CapcNodeClustering
-from qiskit_optimization import QuadraticProgram
+from solution_partition_solver import SolutionPartitionSolver
 
 
 class ClusteredTspSolver(VehicleRouter):
@@ -18,24 +18,46 @@ class ClusteredTspSolver(VehicleRouter):
 
     def __init__(self, n_clients, n_vehicles, cost_matrix, **params):
 
-        """Initializes any required variables and calls init of super class."""
+        """Initializes any required variables and calls init of super class.
+        Args:
+            parallel_clusters: Set to True to solve the TSP of every cluster as an independent BQM on a pool of workers
+                instead of sampling the combined BQM. The cluster solutions are stitched into a single sample of the
+                combined problem. Defaults to False.
+            clustering_solver: Solver used for clustering, see NodeClustering. Defaults to 'dqm'.
+            clustering_params: Dictionary of parameters sent to the clustering solver, e.g. a seed. Defaults to {}.
+        """
 
         # Initialize cluster data
         self.cluster = None
         self.cluster_dict = None
 
+        # Extract parameters
+        self.parallel_clusters = params.setdefault('parallel_clusters', False)
+        self.clustering_solver = params.setdefault('clustering_solver', 'dqm')
+        self.clustering_params = params.setdefault('clustering_params', {})
+
         # Call parent initializer
         super().__init__(n_clients, n_vehicles, cost_matrix, **params)
 
+    def build_inputs(self):
+
+        """Extends the build inputs by the clustering solver and its parameters."""
+
+        return super().build_inputs() + [self.clustering_solver, sorted(self.clustering_params.items())]
+
     def build_clusters(self):
 
         """Sets up clusters for tsp solver."""
 
         # Cluster nodes and time execution
-        self.cluster = NodeClustering(self.n, self.m, self.cost[1:, 1:])
-        self.cluster.solve()
+        self.cluster = NodeClustering(self.n, self.m, self.cost[1:, 1:], solver=self.clustering_solver,
+                                      tracer=self.tracer)
+        clock = time.perf_counter_ns()
+        self.cluster.solve(**self.clustering_params)
+        self.timing['clustering_time'] = (time.perf_counter_ns() - clock) / 1e3
         self.cluster_dict = {i: [j + 1 for j in range(self.n) if self.cluster.solution[j] == i] for i in range(self.m)}
-        self.timing['clustering_time'] = self.cluster.result.info
+        self.timing['clustering_info'] = self.cluster.result.info
+        self.timing['clustering_dqm_size'] = self.cluster.dqm_size()
 
     def build_quadratic_program(self):
 
@@ -44,17 +66,17 @@ class ClusteredTspSolver(VehicleRouter):
 
         # Build clusters and reinitialize clock
         self.build_clusters()
-        self.clock = time.time()
+        self.clock = time.perf_counter_ns()
 
         # Initialization
+        from qiskit_optimization import QuadraticProgram
         self.qp = QuadraticProgram(name='Vehicle Routing Problem')
 
         # Designate variable names
-        self.variables = []
-        for i in range(self.m):
-            node_list = self.cluster_dict[i]
-            self.variables += [f'x.{i}.{j}.{k}' for k in range(1, len(node_list) + 1) for j in node_list]
-        self.variables = np.array(self.variables)
+        keys = [(i, j, k) for i in range(self.m) for k in range(1, len(self.cluster_dict[i]) + 1)
+                for j in self.cluster_dict[i]]
+        self.registry = VariableRegistry(keys, ('cluster', 'node', 'step'))
+        self.variables = self.registry.names()
 
         # Add variables to quadratic program
         for var in self.variables:
@@ -63,27 +85,33 @@ class ClusteredTspSolver(VehicleRouter):
         # Initialize objective function containers
         obj_linear_a = {}
         obj_linear_b = {}
+        obj_linear_c = {}
         obj_quadratic = {}
+        bonus = 0 if self.candidates is None else self.cost.max()
 
-        # Build objective function
+        # Build objective function, coupling consecutive steps along candidate edges only if selected
         for i in range(self.m):
 
             # Extract cluster
             node_list = self.cluster_dict[i]
-            edgelist = [(j, k) for j, k in product(node_list, repeat=2) if j != k]
+            edgelist = [(j, k) for j, k in product(node_list, repeat=2)
+                        if j != k and (self.candidates is None or self.candidates[j, k])]
 
             # Build quadratic terms
             for j, k in edgelist:
                 for t in range(1, len(node_list)):
-                    obj_quadratic[(f'x.{i}.{j}.{t}', f'x.{i}.{k}.{t + 1}')] = self.cost[j, k]
+                    obj_quadratic[(f'x.{i}.{j}.{t}', f'x.{i}.{k}.{t + 1}')] = self.cost[j, k] - bonus
 
             # Build linear terms
             for j in node_list:
                 obj_linear_a[f'x.{i}.{j}.{1}'] = self.cost[0, j]
                 obj_linear_b[f'x.{i}.{j}.{len(node_list)}'] = self.cost[j, 0]
+                if bonus:
+                    obj_linear_c.update({f'x.{i}.{j}.{t}': bonus for t in range(1, len(node_list))})
 
         # Add objective to quadratic program
-        self.qp.minimize(linear=dict(Counter(obj_linear_a) + Counter(obj_linear_b)), quadratic=obj_quadratic)
+        self.qp.minimize(linear=dict(Counter(obj_linear_a) + Counter(obj_linear_b) + Counter(obj_linear_c)),
+                         quadratic=obj_quadratic)
 
         # Add constraints - single delivery per client
         for i in range(self.m):
@@ -99,6 +127,135 @@ class ClusteredTspSolver(VehicleRouter):
                 constraint_linear = {f'x.{i}.{j}.{k}': 1 for j in node_list}
                 self.qp.linear_constraint(linear=constraint_linear, sense='==', rhs=1, name=f'single_location_{i}_{k}')
 
+    def build_objective(self):
+
+        """Builds the objective function for the current cost matrix over the existing variables, keeping the current
+        clusters.
+        Returns:
+            The linear objective coefficients as an array and the quadratic objective coefficients as a sparse matrix.
+        """
+
+        # Initialization
+        linear = np.zeros(len(self.registry))
+        quadratic = None
+
+        # Build objective per cluster
+        for i in range(self.m):
+            nodes = np.array(self.cluster_dict[i], dtype=int)
+            if len(nodes) == 0:
+                continue
+            index = self.registry.index(i, nodes[:, None], np.arange(1, len(nodes) + 1)[None, :])
+            cluster_linear, cluster_quadratic = build_position_objective(self.cost, index[None], nodes,
+                                                                         len(self.registry), self_loops=False,
+                                                                         candidates=self.candidates)
+            linear += cluster_linear
+            quadratic = cluster_quadratic if quadratic is None else quadratic + cluster_quadratic
+
+        # Return output
+        return linear, quadratic
+
+    def cluster_labels(self):
+
+        """Returns the cluster of every node excluding the depot as an array, derived from self.cluster_dict."""
+
+        # Invert cluster dictionary
+        labels = np.zeros(self.n, dtype=int)
+        for i, node_list in self.cluster_dict.items():
+            labels[np.array(node_list, dtype=int) - 1] = i
+
+        return labels
+
+    def export_build(self):
+
+        """Extends the exported build by the clusters, so that cached instances skip clustering."""
+
+        # Export build and clusters
+        data = super().export_build()
+        data['cluster_labels'] = self.cluster_labels()
+        return data
+
+    def import_build(self, data):
+
+        """Restores the build and the clusters without clustering again.
+        Args:
+            data: Dictionary of NumPy arrays returned by export_build.
+        """
+
+        # Restore build and clusters
+        super().import_build(data)
+        self.cluster = None
+        self.cluster_dict = {i: [j + 1 for j in range(self.n) if data['cluster_labels'][j] == i] for i in range(self.m)}
+
+    def solve(self, **params):
+
+        """Solve the QUBO using the selected solver. If self.parallel_clusters is set, the TSP of every cluster is
+        solved as an independent SPS subproblem with a single vehicle on a pool of workers, and the cluster routes are
+        stitched into a single sample of the combined problem stored in self.result. The timing dictionary of every
+        subproblem is stored in self.timing['cluster_timing'] and its spans are added to self.tracer.
+        Args:
+            params: Parameters to send to the selected backend solver. You may also specify the solver to select a
+                different solver and override the specified self.solver.
+            cluster_workers: Max no. of clusters solved concurrently. Defaults to the no. of clusters.
+            cluster_executor: Set to 'process' to solve clusters in separate processes or 'thread' to solve them in
+                threads of the current process, e.g. for remote backends. Defaults to 'process'.
+        """
+
+        # Solve combined problem
+        if not self.parallel_clusters:
+            super().solve(**params)
+            return
+
+        # Resolve parameters
+        params.setdefault('solver', self.solver)
+        self.reset_spans()
+        workers = params.setdefault('cluster_workers', None) or max(self.m, 1)
+        executor = params.setdefault('cluster_executor', 'process')
+        if executor == 'process':
+            params.setdefault('workers', 1)
+        elif executor != 'thread':
+            raise ValueError(f'Unknown cluster executor: {executor}.')
+
+        # Designate subproblem parameters
+        subproblem_params = {'constraint_penalty': self.penalty, 'chain_strength': self.chain_strength,
+                             'num_reads': self.num_reads, 'solver': params['solver'], 'build_qp': self.build_qp,
+                             'neighbors': self.neighbors}
+        clusters = [i for i in range(self.m) if len(self.cluster_dict[i]) > 0]
+
+        with self.tracer.span('solve', solver=params['solver'], clusters=len(clusters), executor=executor):
+
+            # Solve subproblems concurrently
+            clock = time.perf_counter_ns()
+            pool = ProcessPoolExecutor if executor == 'process' else ThreadPoolExecutor
+            with self.tracer.span('cluster_solve', workers=workers), pool(max_workers=workers) as pool:
+                futures = [pool.submit(solve_cluster, self.cluster_dict[i], self.cost, subproblem_params, params)
+                           for i in clusters]
+                results = [future.result() for future in futures]
+                for _, _, spans in results:
+                    self.tracer.extend(spans)
+            self.timing['cluster_solution_time'] = (time.perf_counter_ns() - clock) / 1e3
+            self.timing['cluster_timing'] = [timing for _, timing, _ in results]
+
+            # Stitch cluster solutions into a single sample
+            sample = np.zeros(len(self.registry), dtype=np.int8)
+            for i, (keys, _, _) in zip(clusters, results):
+                sample[self.registry.index(i, keys[:, 0], keys[:, 1])] = 1
+
+            # Evaluate stitched sample
+            import dimod
+            self.result = dimod.SampleSet.from_samples_bqm((sample[None], self.registry.names().tolist()), self.bqm)
+            self.extract_best_solution()
+
+    def decode_routes(self, samples=None):
+
+        """Decodes samples into routes using the array mappings in self.registry.
+        Args:
+            samples: Samples to decode, in any format accepted by resolve_samples. Defaults to self.solution.
+        Returns:
+            A list with one entry per sample, each a list with one array of visited nodes per cluster.
+        """
+
+        return self.registry.decode_routes(self.resolve_samples(samples), 'cluster', 'node', 'step')
+
     def visualize(self, xc=None, yc=None):
 
         """Visualizes solution.
@@ -107,6 +264,11 @@ class ClusteredTspSolver(VehicleRouter):
             yc: y coordinates of nodes. Defaults to random values.
         """
 
+        # Import plotting libraries
+        import networkx as nx
+        import matplotlib.pyplot as plt
+        from matplotlib.colors import rgb2hex
+
         # Resolve coordinates
         if xc is None:
             xc = (np.random.rand(self.n + 1) - 0.5) * 10
@@ -122,7 +284,7 @@ class ClusteredTspSolver(VehicleRouter):
         # Build graph
         G = nx.MultiDiGraph()
         G.add_nodes_from(range(self.n + 1))
-        node_colors = [rgb2hex(cmap(self.m))] + [rgb2hex(cmap(i)) for i in self.cluster.solution]
+        node_colors = [rgb2hex(cmap(self.m))] + [rgb2hex(cmap(i)) for i in self.cluster_labels()]
 
         # Plot nodes
         pos = {i: (xc[i], yc[i]) for i in range(self.n + 1)}
@@ -130,14 +292,11 @@ class ClusteredTspSolver(VehicleRouter):
         nx.draw_networkx_nodes(G, pos=pos, ax=ax, node_color=node_colors, node_size=500, alpha=0.8)
         nx.draw_networkx_labels(G, pos=pos, labels=labels, font_size=16)
 
-        # Evaluate active variables
-        active_vars = [self.variables[k] for k in range(len(self.variables)) if self.solution[k] == 1]
-
         # Loop over cars
-        for i in range(self.m):
+        for i, route in enumerate(self.decode_routes()[0]):
 
             # Get route
-            route = [int(var.split('.')[2]) for var in active_vars if int(var.split('.')[1]) == i]
+            route = route.tolist()
 
             # Plot edges
             edgelist = [(0, route[0])] + [(route[j], route[j + 1]) for j in range(len(route) - 1)] + [(route[-1], 0)]
@@ -149,27 +308,73 @@ class ClusteredTspSolver(VehicleRouter):
         plt.show()
 
 
+def solve_cluster(node_list, cost, subproblem_params, solve_params):
+
+    """Solves the TSP over a single cluster as an SPS subproblem with one vehicle. Defined at module level so that it
+    can be sent to worker processes.
+    Args:
+        node_list: List of nodes in the cluster, excluding the depot.
+        cost: Cost matrix of the complete problem.
+        subproblem_params: Parameters to initialize the SPS subproblem with.
+        solve_params: Parameters to send to the selected backend solver.
+    Returns:
+        An integer array of shape (k, 2) containing the (node, step) keys of the active variables of the solution in
+        terms of the nodes of the complete problem, the timing dictionary of the subproblem and the spans recorded by
+        its tracer.
+    """
+
+    # Build subproblem over the depot and the cluster nodes
+    nodes = np.array([0] + list(node_list), dtype=int)
+    tsp = SolutionPartitionSolver(len(node_list), 1, cost[np.ix_(nodes, nodes)], **subproblem_params)
+
+    # Solve subproblem
+    tsp.solve(**solve_params)
+
+    # Map active variables to nodes of the complete problem
+    active = tsp.solution.reshape(-1) > 0.5
+    keys = np.stack([nodes[tsp.registry.field('node')[active]], tsp.registry.field('step')[active]], axis=1)
+    return keys, tsp.timing, tsp.tracer.spans
+
+
 class CapcClusteredTspSolver(ClusteredTspSolver):
 
     """Capacitated CTS Solver implementation."""
 
     def __init__(self, n_clients, n_vehicles, cost_matrix, capacity, demand, **params):
 
-        """Initializes any required variables and calls init of super class."""
+        """Initializes any required variables and calls init of super class.
+        Args:
+            slack_encoding: Encoding of the capacity slack in the clustering DQM, see CapcNodeClustering. Defaults to
+                'unary'.
+        """
 
         # Store capacity data
         self.capacity = capacity
         self.demand = demand
 
+        # Extract parameters
+        self.slack_encoding = params.setdefault('slack_encoding', 'unary')
+
         # Call parent initializer
         super().__init__(n_clients, n_vehicles, cost_matrix, **params)
 
+    def build_inputs(self):
+
+        """Extends the build inputs by the capacity data."""
+
+        return super().build_inputs() + [self.capacity, self.demand, self.slack_encoding]
+
     def build_clusters(self):
 
         """Sets up capacitated clusters for tsp solver."""
 
         # Cluster nodes and time execution
-        self.cluster = CapcNodeClustering(self.n, self.m, self.cost[1:, 1:], self.capacity, self.demand)
-        self.cluster.solve()
+        self.cluster = CapcNodeClustering(self.n, self.m, self.cost[1:, 1:], self.capacity, self.demand,
+                                          solver=self.clustering_solver, slack_encoding=self.slack_encoding,
+                                          tracer=self.tracer)
+        clock = time.perf_counter_ns()
+        self.cluster.solve(**self.clustering_params)
+        self.timing['clustering_time'] = (time.perf_counter_ns() - clock) / 1e3
         self.cluster_dict = {i: [j + 1 for j in range(self.n) if self.cluster.solution[j] == i] for i in range(self.m)}
-        self.timing['clustering_time'] = self.cluster.result.info
+        self.timing['clustering_info'] = self.cluster.result.info
+        self.timing['clustering_dqm_size'] = self.cluster.dqm_size()
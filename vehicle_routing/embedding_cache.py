@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import hashlib
+import numpy as np
+
+
+class EmbeddingCache:
+
+    """Cache of minor embeddings keyed by a hash of the interaction graph of a BQM and of the target graph. Problems
+    with the same variables and interactions, e.g. FQS, APS and SPS instances with the same (n, m), share their
+    embedding, so minorminer only runs once per topology. Embeddings are kept in memory and, if a directory is
+    supplied, stored on disk as JSON files."""
+
+    def __init__(self, directory=None, **params):
+
+        """Initializes the in-memory store and creates the on-disk store if required.
+        Args:
+            directory: Directory of the on-disk store. Defaults to None, which keeps embeddings in memory only.
+            params: Additional parameters passed to minorminer.find_embedding, e.g. random_seed or timeout.
+        """
+
+        # Store inputs
+        self.directory = directory
+        self.params = params
+
+        # Initialize stores
+        self.embeddings = {}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+        # Initialize statistics
+        self.embedding_time = None
+        self.hit = None
+
+    @staticmethod
+    def source_edges(bqm):
+
+        """Returns the labels of a BQM in sorted order and its interactions as an integer array of shape (k, 2) of
+        positions in these labels, sorted lexicographically with the smaller position first."""
+
+        # Extract interactions in a canonical order
+        labels = sorted(bqm.variables, key=str)
+        _, (row, col, _), _ = bqm.to_numpy_vectors(variable_order=labels)
+        edges = np.stack([np.minimum(row, col), np.maximum(row, col)], axis=1).astype(np.int64)
+        return labels, edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+
+    @staticmethod
+    def target_edges(target):
+
+        """Returns the couplers of a target graph as a sorted integer array of shape (k, 2).
+        Args:
+            target: A networkx graph, e.g. from dwave_networkx.pegasus_graph, or an edge list such as
+                DWaveSampler().edgelist.
+        """
+
+        # Extract couplers in a canonical order
+        edges = np.array(list(target.edges) if hasattr(target, 'edges') else list(target), dtype=np.int64)
+        edges = np.sort(edges.reshape(-1, 2), axis=1)
+        return edges[np.lexsort((edges[:, 1], edges[:, 0]))]
+
+    def key(self, bqm, target):
+
+        """Evaluates the cache key of a BQM and a target graph.
+        Args:
+            bqm: The BQM to be embedded.
+            target: The target graph in any format accepted by target_edges.
+        Returns:
+            The key as a hexadecimal string.
+        """
+
+        # Hash source and target graphs
+        labels, edges = self.source_edges(bqm)
+        digest = hashlib.sha256(json.dumps([str(label) for label in labels]).encode())
+        digest.update(edges.tobytes())
+        digest.update(b'|')
+        digest.update(self.target_edges(target).tobytes())
+
+        # Return output
+        return digest.hexdigest()
+
+    def path(self, key):
+
+        """Returns the path of the on-disk embedding for the given key."""
+
+        return os.path.join(self.directory, f'{key}.json')
+
+    def get(self, bqm, target):
+
+        """Looks up the embedding of a BQM on a target graph in memory and then on disk, and runs minorminer if it is
+        not cached. The lookup time is stored in self.embedding_time and whether it was cached in self.hit.
+        Args:
+            bqm: The BQM to be embedded.
+            target: The target graph in any format accepted by target_edges.
+        Returns:
+            Dictionary mapping every variable of the BQM to its chain of target nodes.
+        Raises:
+            ValueError: If minorminer does not find an embedding.
+        """
+
+        # Begin stopwatch
+        clock = time.perf_counter_ns()
+        key = self.key(bqm, target)
+        self.hit = True
+
+        # Look up on disk
+        if key not in self.embeddings and self.directory is not None and os.path.exists(self.path(key)):
+            with open(self.path(key)) as file:
+                self.embeddings[key] = {label: chain for label, chain in json.load(file)}
+
+        # Find embedding
+        if key not in self.embeddings:
+            self.hit = False
+            self.embeddings[key] = self.find_embedding(bqm, target)
+            if self.directory is not None:
+                temporary = f'{self.path(key)}.{os.getpid()}.tmp'
+                with open(temporary, 'w') as file:
+                    json.dump([[label, chain] for label, chain in self.embeddings[key].items()], file)
+                os.replace(temporary, self.path(key))
+
+        # Record lookup time
+        self.embedding_time = (time.perf_counter_ns() - clock) / 1e3
+
+        # Map string labels back to the labels of the BQM
+        embedding = self.embeddings[key]
+        return {label: embedding[str(label)] for label in bqm.variables}
+
+    def find_embedding(self, bqm, target):
+
+        """Runs minorminer on the interaction graph of a BQM.
+        Args:
+            bqm: The BQM to be embedded.
+            target: The target graph in any format accepted by target_edges.
+        Returns:
+            Dictionary mapping the string label of every variable to its chain as a list of target nodes.
+        Raises:
+            ValueError: If minorminer does not find an embedding.
+        """
+
+        # Import embedding libraries
+        import minorminer
+        import networkx as nx
+
+        # Build source graph over label positions
+        labels, edges = self.source_edges(bqm)
+        source = nx.Graph()
+        source.add_nodes_from(range(len(labels)))
+        source.add_edges_from(edges.tolist())
+
+        # Find embedding
+        embedding = minorminer.find_embedding(source, self.target_edges(target).tolist(), **self.params)
+        if len(embedding) < len(labels):
+            raise ValueError('No embedding found for the BQM on the target graph.')
+
+        # Return output
+        return {str(labels[i]): [int(q) for q in chain] for i, chain in embedding.items()}
@@ -1,11 +1,10 @@
 import numpy as np
-import networkx as nx
-import matplotlib.pyplot as plt
 
 from collections import Counter
-from matplotlib.colors import rgb2hex
+from scipy.sparse import coo_matrix
 from vehicle_routing import VehicleRouter
-from qiskit_optimization import QuadraticProgram
+from sparse_model import build_position_model, build_position_objective, position_model_size
+from variable_registry import VariableRegistry
 
 
 class FullQuboSolver(VehicleRouter):
@@ -16,32 +15,64 @@ class FullQuboSolver(VehicleRouter):
 
         """Initializes any required variables and calls init of super class."""
 
+        # Extract parameters
+        self.vectorized = params.setdefault('vectorized', False)
+        params.setdefault('build_qp', not self.vectorized)
+
         # Call parent initializer
         super().__init__(n_clients, n_vehicles, cost_matrix, **params)
 
+    def build_inputs(self):
+
+        """Extends the build inputs by the build mode."""
+
+        return super().build_inputs() + [self.vectorized]
+
+    def estimate_size(self, dense=False):
+
+        """Estimates the size of the BQM from the no. of vehicles, clients and candidate edges, or all edges if dense
+        is set."""
+
+        edges = (self.n + 1) ** 2 if self.candidates is None or dense else int(self.candidates.sum())
+        return position_model_size(self.m, self.n, self.n, edges)
+
     def build_quadratic_program(self):
 
         """Builds the required quadratic program and sets the names of variables in self.variables."""
 
-        # Initialization
-        self.qp = QuadraticProgram(name='Vehicle Routing Problem')
-
         # Designate variable names
-        self.variables = np.array([[['x.{}.{}.{}'.format(i, j, k) for k in range(1, self.n + 1)]
-                                    for j in range(self.n + 1)] for i in range(1, self.m + 1)])
+        self.registry = VariableRegistry.from_product(('vehicle', 'node', 'step'), (range(1, self.m + 1),
+                                                                                   range(self.n + 1),
+                                                                                   range(1, self.n + 1)))
+        self.variables = self.registry.names().reshape(self.m, self.n + 1, self.n)
+
+        # Build index based model without per-term dictionaries
+        if self.vectorized:
+            self.model, _ = build_position_model(self.cost, self.m, self.n, self.n, self.candidates)
+            self.qp = self.model.to_quadratic_program(self.variables.reshape(-1)) if self.build_qp else None
+            return
+
+        # Initialize quadratic program
+        from qiskit_optimization import QuadraticProgram
+        self.qp = QuadraticProgram(name='Vehicle Routing Problem')
 
         # Add variables to quadratic program
         for var in self.variables.reshape(-1):
             self.qp.binary_var(name=var)
 
-        # Build objective function
+        # Build objective function, coupling consecutive steps along candidate edges only if selected
+        bonus = 0 if self.candidates is None else self.cost.max()
         obj_linear_a = {self.variables[m, n, 0]: self.cost[0, n] for m in range(self.m) for n in range(1, self.n + 1)}
         obj_linear_b = {self.variables[m, n, -1]: self.cost[n, 0] for m in range(self.m) for n in range(1, self.n + 1)}
-        obj_quadratic = {(self.variables[m, i, n], self.variables[m, j, n + 1]): self.cost[i, j] for m in range(self.m)
-                         for n in range(self.n - 1) for i in range(self.n + 1) for j in range(self.n + 1)}
+        obj_linear_c = {self.variables[m, i, n]: bonus for m in range(self.m) for n in range(self.n - 1)
+                        for i in range(self.n + 1)} if bonus else {}
+        obj_quadratic = {(self.variables[m, i, n], self.variables[m, j, n + 1]): self.cost[i, j] - bonus
+                         for m in range(self.m) for n in range(self.n - 1) for i in range(self.n + 1)
+                         for j in range(self.n + 1) if self.candidates is None or self.candidates[i, j]}
 
         # Add objective to quadratic program
-        self.qp.minimize(linear=dict(Counter(obj_linear_a) + Counter(obj_linear_b)), quadratic=obj_quadratic)
+        self.qp.minimize(linear=dict(Counter(obj_linear_a) + Counter(obj_linear_b) + Counter(obj_linear_c)),
+                         quadratic=obj_quadratic)
 
         # Add constraints - single delivery per client
         for k in range(1, self.n + 1):
@@ -55,6 +86,30 @@ class FullQuboSolver(VehicleRouter):
                 self.qp.linear_constraint(linear=constraint_linear, sense='==', rhs=1,
                                           name=f'single_location_{m + 1}_{n + 1}')
 
+    def build_objective(self):
+
+        """Builds the objective function for the current cost matrix over the existing variables.
+        Returns:
+            The linear objective coefficients as an array and the quadratic objective coefficients as a sparse matrix.
+        """
+
+        # Build objective
+        index = np.arange(self.variables.size).reshape(self.variables.shape)
+        return build_position_objective(self.cost, index, np.arange(self.n + 1), index.size,
+                                        candidates=self.candidates)
+
+    def decode_routes(self, samples=None):
+
+        """Decodes samples into routes using the array mappings in self.registry.
+        Args:
+            samples: Samples to decode, in any format accepted by resolve_samples. Defaults to self.solution.
+        Returns:
+            A list with one entry per sample, each a list with one array of visited nodes per vehicle. Steps spent at
+            the depot appear as node 0.
+        """
+
+        return self.registry.decode_routes(self.resolve_samples(samples), 'vehicle', 'node', 'step')
+
     def visualize(self, xc=None, yc=None):
 
         """Visualizes solution.
@@ -63,6 +118,11 @@ class FullQuboSolver(VehicleRouter):
             yc: y coordinates of nodes. Defaults to random values.
         """
 
+        # Import plotting libraries
+        import networkx as nx
+        import matplotlib.pyplot as plt
+        from matplotlib.colors import rgb2hex
+
         # Resolve coordinates
         if xc is None:
             xc = (np.random.rand(self.n + 1) - 0.5) * 10
@@ -86,13 +146,10 @@ class FullQuboSolver(VehicleRouter):
         nx.draw_networkx_labels(G, pos=pos, labels=labels, font_size=16)
 
         # Loop over cars
-        for i in range(self.solution.shape[0]):
+        for i, route in enumerate(self.decode_routes()[0]):
 
             # Get route
-            var_list = np.transpose(self.variables[i]).reshape(-1)
-            sol_list = np.transpose(self.solution[i]).reshape(-1)
-            active_vars = [var_list[k] for k in range(len(var_list)) if sol_list[k] == 1]
-            route = [int(var.split('.')[2]) for var in active_vars]
+            route = route.tolist()
 
             # Plot edges
             edgelist = [(0, route[0])] + [(route[j], route[j + 1]) for j in range(len(route) - 1)] + [(route[-1], 0)]
@@ -119,6 +176,12 @@ class CapcFullQuboSolver(FullQuboSolver):
         # Call parent initializer
         super().__init__(n_clients, n_vehicles, cost_matrix, **params)
 
+    def build_inputs(self):
+
+        """Extends the build inputs by the capacity data."""
+
+        return super().build_inputs() + [self.capacity, self.demand]
+
     def build_quadratic_program(self):
 
         """Builds the required quadratic program and sets the names of variables in self.variables."""
@@ -127,6 +190,15 @@ class CapcFullQuboSolver(FullQuboSolver):
         super().build_quadratic_program()
 
         # Add capacity constraints
-        for i in range(self.m):
-            constraint = {self.variables[i, j + 1, k]: self.demand[j] for j in range(self.n) for k in range(self.n)}
-            self.qp.linear_constraint(linear=constraint, sense='<=', rhs=self.capacity[i], name=f'capacity_{i}')
+        if self.qp is not None:
+            for i in range(self.m):
+                constraint = {self.variables[i, j + 1, k]: self.demand[j] for j in range(self.n) for k in range(self.n)}
+                self.qp.linear_constraint(linear=constraint, sense='<=', rhs=self.capacity[i], name=f'capacity_{i}')
+
+        # Mirror capacity constraints in index based model
+        if self.model is not None:
+            index = np.arange(self.variables.size).reshape(self.variables.shape)
+            rows = np.repeat(np.arange(self.m), self.n * index.shape[2])
+            values = np.tile(np.repeat(self.demand, index.shape[2]), self.m)
+            matrix = coo_matrix((values, (rows, index[:, 1:, :].reshape(-1))), shape=(self.m, index.size))
+            self.model.add_constraints(matrix, self.capacity, '<=', [f'capacity_{i}' for i in range(self.m)])
@@ -0,0 +1,169 @@
+import os
+import resource
+import tracemalloc
+
+from contextlib import contextmanager
+
+
+# Approximate bytes held per BQM interaction at the peak of a build, over all copies of the quadratic structures, for
+# builds with per-term dictionaries and a quadratic program and for index based builds without a quadratic program.
+# Measured as the tracemalloc peak of warm FullQuboSolver builds divided by the no. of interactions of estimate_size,
+# which gave about 300 and 180 bytes for n = 4, 240 and 115 bytes for n = 6, 240 and 100 bytes for n = 8 and 255 and
+# 95 bytes for n = 10 with m = 2 on CPython 3.11, see calibrate. The values leave a margin over these measurements, as
+# interpreters and library versions differ. Call calibrate to measure them on the running interpreter.
+BYTES_PER_INTERACTION = {'dict': 320, 'sparse': 140}
+
+
+def calibrate(n=8, m=2, seed=0, update=False):
+
+    """Measures the bytes held per BQM interaction at the peak of a build with tracemalloc, by building a random
+    FullQuboSolver instance with per-term dictionaries and a quadratic program and with the index based build.
+    Args:
+        n: No. of nodes of the probe instance. Defaults to 8.
+        m: No. of vehicles of the probe instance. Defaults to 2.
+        seed: Seed of the probe instance. Defaults to 0.
+        update: Set to True to store the measured values in BYTES_PER_INTERACTION. Defaults to False.
+    Returns:
+        Dictionary of the measured bytes per interaction with the keys of BYTES_PER_INTERACTION.
+    """
+
+    # Import solver here, as it depends on this module
+    from utility import generate_vrp_instance
+    from full_qubo_solver import FullQuboSolver
+
+    # Measure builds
+    cost, _, _ = generate_vrp_instance(n, seed)
+    measured = {}
+    for mode, vectorized in (('dict', False), ('sparse', True)):
+        params = {'vectorized': vectorized, 'build_qp': not vectorized}
+        FullQuboSolver(n, m, cost, **params)
+        monitor = MemoryMonitor(track=True)
+        with monitor.stage('build'):
+            vrp = FullQuboSolver(n, m, cost, **params)
+        num_interactions = max(vrp.estimate_size()['num_interactions'], 1)
+        measured[mode] = -(-monitor.stages['build']['traced_peak'] // num_interactions)
+
+    # Return output
+    if update:
+        BYTES_PER_INTERACTION.update(measured)
+    return measured
+
+
+class MemoryBudgetError(MemoryError):
+
+    """Raised if a build or solve stage would exceed the memory budget of a solver."""
+
+
+class MemoryMonitor:
+
+    """Accounts the memory of the build and solve stages of a solver and enforces an optional budget on the resident
+    set size of the process. Stages are measured with tracemalloc, which is started for the outermost stage if it is
+    not already tracing, and with the resident set size reported by the operating system. Every stage is stored in
+    self.stages as a dictionary of the traced peak and net allocations of the stage and the resident set size and its
+    change in bytes. Before Python 3.9, tracemalloc cannot reset its peak, so the traced peak of a stage is bounded by
+    the peak since tracing started."""
+
+    def __init__(self, max_memory=None, track=False):
+
+        """Initializes the stage store.
+        Args:
+            max_memory: Max resident set size of the process in bytes. Defaults to None, which sets no budget.
+            track: Set to True to account the memory of every stage. Defaults to False.
+        """
+
+        # Store inputs
+        self.max_memory = max_memory
+        self.track = track
+
+        # Initialize stores
+        self.stages = {}
+        self.stack = []
+
+    @staticmethod
+    def rss():
+
+        """Returns the current resident set size of the process in bytes, or the peak resident set size if the current
+        size is not available on this platform."""
+
+        # Read current size from procfs
+        try:
+            with open('/proc/self/statm') as file:
+                return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            pass
+
+        # Fall back to peak size, which is reported in kilobytes on Linux and in bytes on macOS
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if os.uname().sysname == 'Darwin' else usage * 1024
+
+    @contextmanager
+    def stage(self, name):
+
+        """Accounts the memory of the enclosed block in self.stages[name] if tracking is enabled, and checks the budget
+        after the block.
+        Args:
+            name: Name of the stage.
+        """
+
+        # Skip accounting
+        if not self.track:
+            yield
+            self.check(name)
+            return
+
+        # Start tracing and fold the peak of the enclosing stage
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.stack:
+            self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        record = {'current': current, 'peak': current, 'rss': self.rss()}
+        self.stack.append(record)
+
+        # Measure stage
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self.stack.pop()
+            if self.stack:
+                self.stack[-1]['peak'] = max(self.stack[-1]['peak'], peak)
+            if started:
+                tracemalloc.stop()
+            rss = self.rss()
+            self.stages[name] = {'traced_peak': max(record['peak'], peak) - record['current'],
+                                 'traced_delta': current - record['current'], 'rss': rss,
+                                 'rss_delta': rss - record['rss']}
+        self.check(name)
+
+    def check(self, name, estimate=0):
+
+        """Checks that the resident set size of the process plus an estimate of the memory a stage will allocate stays
+        within the budget.
+        Args:
+            name: Name of the stage, used in the error message.
+            estimate: Estimated no. of bytes the stage will allocate. Defaults to 0.
+        Raises:
+            MemoryBudgetError: If the budget would be exceeded.
+        """
+
+        # Skip check without budget
+        if self.max_memory is None:
+            return
+
+        # Check budget
+        rss = self.rss()
+        if rss + estimate > self.max_memory:
+            raise MemoryBudgetError(f'Stage {name} needs an estimated {rss + estimate} bytes ({rss} resident and '
+                                    f'{estimate} estimated), which exceeds the memory budget of {self.max_memory} '
+                                    f'bytes.')
+
+    def fits(self, estimate):
+
+        """Returns True if the resident set size of the process plus the estimated no. of bytes stays within the
+        budget."""
+
+        return self.max_memory is None or self.rss() + estimate <= self.max_memory
@@ -1,24 +1,25 @@
+import time
 import numpy as np
-import networkx as nx
-import matplotlib.pyplot as plt
-import dimod
 
-from itertools import combinations
-from matplotlib.colors import rgb2hex
-from dwave.system import LeapHybridDQMSampler
+from scipy import sparse
+from tracer import Tracer
 
 
 class NodeClustering:
 
     """Class for performing node clustering using multilevel maxcut performed via Leap Hybrid DQM Sampler."""
 
-    def __init__(self, n_nodes, n_clusters, cost_matrix):
+    def __init__(self, n_nodes, n_clusters, cost_matrix, **params):
 
         """Initializes the required variables and stores inputs.
         Args:
             n_nodes: No. of nodes.
             n_clusters: No. of clusters.
             cost_matrix: n x n matrix describing the cost of moving from node i to node j.
+            solver: Select a solver. Use 'dqm' for the Leap Hybrid DQM Sampler, 'sa' for local simulated annealing
+                over the cases of the DQM or 'kmedoids' for capacitated k-medoids clustering. Defaults to 'dqm'.
+            tracer: A Tracer instance recording timing spans of the DQM build and the clustering. Defaults to a new
+                tracer per instance.
         """
 
         # Store critical inputs
@@ -26,6 +27,10 @@ class NodeClustering:
         self.k = n_clusters
         self.c = cost_matrix
 
+        # Extract parameters
+        self.solver = params.setdefault('solver', 'dqm')
+        self.tracer = params.setdefault('tracer', None) or Tracer()
+
         # Initialize quadratic structures
         self.dqm = None
         self.variables = None
@@ -39,25 +44,67 @@ class NodeClustering:
 
     def rebuild(self):
 
-        """Builds DQM for multi level maxcut."""
+        """Builds DQM for multi level maxcut from the arrays of case biases returned by build_vectors."""
 
         # Set variables
         self.variables = np.array([f'x.{i}' for i in range(self.n)])
 
-        # Initialize DQM
-        self.dqm = dimod.DiscreteQuadraticModel()
-        for var in self.variables:
-            self.dqm.add_variable(self.k, label=var)
+        # Build DQM
+        import dimod
+        with self.tracer.span('dqm_build') as span:
+            starts, linear, quadratic, labels, offset = self.build_vectors()
+            self.dqm = dimod.DiscreteQuadraticModel.from_numpy_vectors(starts, linear, quadratic, labels, offset)
+            span.update(self.dqm_size())
+
+    def build_vectors(self):
+
+        """Builds the case biases of the multilevel maxcut DQM as NumPy arrays. Case p of node i has the index
+        i * k + p, and cases p of nodes i < j interact with bias c[i, j] + c[j, i].
+        Returns:
+            A 5-tuple containing the case starts of all variables, the linear biases of all cases, a 3-tuple of row
+            indices, column indices and biases of the case interactions, the list of variable labels and the offset.
+        """
+
+        # Evaluate interactions between equal cases of all node pairs
+        cost = np.asarray(self.c, dtype=float)
+        i, j = np.triu_indices(self.n, k=1)
+        cases = np.arange(self.k)
+        rows = (j[:, None] * self.k + cases).reshape(-1)
+        cols = (i[:, None] * self.k + cases).reshape(-1)
+        biases = np.repeat(cost[i, j] + cost[j, i], self.k)
+
+        # Return output
+        return np.arange(self.n) * self.k, np.zeros(self.n * self.k), (rows, cols, biases), list(self.variables), 0
+
+    def solve(self, **params):
 
-        # Set DQM biases
-        for i, j in combinations(range(self.n), r=2):
-            bias = {(p, p): self.c[i, j] + self.c[j, i] for p in range(self.k)}
-            self.dqm.set_quadratic(f'x.{i}', f'x.{j}', bias)
+        """Solves DQM using the selected solver.
+        Args:
+            params: Parameters to send to the selected solver. You may also specify the solver to select a different
+                solver and override the specified self.solver.
+        """
+
+        # Resolve solver
+        solver = params.setdefault('solver', self.solver)
+
+        # Solve
+        with self.tracer.span('clustering', solver=solver, nodes=self.n, clusters=self.k):
+            if solver == 'dqm':
+                self.solve_dqm(**params)
+            elif solver == 'sa':
+                self.solve_sa(**params)
+            elif solver == 'kmedoids':
+                self.solve_kmedoids(**params)
+            else:
+                raise ValueError(f'Unknown clustering solver: {solver}.')
 
-    def solve(self):
+    def solve_dqm(self, **params):
 
         """Solves DQM using Leap Hybrid DQM Sampler."""
 
+        # Import sampler
+        from dwave.system import LeapHybridDQMSampler
+
         # Solve DQM
         sampler = LeapHybridDQMSampler()
         self.result = sampler.sample_dqm(self.dqm)
@@ -66,6 +113,208 @@ class NodeClustering:
         result_dict = self.result.first.sample
         self.solution = np.array([result_dict[var] for var in self.variables])
 
+    def solve_sa(self, **params):
+
+        """Solves DQM locally by simulated annealing over the cases of the DQM, updating all reads at once. Every
+        variable is resampled from its conditional Boltzmann distribution (heat bath) under a geometric schedule of
+        inverse temperatures, after which a greedy descent moves every variable to its best case until no move
+        improves the energy.
+        Args:
+            params:
+                num_reads: No. of independent reads. Defaults to 10.
+                num_sweeps: No. of annealing sweeps over all variables. Defaults to 200.
+                seed: Seed value for the random number generator. Defaults to None.
+        """
+
+        # Extract parameters
+        num_reads = params.setdefault('num_reads', 10)
+        num_sweeps = params.setdefault('num_sweeps', 200)
+        rng = np.random.default_rng(params.setdefault('seed', None))
+
+        # Begin stopwatch
+        clock = time.perf_counter_ns()
+
+        # Extract case biases
+        starts, linear, (row, col, quadratic), labels, _ = self.dqm.to_numpy_vectors(return_offset=True)
+        num_cases = len(linear)
+        sizes = np.diff(np.append(starts, num_cases))
+        interactions = sparse.coo_matrix((quadratic, (row, col)), shape=(num_cases, num_cases)).tocsr()
+        interactions = (interactions + interactions.T).tocsr()
+        magnitude = np.abs(linear) + np.asarray(abs(interactions).sum(axis=1)).reshape(-1)
+        if num_cases <= 4096:
+            interactions = interactions.toarray()
+
+        # Evaluate schedule of inverse temperatures from the range of energy changes
+        biases = np.abs(np.concatenate([linear, quadratic]))
+        biases = biases[biases > 0]
+        if len(biases) == 0:
+            betas = np.ones(num_sweeps)
+        else:
+            betas = np.geomspace(np.log(2) / magnitude.max(), np.log(100) / biases.min(), num_sweeps)
+
+        # Initialize random cases and the field of the active cases on every case
+        active = starts + (rng.random((num_reads, len(starts))) * sizes).astype(int)
+        indicator = sparse.csr_matrix((np.ones(active.size), (np.repeat(np.arange(num_reads), len(starts)),
+                                                               active.reshape(-1))), shape=(num_reads, num_cases))
+        field = np.asarray(indicator @ interactions)
+
+        # Anneal and then descend greedily until no variable changes
+        changes = 1
+        for beta in np.append(betas, np.full(max(num_sweeps, 1), np.inf)):
+            if beta == np.inf and changes == 0:
+                break
+            changes = 0
+            for v in range(len(starts)):
+
+                # Evaluate energies of the cases of variable v
+                energy = linear[starts[v]:starts[v] + sizes[v]] + field[:, starts[v]:starts[v] + sizes[v]]
+
+                # Sample new cases
+                if beta == np.inf:
+                    choice = np.argmin(energy, axis=1)
+                    choice = np.where(energy[np.arange(num_reads), choice] <
+                                      energy[np.arange(num_reads), active[:, v] - starts[v]],
+                                      choice, active[:, v] - starts[v])
+                else:
+                    weights = np.exp(-beta * (energy - energy.min(axis=1, keepdims=True))).cumsum(axis=1)
+                    choice = (weights < rng.random((num_reads, 1)) * weights[:, -1:]).sum(axis=1)
+
+                # Update field of changed reads
+                new = starts[v] + choice
+                changed = np.flatnonzero(new != active[:, v])
+                if len(changed):
+                    delta = interactions[new[changed]] - interactions[active[changed, v]]
+                    field[changed] += delta.toarray() if sparse.issparse(delta) else delta
+                    active[changed, v] = new[changed]
+                    changes += len(changed)
+
+        # Store results
+        self.store_result(active - starts, list(labels), clock)
+
+    def solve_kmedoids(self, **params):
+
+        """Solves the clustering problem classically by capacitated k-medoids on the symmetrized cost matrix. Medoids
+        are initialized by farthest first traversal. Nodes are then assigned in order of decreasing regret to the
+        nearest medoid with sufficient remaining capacity, and every medoid is moved to the member with the lowest
+        total cost to its cluster, until the assignment no longer changes.
+        Args:
+            params:
+                max_iter: Max no. of assignment and update steps. Defaults to 100.
+                seed: Seed value for the random choice of the first medoid. Defaults to None.
+        """
+
+        # Extract parameters
+        max_iter = params.setdefault('max_iter', 100)
+        rng = np.random.default_rng(params.setdefault('seed', None))
+
+        # Begin stopwatch
+        clock = time.perf_counter_ns()
+        distance = np.asarray(self.c, dtype=float)
+        distance = distance + distance.T
+        capacity, value = self.cluster_capacity()
+
+        # Initialize medoids by farthest first traversal
+        medoids = [int(rng.integers(self.n))]
+        for _ in range(1, self.k):
+            medoids.append(int(np.argmax(distance[:, medoids].min(axis=1))))
+        medoids = np.array(medoids)
+
+        # Alternate assignment and medoid updates
+        solution = None
+        for _ in range(max_iter):
+
+            # Assign nodes
+            assignment = self.assign_medoids(distance[:, medoids], capacity, value)
+            if solution is not None and (assignment == solution).all():
+                break
+            solution = assignment
+
+            # Update medoids
+            for i in range(self.k):
+                members = np.flatnonzero(solution == i)
+                if len(members):
+                    medoids[i] = members[np.argmin(distance[np.ix_(members, members)].sum(axis=1))]
+
+        # Store results
+        samples, labels = self.sample_cases(solution)
+        self.store_result(samples, labels, clock)
+
+    @staticmethod
+    def assign_medoids(distance, capacity, value):
+
+        """Assigns nodes to medoids under capacity limits.
+        Args:
+            distance: n x k array of costs between nodes and medoids.
+            capacity: Array of cluster capacities.
+            value: Array of node values.
+        Returns:
+            Array of the assigned cluster of every node.
+        """
+
+        # Assign nodes to the nearest medoid if there are no capacity limits
+        if np.isinf(capacity).all():
+            return np.argmin(distance, axis=1)
+
+        # Order nodes by decreasing regret of missing the nearest medoid
+        ordered = np.sort(distance, axis=1)
+        regret = ordered[:, 1] - ordered[:, 0] if distance.shape[1] > 1 else np.zeros(len(distance))
+        remaining = np.array(capacity, dtype=float)
+        solution = np.zeros(len(distance), dtype=int)
+
+        # Assign nodes to the nearest medoid with sufficient capacity, or the emptiest cluster if none fits
+        for j in np.argsort(-regret, kind='stable'):
+            fits = remaining >= value[j]
+            i = int(np.argmin(np.where(fits, distance[j], np.inf))) if fits.any() else int(np.argmax(remaining))
+            solution[j] = i
+            remaining[i] -= value[j]
+
+        # Return output
+        return solution
+
+    def cluster_capacity(self):
+
+        """Returns the cluster capacities and the node values used by the k-medoids solver. Clusters are unlimited."""
+
+        return np.full(self.k, np.inf), np.zeros(self.n)
+
+    def sample_cases(self, solution):
+
+        """Converts an array of clusters per node into a sample over all variables of the DQM.
+        Args:
+            solution: Array of the cluster of every node.
+        Returns:
+            An array of cases with shape (1, num_variables) and the list of variable labels.
+        """
+
+        return np.asarray(solution)[None], list(self.variables)
+
+    def dqm_size(self):
+
+        """Returns the size of the DQM as a dictionary containing the no. of variables, cases and case interactions."""
+
+        return {'num_variables': self.dqm.num_variables(), 'num_cases': self.dqm.num_cases(),
+                'num_case_interactions': self.dqm.num_case_interactions()}
+
+    def store_result(self, samples, labels, clock):
+
+        """Stores samples of DQM cases as a sampleset in self.result, with the run time in microseconds in its info
+        like the Leap Hybrid DQM Sampler, and extracts the lowest energy sample into self.solution.
+        Args:
+            samples: Array of cases with shape (num_samples, num_variables).
+            labels: List of variable labels.
+            clock: Start time of the solver from time.perf_counter_ns.
+        """
+
+        # Build sampleset
+        import dimod
+        energies = self.dqm.energies((samples, labels))
+        info = {'run_time': (time.perf_counter_ns() - clock) / 1e3}
+        self.result = dimod.SampleSet.from_samples((samples, labels), 'DISCRETE', energies, info=info)
+
+        # Extract solution
+        result_dict = self.result.first.sample
+        self.solution = np.array([result_dict[var] for var in self.variables])
+
     def visualize(self, xc=None, yc=None):
 
         """Visualizes output as nodes coloured according to their assigned cluster.
@@ -74,6 +323,11 @@ class NodeClustering:
             yc: y coordinates of nodes. Defaults to random values.
         """
 
+        # Import plotting libraries
+        import networkx as nx
+        import matplotlib.pyplot as plt
+        from matplotlib.colors import rgb2hex
+
         # Resolve coordinates
         if xc is None:
             xc = (np.random.rand(self.n + 1) - 0.5) * 10
@@ -117,6 +371,10 @@ class CapcNodeClustering(NodeClustering):
             capacity: List of cluster capacities.
             value: List of node values.
             penalty: Lagrange multiplier for capacity constraints.
+            solver: Select a solver as in NodeClustering. Defaults to 'dqm'.
+            slack_encoding: Encoding of the capacity slack of every cluster. Use 'unary' for a single slack variable
+                with capacity[i] cases, or 'binary' for floor(log2(capacity[i])) + 1 slack variables with two cases
+                each, so that the DQM size grows with log(capacity). Defaults to 'unary'.
         """
 
         # Store capacity data
@@ -125,24 +383,137 @@ class CapcNodeClustering(NodeClustering):
 
         # Store parameters
         self.penalty = params.setdefault('penalty', 1e5)
+        self.slack_encoding = params.setdefault('slack_encoding', 'unary')
+        if self.slack_encoding not in ('unary', 'binary'):
+            raise ValueError(f'Unknown slack encoding: {self.slack_encoding}.')
 
         # Call parent initializer
-        super().__init__(n_nodes, n_clusters, cost_matrix)
+        super().__init__(n_nodes, n_clusters, cost_matrix, **params)
 
-    def rebuild(self):
+    def build_vectors(self):
+
+        """Builds the case biases of the capacitated multilevel maxcut DQM as NumPy arrays. Every cluster i has slack
+        variables as returned by slack_values, and the capacity constraint of cluster i,
+        sum_j value[j] * x[j, i] + slack[i] - capacity[i] = 0, is expanded into penalty terms over the cases.
+        Returns:
+            A 5-tuple in the format returned by NodeClustering.build_vectors.
+        """
 
-        """Builds DQM for capacitated multi level maxcut."""
+        # Build multilevel maxcut biases
+        starts, linear, (rows, cols, biases), labels, offset = super().build_vectors()
+        value = np.asarray(self.value, dtype=float)
+        capacity = np.asarray(self.capacity, dtype=int)
 
-        # Build multilevel maxcut DQM
-        super().rebuild()
+        # Add capacity constraints - node terms
+        i, j = np.triu_indices(self.n, k=1)
+        biases = biases + np.repeat(2 * self.penalty * value[i] * value[j], self.k)
+        linear = linear + self.penalty * (value[:, None] ** 2 - 2 * value[:, None] * capacity[None, :]).reshape(-1)
 
         # Add capacity slack variables
-        for i in range(self.k):
-            self.dqm.add_variable(self.capacity[i], label=f'c.{i}')
-
-        # Add capacity constraints
-        for i in range(self.k):
-            terms = [(f'x.{j}', i, self.value[j]) for j in range(self.n)]
-            terms += [(f'c.{i}', j, j) for j in range(self.capacity[i])]
-            constant = -self.capacity[i]
-            self.dqm.add_linear_equality_constraint(terms, self.penalty, constant)
+        slack_values = self.slack_values()
+        slack_sizes = np.array([len(values) for cluster in slack_values for values in cluster], dtype=int)
+        slack_value = np.concatenate([values for cluster in slack_values for values in cluster])
+        slack_cluster = np.repeat(np.repeat(np.arange(self.k), [len(cluster) for cluster in slack_values]), slack_sizes)
+        slack_variable = np.repeat(np.arange(len(slack_sizes)), slack_sizes)
+        slack_starts = np.concatenate([[0], np.cumsum(slack_sizes)[:-1]]).astype(int)
+        slack_linear = self.penalty * (slack_value ** 2 - 2 * slack_value * capacity[slack_cluster])
+
+        # Add capacity constraints - interactions between node cases and slack cases
+        slack_rows = [np.repeat(self.n * self.k + np.arange(len(slack_value)), self.n)]
+        slack_cols = [np.tile(np.arange(self.n), len(slack_value)) * self.k + np.repeat(slack_cluster, self.n)]
+        slack_biases = [2 * self.penalty * np.tile(value, len(slack_value)) * np.repeat(slack_value, self.n)]
+
+        # Add capacity constraints - interactions between cases of different slack variables of a cluster
+        for cluster in range(self.k):
+            if len(slack_values[cluster]) < 2:
+                continue
+            cases = np.flatnonzero(slack_cluster == cluster)
+            a, b = np.triu_indices(len(cases), k=1)
+            a, b = cases[a], cases[b]
+            mask = slack_variable[a] != slack_variable[b]
+            slack_rows.append(self.n * self.k + b[mask])
+            slack_cols.append(self.n * self.k + a[mask])
+            slack_biases.append(2 * self.penalty * slack_value[a[mask]] * slack_value[b[mask]])
+
+        # Return output
+        return (np.concatenate([starts, self.n * self.k + slack_starts]), np.concatenate([linear, slack_linear]),
+                (np.concatenate([rows] + slack_rows), np.concatenate([cols] + slack_cols),
+                 np.concatenate([biases] + slack_biases)),
+                labels + self.slack_labels(), offset + self.penalty * (capacity ** 2).sum())
+
+    def slack_values(self):
+
+        """Returns the values of the cases of the capacity slack variables as a list with one entry per cluster, each a
+        list with one array of case values per slack variable. The unary encoding has a single variable with cases
+        0 to capacity[i] - 1. The binary encoding has two-case variables with values 0 and 1, 2, 4, ..., and a last
+        weight chosen so that the slack covers exactly 0 to capacity[i]."""
+
+        # Evaluate case values per cluster
+        slack_values = []
+        for capacity in np.asarray(self.capacity, dtype=int):
+            if self.slack_encoding == 'unary':
+                slack_values.append([np.arange(capacity)])
+            else:
+                weights = 2 ** np.arange(max(int(capacity).bit_length() - 1, 0))
+                weights = np.append(weights, capacity - weights.sum())
+                slack_values.append([np.array([0, weight]) for weight in weights])
+
+        # Return output
+        return slack_values
+
+    def slack_labels(self):
+
+        """Returns the labels of the capacity slack variables, c.i in the unary encoding and c.i.b in the binary
+        encoding."""
+
+        return [f'c.{i}' if self.slack_encoding == 'unary' else f'c.{i}.{b}'
+                for i, cluster in enumerate(self.slack_values()) for b in range(len(cluster))]
+
+    def dqm_size(self):
+
+        """Extends the size of the DQM by the no. of cases and case interactions the unary slack encoding would need,
+        which report the reduction achieved by the binary encoding."""
+
+        # Evaluate size of unary encoding
+        size = super().dqm_size()
+        capacity = int(np.asarray(self.capacity, dtype=int).sum())
+        size['unary_num_cases'] = self.n * self.k + capacity
+        size['unary_num_case_interactions'] = self.n * (self.n - 1) // 2 * self.k + self.n * capacity
+
+        # Return output
+        return size
+
+    def cluster_capacity(self):
+
+        """Returns the cluster capacities and the node values used by the k-medoids solver."""
+
+        return np.array(self.capacity, dtype=float), np.array(self.value, dtype=float)
+
+    def sample_cases(self, solution):
+
+        """Converts an array of clusters per node into a sample over all variables of the DQM, setting every capacity
+        slack variable to encode the unused capacity of its cluster within the range of its cases.
+        Args:
+            solution: Array of the cluster of every node.
+        Returns:
+            An array of cases with shape (1, num_variables) and the list of variable labels.
+        """
+
+        # Evaluate slack
+        capacity = np.array(self.capacity, dtype=int)
+        load = np.bincount(solution, weights=self.value, minlength=self.k)
+        slack = np.clip(capacity - load, 0, capacity).astype(int)
+
+        # Encode slack into cases
+        cases = []
+        for i, cluster in enumerate(self.slack_values()):
+            if self.slack_encoding == 'unary':
+                cases.append(min(slack[i], capacity[i] - 1))
+            else:
+                weights = [int(values[1]) for values in cluster]
+                last = int(slack[i] > sum(weights[:-1]))
+                remainder = slack[i] - last * weights[-1]
+                cases += [(remainder >> b) & 1 for b in range(len(weights) - 1)] + [last]
+
+        # Return output
+        return np.concatenate([solution, cases])[None].astype(int), list(self.variables) + self.slack_labels()
@@ -0,0 +1,221 @@
+import time
+import hashlib
+import numpy as np
+
+from collections import OrderedDict
+
+
+class QaoaCache:
+
+    """Cache of QAOA ansatz circuits and variational parameters. The biases of the Ising Hamiltonian are parameters of
+    the ansatz, so transpiled circuits are keyed by the no. of qubits, the no. of layers and the interaction graph only,
+    and are shared by all instances with the same structure. Optimal parameters are stored per key, for Hamiltonians
+    normalized to a max absolute bias of 1, and are used as initial point of later solves with the same key or, failing
+    that, the most recent solve with the same no. of layers."""
+
+    def __init__(self):
+
+        """Initializes the stores."""
+
+        # Initialize stores
+        self.circuits = {}
+        self.parameters = OrderedDict()
+
+        # Initialize statistics
+        self.transpile_time = None
+        self.hit = None
+        self.warm_start = None
+
+    @staticmethod
+    def ising(bqm, labels):
+
+        """Extracts the Ising Hamiltonian of a BQM, normalized to a max absolute bias of 1.
+        Args:
+            bqm: The BQM.
+            labels: Variable labels in qubit order.
+        Returns:
+            A 3-tuple containing the linear biases as an array of length num_qubits, the interactions as an integer
+            array of shape (k, 2) sorted lexicographically and their biases as an array of length k.
+        """
+
+        # Extract spin biases in qubit order
+        h, (row, col, J), _ = bqm.spin.to_numpy_vectors(variable_order=labels)
+        edges = np.stack([np.minimum(row, col), np.maximum(row, col)], axis=1).astype(np.int64).reshape(-1, 2)
+        order = np.lexsort((edges[:, 1], edges[:, 0]))
+        edges, J = edges[order], J[order]
+
+        # Normalize biases
+        scale = max(np.abs(h).max(initial=0), np.abs(J).max(initial=0)) or 1
+        return h / scale, edges, J / scale
+
+    @staticmethod
+    def key(num_qubits, reps, edges, backend=None):
+
+        """Evaluates the cache key of an ansatz.
+        Args:
+            num_qubits: No. of qubits.
+            reps: No. of QAOA layers.
+            edges: Integer array of shape (k, 2) of interactions.
+            backend: Name of the backend the circuit is transpiled for. Defaults to None.
+        Returns:
+            The key as a hexadecimal string.
+        """
+
+        # Hash structure
+        digest = hashlib.sha256(f'{num_qubits}|{reps}|{backend}|'.encode())
+        digest.update(np.ascontiguousarray(edges, dtype=np.int64).tobytes())
+
+        # Return output
+        return digest.hexdigest()
+
+    @staticmethod
+    def build_ansatz(num_qubits, reps, edges):
+
+        """Builds a measured QAOA ansatz over the qubits with the given interactions. A bit value of 1 corresponds to a
+        spin of +1.
+        Args:
+            num_qubits: No. of qubits.
+            reps: No. of QAOA layers.
+            edges: Integer array of shape (k, 2) of interactions.
+        Returns:
+            The circuit with parameter vectors gamma and beta of length reps, h of length num_qubits and J of length k.
+        """
+
+        # Initialization
+        from qiskit import QuantumCircuit
+        from qiskit.circuit import ParameterVector
+        gamma = ParameterVector('gamma', reps)
+        beta = ParameterVector('beta', reps)
+        h = ParameterVector('h', num_qubits)
+        J = ParameterVector('J', len(edges))
+        circuit = QuantumCircuit(num_qubits)
+        circuit.h(range(num_qubits))
+
+        # Add layers - the spin of qubit i is -Z_i
+        for layer in range(reps):
+            for i in range(num_qubits):
+                circuit.rz(-2 * gamma[layer] * h[i], i)
+            for e, (i, j) in enumerate(edges.tolist()):
+                circuit.rzz(2 * gamma[layer] * J[e], i, j)
+            for i in range(num_qubits):
+                circuit.rx(2 * beta[layer], i)
+
+        # Add measurements and return output
+        circuit.measure_all()
+        return circuit
+
+    def circuit(self, num_qubits, reps, edges, backend):
+
+        """Looks up the transpiled ansatz for a backend and transpiles it if it is not cached. The transpile time is
+        stored in self.transpile_time and whether it was cached in self.hit.
+        Args:
+            num_qubits: No. of qubits.
+            reps: No. of QAOA layers.
+            edges: Integer array of shape (k, 2) of interactions.
+            backend: The qiskit backend.
+        Returns:
+            The transpiled circuit.
+        """
+
+        # Begin stopwatch
+        clock = time.perf_counter_ns()
+        key = self.key(num_qubits, reps, edges, backend.name() if callable(backend.name) else backend.name)
+        self.hit = key in self.circuits
+
+        # Transpile ansatz
+        if not self.hit:
+            from qiskit import transpile
+            self.circuits[key] = transpile(self.build_ansatz(num_qubits, reps, edges), backend)
+
+        # Record lookup time and return output
+        self.transpile_time = (time.perf_counter_ns() - clock) / 1e3
+        return self.circuits[key]
+
+    @staticmethod
+    def bind(circuit, point, h, J):
+
+        """Binds the variational parameters and the biases of a Hamiltonian to an ansatz built by build_ansatz.
+        Args:
+            circuit: The ansatz, possibly transpiled.
+            point: Array of length 2 * reps containing all gammas followed by all betas.
+            h: Array of linear biases.
+            J: Array of interaction biases.
+        Returns:
+            The bound circuit.
+        """
+
+        # Bind parameters by vector name and index
+        reps = len(point) // 2
+        values = {'gamma': point[:reps], 'beta': point[reps:], 'h': h, 'J': J}
+        return circuit.assign_parameters({parameter: float(values[parameter.vector.name][parameter.index])
+                                          for parameter in circuit.parameters})
+
+    def initial_point(self, key, reps):
+
+        """Returns the initial point of the variational parameters, as the optimal parameters of an earlier solve with
+        the same key, or of the most recent solve with the same no. of layers, or else a linear ramp. Whether earlier
+        parameters are reused is stored in self.warm_start.
+        Args:
+            key: The key of the ansatz structure.
+            reps: No. of QAOA layers.
+        Returns:
+            Array of length 2 * reps containing all gammas followed by all betas.
+        """
+
+        # Warm start from earlier solves
+        self.warm_start = True
+        if key in self.parameters:
+            return self.parameters[key].copy()
+        for point in reversed(self.parameters.values()):
+            if len(point) == 2 * reps:
+                return point.copy()
+
+        # Cold start with linear ramp
+        self.warm_start = False
+        ramp = (np.arange(reps) + 0.5) / reps
+        return np.concatenate([0.8 * ramp, 0.8 * (1 - ramp)])
+
+    def store(self, key, point):
+
+        """Stores the optimal variational parameters of a solve.
+        Args:
+            key: The key of the ansatz structure.
+            point: Array of length 2 * reps containing all gammas followed by all betas.
+        """
+
+        self.parameters[key] = np.array(point, dtype=float)
+        self.parameters.move_to_end(key)
+
+
+def evolve_statevector(energies, point, num_qubits):
+
+    """Simulates the QAOA state for a diagonal Hamiltonian with NumPy.
+    Args:
+        energies: Array of length 2 ** num_qubits containing the energy of every basis state, with qubit i as bit i
+            of the basis state index.
+        point: Array of length 2 * reps containing all gammas followed by all betas.
+        num_qubits: No. of qubits.
+    Returns:
+        The complex state vector.
+    """
+
+    # Initialize uniform superposition
+    reps = len(point) // 2
+    state = np.full(2 ** num_qubits, 2 ** (-num_qubits / 2), dtype=complex)
+
+    # Apply layers
+    for gamma, beta in zip(point[:reps], point[reps:]):
+
+        # Apply phase separator
+        state *= np.exp(-1j * gamma * energies)
+
+        # Apply mixer exp(-i beta X) on every qubit
+        cos, sin = np.cos(beta), -1j * np.sin(beta)
+        for q in range(num_qubits):
+            view = state.reshape(-1, 2, 2 ** q)
+            zero, one = view[:, 0, :].copy(), view[:, 1, :].copy()
+            view[:, 0, :] = cos * zero + sin * one
+            view[:, 1, :] = sin * zero + cos * one
+
+    # Return output
+    return state
@@ -1,10 +1,8 @@
 import numpy as np
-import networkx as nx
-import matplotlib.pyplot as plt
 
 from itertools import product
 from vehicle_routing import VehicleRouter
-from qiskit_optimization.applications import VehicleRouting
+from variable_registry import VariableRegistry
 
 
 class QiskitNativeSolver(VehicleRouter):
@@ -22,6 +20,10 @@ class QiskitNativeSolver(VehicleRouter):
 
         """Builds the required quadratic program and sets the names of variables in self.variables."""
 
+        # Import graph library and application
+        import networkx as nx
+        from qiskit_optimization.applications import VehicleRouting
+
         # Build graph
         G = nx.Graph()
         G.add_nodes_from(list(range(self.n + 1)))
@@ -32,7 +34,9 @@ class QiskitNativeSolver(VehicleRouter):
         # Vehicle routing default quadratic program
         vrp = VehicleRouting(graph=G, num_vehicles=self.m, depot=0)
         self.qp = vrp.to_quadratic_program()
-        self.variables = np.array(list(self.qp.variables_index.keys()))
+        self.registry = VariableRegistry.from_names(list(self.qp.variables_index.keys()), ('source', 'target'),
+                                                    delimiter='_')
+        self.variables = self.registry.names()
 
     def visualize(self, xc=None, yc=None):
 
@@ -42,6 +46,10 @@ class QiskitNativeSolver(VehicleRouter):
             yc: y coordinates of nodes. Defaults to random values.
         """
 
+        # Import plotting libraries
+        import networkx as nx
+        import matplotlib.pyplot as plt
+
         # Resolve coordinates
         if xc is None:
             xc = (np.random.rand(self.n + 1) - 0.5) * 10
@@ -64,8 +72,7 @@ class QiskitNativeSolver(VehicleRouter):
         nx.draw_networkx_labels(G, pos=pos, labels=labels, font_size=16)
 
         # Plot edges
-        edgelist = [self.variables[i] for i in range(len(self.variables)) if self.solution[i] == 1]
-        edgelist = [(int(var.split('_')[1]), int(var.split('_')[2])) for var in edgelist]
+        edgelist = self.registry.decode_edges(self.solution, 'source', 'target')
         G.add_edges_from(edgelist)
         nx.draw_networkx_edges(G, pos=pos, edgelist=edgelist, width=2, edge_color='r')
 
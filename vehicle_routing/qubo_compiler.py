@@ -0,0 +1,316 @@
+import numpy as np
+
+from sparse_model import upper_triangular
+from scipy.sparse import coo_matrix, csr_matrix, hstack
+
+
+class QuboCompiler:
+
+    """Compiles a SparseModel into a BQM by appending its linear constraints to the objective as quadratic penalties.
+    This replaces qiskit's QuadraticProgramToQubo for models with binary variables and follows the same conversion
+    steps: inequalities matching the patterns of qiskit's LinearInequalityToPenalty are penalized without slack, the
+    remaining inequalities receive binary encoded integer slack variables as in InequalityToEquality and
+    IntegerToBinary, and the penalty P * ||A x - b|| ** 2 is expanded with sparse A^T A algebra instead of name-keyed
+    dictionaries. The unscaled penalty terms only depend on the constraints and are kept, so that a compiled BQM can be
+    updated after the objective or the penalty changed without compiling the constraints again."""
+
+    def __init__(self, penalty=None, delimiter='@'):
+
+        """Initializes the compiler.
+        Args:
+            penalty: Penalty value to use for constraints. Defaults to automatic calculation in the same way as qiskit
+                converters.
+            delimiter: Delimiter used for naming slack variables. Defaults to '@' as in qiskit converters.
+        """
+
+        # Store inputs
+        self.penalty = penalty
+        self.delimiter = delimiter
+
+        # Initialize compilation results
+        self.inequality_penalty = None
+        self.applied_penalty = None
+        self.slack_names = []
+        self.labels = None
+        self.biases = None
+
+        # Initialize unscaled penalty terms
+        self.constraints = None
+        self.rhs = None
+        self.inequality_terms = None
+        self.equality_constraints = None
+        self.equality_rhs = None
+        self.equality_terms = None
+
+        # Max share of changed biases for which update rewrites biases in place instead of building a new BQM
+        self.update_fraction = 0.05
+
+    @staticmethod
+    def auto_penalty(linear, quadratic, a, rhs):
+
+        """Evaluates the penalty used by qiskit converters when no penalty is specified, i.e. one plus the range of
+        the objective over binary variables, or 1e5 if any constraint has a non-integer coefficient.
+        Args:
+            linear: Linear objective coefficients.
+            quadratic: Sparse matrix of quadratic objective coefficients.
+            a: Sparse constraint matrix.
+            rhs: Constraint right hand side values.
+        Returns:
+            The penalty as a float value.
+        """
+
+        # Check for non-integer constraint coefficients
+        terms = np.concatenate([a.data, rhs])
+        if np.any(terms != np.round(terms)):
+            return 1e5
+
+        # Evaluate objective range over binary variables
+        return 1.0 + np.abs(linear).sum() + np.abs(upper_triangular(quadratic).data).sum()
+
+    @staticmethod
+    def match_special_inequalities(a, rhs, sense):
+
+        """Finds inequality constraints that qiskit's LinearInequalityToPenalty penalizes without slack variables,
+        i.e. x <= y, x >= y, sum(x) <= 1 and sum(x) >= n - 1 over binary variables with at least two terms.
+        Args:
+            a: Sparse constraint matrix in CSR format without explicit zeros.
+            rhs: Constraint right hand side values.
+            sense: Constraint senses.
+        Returns:
+            Boolean masks over constraints for the sum(x) <= 1, sum(x) >= n - 1 and two variable x <= y / x >= y
+            patterns respectively.
+        """
+
+        # Evaluate row statistics
+        nnz = np.diff(a.indptr)
+        ones = np.asarray((a == 1).sum(axis=1)).reshape(-1)
+        row_min = np.asarray(a.min(axis=1).todense()).reshape(-1)
+        row_max = np.asarray(a.max(axis=1).todense()).reshape(-1)
+
+        # Match patterns in the same order of precedence as qiskit
+        pair = (nnz == 2) & (rhs == 0) & (sense != '==') & (row_min == -1) & (row_max == 1)
+        at_most_one = (nnz >= 2) & ~((nnz == 2) & (rhs == 0)) & (sense == '<=') & (rhs == 1) & (ones == nnz)
+        at_least = (nnz >= 2) & ~((nnz == 2) & (rhs == 0)) & (sense == '>=') & (rhs == nnz - 1) & (ones == nnz)
+        return at_most_one, at_least, pair
+
+    def penalize_special_inequalities(self, a, rhs, sense):
+
+        """Builds the slack free penalty terms of qiskit's LinearInequalityToPenalty for all matching constraints.
+        Args:
+            a: Sparse constraint matrix in CSR format without explicit zeros.
+            rhs: Constraint right hand side values.
+            sense: Constraint senses.
+        Returns:
+            A boolean mask of the penalized constraints, and the unscaled linear coefficients, sparse quadratic
+            coefficients and constant of their penalty terms.
+        """
+
+        # Match constraints
+        at_most_one, at_least, pair = self.match_special_inequalities(a, rhs, sense)
+        matched = at_most_one | at_least | pair
+        num_variables = a.shape[1]
+
+        # Pairwise products - sum over i < j of x_i x_j, or -x y for the two variable patterns
+        a_matched = a[matched]
+        quadratic = (a_matched.T @ a_matched).tocoo()
+        off_diagonal = quadratic.row != quadratic.col
+        quadratic = coo_matrix((quadratic.data[off_diagonal] / 2, (quadratic.row[off_diagonal],
+                                                                   quadratic.col[off_diagonal])), shape=quadratic.shape)
+
+        # Linear terms - (1 - n) x_i for sum(x) >= n - 1, x for x <= y and y for x >= y
+        nnz = np.diff(a.indptr)
+        linear = a[at_least].T @ (1.0 - nnz[at_least])
+        linear += np.asarray(a[pair & (sense == '<=')].maximum(0).sum(axis=0)).reshape(-1)
+        linear -= np.asarray(a[pair & (sense == '>=')].minimum(0).sum(axis=0)).reshape(-1)
+        constant = np.sum(nnz[at_least] * (nnz[at_least] - 1) // 2)
+
+        # Return output
+        return matched, linear.reshape(num_variables), quadratic, constant
+
+    def add_slack_variables(self, a, rhs, sense, names):
+
+        """Converts inequality constraints to equalities by adding integer slack variables, which are encoded in
+        binary using bounded coefficients.
+        Args:
+            a: Sparse constraint matrix in CSR format.
+            rhs: Constraint right hand side values.
+            sense: Constraint senses.
+            names: Constraint names.
+        Returns:
+            The constraint matrix extended by one column per slack bit in CSR format, the right hand side values and
+            the names of the slack bits.
+        Raises:
+            ValueError: If an inequality constraint has non-integer coefficients.
+        """
+
+        # Initialization
+        rhs = rhs.copy()
+        lhs_lb = np.asarray(a.minimum(0).sum(axis=1)).reshape(-1)
+        lhs_ub = np.asarray(a.maximum(0).sum(axis=1)).reshape(-1)
+        rows, cols, values, slack_names = [], [], [], []
+
+        # Loop over inequality constraints
+        for k in np.flatnonzero(sense != '=='):
+
+            # Check coefficients
+            coefficients = a.data[a.indptr[k]:a.indptr[k + 1]]
+            if np.any(coefficients != np.round(coefficients)):
+                raise ValueError(f'"{names[k]}" contains float coefficients. Integer slack variables cannot be used.')
+
+            # Evaluate slack range
+            if sense[k] == '<=':
+                rhs[k] = np.floor(rhs[k])
+                sign, var_ub = 1, rhs[k] - lhs_lb[k]
+            else:
+                rhs[k] = np.ceil(rhs[k])
+                sign, var_ub = -1, lhs_ub[k] - rhs[k]
+            if var_ub <= 0:
+                continue
+
+            # Encode slack in binary with bounded coefficients
+            power = int(np.log2(var_ub))
+            bits = [2 ** i for i in range(power)] + [var_ub - (2 ** power - 1)]
+            rows += [k] * len(bits)
+            cols += list(range(len(slack_names), len(slack_names) + len(bits)))
+            values += [sign * bit for bit in bits]
+            slack_names += [f'{names[k]}{self.delimiter}int_slack{self.delimiter}{i}' for i in range(len(bits))]
+
+        # Extend constraint matrix
+        slack = coo_matrix((values, (rows, cols)), shape=(a.shape[0], len(slack_names)))
+        return hstack([a, slack], format='csr'), rhs, slack_names
+
+    def prepare(self, model):
+
+        """Builds the unscaled penalty terms of all constraints of the model, converting inequalities to equalities
+        where required.
+        Args:
+            model: The SparseModel to be compiled.
+        """
+
+        # Initialization
+        a = model.constraints.tocsr(copy=True)
+        a.eliminate_zeros()
+        names = np.array(model.constraint_names, dtype=object)
+        self.constraints, self.rhs = a, model.rhs
+
+        # Penalize special inequalities without slack variables
+        matched, linear, quadratic, constant = self.penalize_special_inequalities(a, model.rhs, model.sense)
+        self.inequality_terms = linear, quadratic, constant
+
+        # Convert remaining inequalities to equalities
+        a, rhs, self.slack_names = self.add_slack_variables(a[~matched], model.rhs[~matched], model.sense[~matched],
+                                                            names[~matched])
+        self.equality_constraints, self.equality_rhs = a, rhs
+
+        # Expand penalty as x A^T A x - 2 b^T A x + b^T b, where x_i ** 2 = x_i for binary variables
+        ata = (a.T @ a).tocoo()
+        diagonal = ata.row == ata.col
+        linear = np.bincount(ata.row[diagonal], ata.data[diagonal], a.shape[1]) - 2 * (a.T @ rhs)
+        quadratic = coo_matrix((ata.data[~diagonal], (ata.row[~diagonal], ata.col[~diagonal])), shape=ata.shape)
+        self.equality_terms = linear, quadratic, rhs @ rhs
+
+    def assemble(self, model):
+
+        """Combines the objective of the model with the prepared penalty terms scaled by the penalty.
+        Args:
+            model: The SparseModel passed to prepare, possibly with a different objective.
+        Returns:
+            The linear biases, the off-diagonal quadratic biases as an upper triangular COO matrix and the offset of
+            the QUBO over all variables and slack bits.
+        """
+
+        # Add inequality penalties
+        penalty = self.penalty
+        if penalty is None:
+            penalty = self.auto_penalty(model.linear, model.quadratic, self.constraints, self.rhs)
+        self.inequality_penalty = penalty
+        linear, quadratic, constant = self.inequality_terms
+        linear = model.linear + penalty * linear
+        quadratic = (model.quadratic + penalty * quadratic).tocoo()
+        constant = model.constant + penalty * constant
+
+        # Resolve equality penalty
+        penalty = self.penalty
+        if penalty is None:
+            penalty = self.auto_penalty(linear, quadratic, self.equality_constraints, self.equality_rhs)
+        self.applied_penalty = penalty
+
+        # Add equality penalties
+        penalty_linear, penalty_quadratic, penalty_constant = self.equality_terms
+        num_variables = len(penalty_linear)
+        linear = np.concatenate([linear, np.zeros(len(self.slack_names))]) + penalty * penalty_linear
+        offset = constant + penalty * penalty_constant
+
+        # Combine off-diagonal penalty terms with the objective and fold onto the upper triangle
+        quadratic = csr_matrix((np.concatenate([quadratic.data, penalty * penalty_quadratic.data]),
+                                (np.concatenate([quadratic.row, penalty_quadratic.row]),
+                                 np.concatenate([quadratic.col, penalty_quadratic.col]))),
+                               shape=(num_variables, num_variables))
+        quadratic = upper_triangular(quadratic).tocoo()
+
+        # Move diagonal objective terms to linear biases
+        diagonal = quadratic.row == quadratic.col
+        linear += np.bincount(quadratic.row[diagonal], quadratic.data[diagonal], num_variables)
+        quadratic = coo_matrix((quadratic.data[~diagonal], (quadratic.row[~diagonal], quadratic.col[~diagonal])),
+                               shape=quadratic.shape)
+
+        # Return output
+        return linear, quadratic, offset
+
+    def compile(self, model, variable_names):
+
+        """Builds a BQM from the objective of the model with every constraint appended as a penalty.
+        Args:
+            model: The SparseModel to be compiled.
+            variable_names: Array of model.num_variables variable names used to label the BQM. Slack bits are
+                appended after these variables.
+        Returns:
+            A dimod BQM with the same energies as the QUBO produced by qiskit's QuadraticProgramToQubo.
+        """
+
+        # Build QUBO
+        self.prepare(model)
+        linear, quadratic, offset = self.assemble(model)
+        self.labels = np.array(list(variable_names) + self.slack_names, dtype=object)
+        self.biases = linear, quadratic.tocsr(), offset
+
+        # Build BQM
+        import dimod
+        return dimod.BQM.from_numpy_vectors(linear, (quadratic.row, quadratic.col, quadratic.data), offset,
+                                            dimod.BINARY, variable_order=list(self.labels))
+
+    def update(self, bqm, model):
+
+        """Updates a BQM built by compile after the objective of the model or self.penalty changed, reusing the
+        penalty terms of the unchanged constraints. Only the biases that changed are rewritten in the BQM. If more
+        than update_fraction of all biases changed, e.g. after a penalty change, a new BQM is built from the arrays
+        instead, as this is faster than rewriting biases one by one.
+        Args:
+            bqm: The BQM returned by compile.
+            model: The SparseModel passed to compile, possibly with a different objective.
+        Returns:
+            The updated BQM, which is either bqm itself or a new BQM.
+        """
+
+        # Build QUBO and find changed biases
+        linear, quadratic, offset = self.assemble(model)
+        quadratic = quadratic.tocsr()
+        linear_delta = linear - self.biases[0]
+        quadratic_delta = (quadratic - self.biases[1]).tocoo()
+        quadratic_delta.eliminate_zeros()
+        changed = np.flatnonzero(linear_delta)
+        self.biases = linear, quadratic, offset
+
+        # Build new BQM if many biases changed
+        import dimod
+        if len(changed) + quadratic_delta.nnz > self.update_fraction * (len(linear) + quadratic.nnz):
+            quadratic = quadratic.tocoo()
+            return dimod.BQM.from_numpy_vectors(linear, (quadratic.row, quadratic.col, quadratic.data), offset,
+                                                dimod.BINARY, variable_order=list(self.labels))
+
+        # Rewrite changed biases in place
+        bqm.add_variables_from(zip(self.labels[changed], linear_delta[changed]))
+        bqm.add_interactions_from(zip(self.labels[quadratic_delta.row], self.labels[quadratic_delta.col],
+                                      quadratic_delta.data))
+        bqm.offset = offset
+        return bqm
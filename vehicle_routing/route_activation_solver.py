@@ -1,10 +1,9 @@
 import numpy as np
-import networkx as nx
-import matplotlib.pyplot as plt
 
 from itertools import product
 from vehicle_routing import VehicleRouter
-from qiskit_optimization import QuadraticProgram
+from scipy.sparse import coo_matrix
+from variable_registry import VariableRegistry
 
 
 class RouteActivationSolver(VehicleRouter):
@@ -23,11 +22,13 @@ class RouteActivationSolver(VehicleRouter):
         """Builds the required quadratic program and sets the names of variables in self.variables."""
 
         # Initialization
+        from qiskit_optimization import QuadraticProgram
         self.qp = QuadraticProgram(name='Vehicle Routing Problem')
 
         # Designate variable names
         edgelist = [(i, j) for i, j in product(range(self.n + 1), repeat=2) if i != j]
-        self.variables = np.array([f'x.{i}.{j}' for i, j in edgelist])
+        self.registry = VariableRegistry(edgelist, ('source', 'target'))
+        self.variables = self.registry.names()
 
         # Add variables to quadratic program
         for var in self.variables:
@@ -50,6 +51,17 @@ class RouteActivationSolver(VehicleRouter):
         self.qp.linear_constraint(linear=constraint_linear_a, sense='==', rhs=self.m, name=f'depot_a')
         self.qp.linear_constraint(linear=constraint_linear_b, sense='==', rhs=self.m, name=f'depot_b')
 
+    def build_objective(self):
+
+        """Builds the objective function for the current cost matrix over the existing variables.
+        Returns:
+            The linear objective coefficients as an array and the quadratic objective coefficients as a sparse matrix.
+        """
+
+        # Build objective
+        linear = self.cost[self.registry.field('source'), self.registry.field('target')]
+        return linear, coo_matrix((len(self.registry), len(self.registry)))
+
     def visualize(self, xc=None, yc=None):
 
         """Visualizes solution.
@@ -58,6 +70,10 @@ class RouteActivationSolver(VehicleRouter):
             yc: y coordinates of nodes. Defaults to random values.
         """
 
+        # Import plotting libraries
+        import networkx as nx
+        import matplotlib.pyplot as plt
+
         # Resolve coordinates
         if xc is None:
             xc = (np.random.rand(self.n + 1) - 0.5) * 10
@@ -80,8 +96,7 @@ class RouteActivationSolver(VehicleRouter):
         nx.draw_networkx_labels(G, pos=pos, labels=labels, font_size=16)
 
         # Plot edges
-        edgelist = [self.variables[i] for i in range(len(self.variables)) if self.solution[i] == 1]
-        edgelist = [(int(var.split('.')[1]), int(var.split('.')[2])) for var in edgelist]
+        edgelist = self.registry.decode_edges(self.solution, 'source', 'target')
         G.add_edges_from(edgelist)
         nx.draw_networkx_edges(G, pos=pos, edgelist=edgelist, width=2, edge_color='r')
 
@@ -105,6 +120,12 @@ class CapcRouteActivationSolver(RouteActivationSolver):
         # Call parent initializer
         super().__init__(n_clients, n_vehicles, cost_matrix, **params)
 
+    def build_inputs(self):
+
+        """Extends the build inputs by the capacity data."""
+
+        return super().build_inputs() + [self.capacity, self.demand]
+
     def build_quadratic_program(self):
 
         """Builds the required quadratic program and sets the names of variables in self.variables."""
@@ -125,5 +146,27 @@ class CapcRouteActivationSolver(RouteActivationSolver):
 
     def evaluate_qubo_feasibility(self, data=None):
 
-        """This function is not supported due to additional MTZ variables."""
-        print("Not Supported due to integer valued MTZ variables!")
+        """This function is not supported due to additional MTZ variables.
+        Raises:
+            NotImplementedError: Always.
+        """
+
+        raise NotImplementedError('Not supported due to integer valued MTZ variables.')
+
+    def evaluate_samples(self, samples=None):
+
+        """This function is not supported due to additional MTZ variables.
+        Raises:
+            NotImplementedError: Always.
+        """
+
+        raise NotImplementedError('Not supported due to integer valued MTZ variables.')
+
+    def evaluate_qubo_feasibility_batch(self, samples=None):
+
+        """This function is not supported due to additional MTZ variables.
+        Raises:
+            NotImplementedError: Always.
+        """
+
+        raise NotImplementedError('Not supported due to integer valued MTZ variables.')
@@ -1,12 +1,11 @@
 import warnings
 import numpy as np
-import networkx as nx
-import matplotlib.pyplot as plt
 
 from itertools import product
 from collections import Counter
 from vehicle_routing import VehicleRouter
-from qiskit_optimization import QuadraticProgram
+from variable_registry import VariableRegistry
+from sparse_model import build_position_objective, position_model_size
 
 
 class SolutionPartitionSolver(VehicleRouter):
@@ -15,7 +14,12 @@ class SolutionPartitionSolver(VehicleRouter):
 
     def __init__(self, n_clients, n_vehicles, cost_matrix, **params):
 
-        """Initializes any required variables and calls init of super class."""
+        """Initializes any required variables and calls init of super class.
+        Args:
+            partition_all: Set to True to partition every valid TSP sample in the sampleset and select the sample with
+                the lowest total VRP cost, instead of partitioning the selected sample only. The capacitated solver
+                partitions every sample into capacity feasible trips via its partition graph. Defaults to False.
+        """
 
         # Initialize cluster data
         self.route = None
@@ -23,32 +27,51 @@ class SolutionPartitionSolver(VehicleRouter):
         self.end_indices = None
         self.partition_cost = None
 
+        # Extract parameters
+        self.partition_all = params.setdefault('partition_all', False)
+
         # Call parent initializer
         super().__init__(n_clients, n_vehicles, cost_matrix, **params)
 
+    def estimate_size(self, dense=False):
+
+        """Estimates the size of the BQM of the TSP from the no. of clients and the candidate edges between clients, or
+        all edges between clients if dense is set."""
+
+        edges = self.n * (self.n - 1) if self.candidates is None or dense else \
+            int(self.candidates[1:, 1:].sum()) - self.n
+        return position_model_size(1, self.n, self.n, edges, depot=False)
+
     def build_quadratic_program(self):
 
         """Builds the required quadratic program and sets the names of variables in self.variables."""
 
         # Initialization
+        from qiskit_optimization import QuadraticProgram
         self.qp = QuadraticProgram(name='Vehicle Routing Problem')
 
         # Designate variable names
-        self.variables = np.array([[f'x.{i}.{j}' for i in range(1, self.n + 1)] for j in range(1, self.n + 1)])
+        nodes, steps = np.meshgrid(range(1, self.n + 1), range(1, self.n + 1))
+        self.registry = VariableRegistry(np.stack([nodes.reshape(-1), steps.reshape(-1)], axis=1), ('node', 'step'))
+        self.variables = self.registry.names().reshape(self.n, self.n)
 
         # Add variables to quadratic program
         for var in self.variables.reshape(-1):
             self.qp.binary_var(name=var)
 
-        # Build objective function
-        edgelist = [(i, j) for i, j in product(range(1, self.n + 1), repeat=2) if i != j]
+        # Build objective function, coupling consecutive steps along candidate edges only if selected
+        bonus = 0 if self.candidates is None else self.cost.max()
+        edgelist = [(i, j) for i, j in product(range(1, self.n + 1), repeat=2)
+                    if i != j and (self.candidates is None or self.candidates[i, j])]
         obj_linear_a = {f'x.{i}.{1}': self.cost[0, i] for i in range(1, self.n + 1)}
         obj_linear_b = {f'x.{i}.{self.n}': self.cost[i, 0] for i in range(1, self.n + 1)}
-        obj_quadratic = {(f'x.{i}.{t}', f'x.{j}.{t + 1}'): self.cost[i, j] for i, j in edgelist
+        obj_linear_c = {f'x.{i}.{t}': bonus for i in range(1, self.n + 1) for t in range(1, self.n)} if bonus else {}
+        obj_quadratic = {(f'x.{i}.{t}', f'x.{j}.{t + 1}'): self.cost[i, j] - bonus for i, j in edgelist
                          for t in range(1, self.n)}
 
         # Add objective to quadratic program
-        self.qp.minimize(linear=dict(Counter(obj_linear_a) + Counter(obj_linear_b)), quadratic=obj_quadratic)
+        self.qp.minimize(linear=dict(Counter(obj_linear_a) + Counter(obj_linear_b) + Counter(obj_linear_c)),
+                         quadratic=obj_quadratic)
 
         # Add constraints - single delivery per client
         for i in range(1, self.n + 1):
@@ -60,6 +83,31 @@ class SolutionPartitionSolver(VehicleRouter):
             constraint_linear = {f'x.{i}.{j}': 1 for i in range(1, self.n + 1)}
             self.qp.linear_constraint(linear=constraint_linear, sense='==', rhs=1, name=f'single_location_{j}')
 
+    def build_objective(self):
+
+        """Builds the objective function for the current cost matrix over the existing variables.
+        Returns:
+            The linear objective coefficients as an array and the quadratic objective coefficients as a sparse matrix.
+        """
+
+        # Build objective
+        nodes = np.arange(1, self.n + 1)
+        index = self.registry.index(nodes[:, None], nodes[None, :])
+        return build_position_objective(self.cost, index[None], nodes, len(self.registry), self_loops=False,
+                                        candidates=self.candidates)
+
+    def decode_routes(self, samples=None):
+
+        """Decodes samples into TSP routes using the array mappings in self.registry.
+        Args:
+            samples: Samples to decode, in any format accepted by resolve_samples. Defaults to self.solution.
+        Returns:
+            A list with one entry per sample, each a list containing the single array of visited nodes before
+            partitioning.
+        """
+
+        return self.registry.decode_routes(self.resolve_samples(samples), None, 'node', 'step')
+
     def evaluate_vrp_cost(self):
 
         """Evaluate the optimized VRP cost under the optimized solution stored in self.solution.
@@ -82,25 +130,104 @@ class SolutionPartitionSolver(VehicleRouter):
         # Solve TSP
         super().solve(**params)
 
-        # Evaluate route
-        var_list = self.variables.reshape(-1)
-        sol_list = self.solution.reshape(-1)
-        active_vars = [var_list[k] for k in range(len(var_list)) if sol_list[k] == 1]
-        self.route = [int(var.split('.')[1]) for var in active_vars]
+        # Partition every valid TSP sample and select the cheapest VRP solution
+        if self.partition_all and self.sample_metrics is not None:
+            self.select_partitioned_sample()
 
-        # Evaluate partition costs
-        partition_costs = np.zeros(self.n - 1)
-        for i in range(self.n - 1):
-            partition_costs[i] = self.cost[self.route[i], 0] + self.cost[0, self.route[i + 1]] - \
-                                 self.cost[self.route[i], self.route[i + 1]]
+        # Evaluate route
+        with self.tracer.span('decoding'):
+            self.route = self.decode_routes()[0][0].tolist()
 
         # Evaluate minimum cost partition
-        cut_indices = np.argsort(partition_costs)[:(self.m - 1)]
-        self.start_indices = np.sort(cut_indices) + 1
+        with self.tracer.span('partitioning', routes=1):
+            partition_costs, cut_indices = self.partition_routes(np.array([self.route]))
+        self.start_indices = np.sort(cut_indices[0]) + 1
         self.start_indices = [0] + list(self.start_indices)
-        self.end_indices = np.sort(cut_indices)
+        self.end_indices = np.sort(cut_indices[0])
         self.end_indices = list(self.end_indices) + [self.n - 1]
-        self.partition_cost = sum(partition_costs[cut_indices])
+        self.partition_cost = partition_costs[0]
+
+    def select_partitioned_sample(self):
+
+        """Partitions every valid TSP sample in self.result with evaluate_partitions and extracts the sample with the
+        lowest total VRP cost into self.solution. The VRP cost of every sample is stored in
+        self.sample_metrics['vrp_cost'], which is infinite for invalid samples and samples that cannot be partitioned.
+        The selected sample is kept if no sample can be partitioned."""
+
+        with self.tracer.span('partitioning', samples=len(self.result.record)) as span:
+
+            # Decode valid TSP routes
+            samples = self.resolve_samples(self.result)
+            routes, valid = self.decode_permutations(samples)
+            span.update(routes=int(valid.sum()))
+
+            # Evaluate VRP costs and select cheapest sample
+            vrp_costs = np.full(len(samples), np.inf)
+            vrp_costs[valid] = self.evaluate_partitions(routes[valid])
+            if np.isfinite(vrp_costs).any():
+                self.sample_metrics['vrp_cost'] = vrp_costs
+                self.sample_index = int(np.argmin(vrp_costs))
+                self.extract_solution(samples[self.sample_index])
+
+    def evaluate_partitions(self, routes):
+
+        """Evaluates the total VRP cost of the cheapest partition of TSP routes into m trips.
+        Args:
+            routes: Integer array of shape (num_routes, n) of visited nodes.
+        Returns:
+            Array of num_routes VRP costs.
+        """
+
+        return self.evaluate_tsp_costs(routes) + self.partition_routes(routes)[0]
+
+    def decode_permutations(self, samples):
+
+        """Decodes samples into TSP routes, assuming that every sample is a valid permutation matrix.
+        Args:
+            samples: Array of shape (num_samples, num_variables) in the index order of self.registry.
+        Returns:
+            An integer array of shape (num_samples, n) containing the node visited at every step and a boolean array
+            indicating which samples are valid permutations.
+        """
+
+        # Arrange samples as (sample, node, step)
+        nodes = np.arange(1, self.n + 1)
+        permutations = samples[:, self.registry.index(nodes[:, None], nodes[None, :])]
+
+        # Check permutations and extract routes
+        valid = (permutations.sum(axis=1) == 1).all(axis=1) & (permutations.sum(axis=2) == 1).all(axis=1)
+        return nodes[np.argmax(permutations, axis=1)], valid
+
+    def evaluate_tsp_costs(self, routes):
+
+        """Evaluates the cost of TSP routes starting and ending at the depot.
+        Args:
+            routes: Integer array of shape (num_routes, n) of visited nodes.
+        Returns:
+            Array of num_routes costs.
+        """
+
+        return self.cost[0, routes[:, 0]] + self.cost[routes[:, :-1], routes[:, 1:]].sum(axis=1) + \
+            self.cost[routes[:, -1], 0]
+
+    def partition_routes(self, routes):
+
+        """Evaluates the cheapest partition of TSP routes into m trips by cutting the m - 1 legs with the lowest cost of
+        returning to and leaving the depot in between.
+        Args:
+            routes: Integer array of shape (num_routes, n) of visited nodes.
+        Returns:
+            Array of num_routes partition costs and an integer array of shape (num_routes, m - 1) containing the
+            positions after which each route is cut.
+        """
+
+        # Evaluate partition costs
+        partition_costs = self.cost[routes[:, :-1], 0] + self.cost[0, routes[:, 1:]] - \
+            self.cost[routes[:, :-1], routes[:, 1:]]
+
+        # Evaluate minimum cost partition
+        cut_indices = np.argsort(partition_costs, axis=1)[:, :(self.m - 1)]
+        return np.take_along_axis(partition_costs, cut_indices, axis=1).sum(axis=1), cut_indices
 
     def visualize(self, xc=None, yc=None):
 
@@ -110,6 +237,10 @@ class SolutionPartitionSolver(VehicleRouter):
             yc: y coordinates of nodes. Defaults to random values.
         """
 
+        # Import plotting libraries
+        import networkx as nx
+        import matplotlib.pyplot as plt
+
         # Resolve coordinates
         if xc is None:
             xc = (np.random.rand(self.n + 1) - 0.5) * 10
@@ -162,40 +293,82 @@ class CapcSolutionPartitionSolver(SolutionPartitionSolver):
         # Call parent initializer
         super().__init__(n_clients, n_vehicles, cost_matrix, **params)
 
-    def build_partition_graph(self):
+    def build_partition_graph(self, route=None):
 
-        """Build partition graph for post TSP partitioning."""
+        """Build partition graph for post TSP partitioning using the split procedure of Prins. Edge (i, j) is a trip
+        serving route positions i + 1 to j, whose demand and cost are evaluated from prefix sums over the route, and
+        the feasible trip windows of all start positions are found with a single vectorized search.
+        Args:
+            route: Sequence of n visited nodes. Defaults to self.route.
+        Returns:
+            Arrays of source nodes, target nodes and weights of all edges in the partition graph.
+        """
 
-        # Initialize graph
-        G = nx.DiGraph()
-        G.add_nodes_from(range(self.n + 1))
+        # Evaluate prefix sums of demand and of the cost of consecutive legs along the route
+        route = np.asarray(self.route if route is None else route, dtype=int)
+        prefix_demand = np.concatenate([[0], np.cumsum(np.asarray(self.demand)[route - 1])])
+        prefix_cost = np.concatenate([[0], np.cumsum(self.cost[route[:-1], route[1:]])])
+
+        # Find the last feasible target of every source
+        sources = np.arange(self.n)
+        last = np.searchsorted(prefix_demand, prefix_demand[sources] + self.capacity, side='right') - 1
+
+        # Enumerate feasible trips
+        counts = np.maximum(last - sources, 0)
+        offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        sources = np.repeat(sources, counts)
+        targets = sources + 1 + np.arange(len(sources)) - offsets
+
+        # Evaluate trip costs
+        weights = self.cost[0, route[sources]] + prefix_cost[targets - 1] - prefix_cost[sources] + \
+            self.cost[route[targets - 1], 0]
+
+        # Return edges
+        return sources, targets, weights
+
+    def partition_weights(self, route=None):
+
+        """Builds the dense weight matrix of the partition graph of a route for shortest_walk.
+        Args:
+            route: Sequence of n visited nodes. Defaults to self.route.
+        Returns:
+            (n + 1) x (n + 1) array of trip costs with np.inf for infeasible trips, and the no. of feasible trips.
+        """
+
+        # Build partition graph
+        sources, targets, trip_costs = self.build_partition_graph(route)
+        weights = np.full((self.n + 1, self.n + 1), np.inf)
+        weights[sources, targets] = trip_costs
+
+        # Return output
+        return weights, len(sources)
+
+    def evaluate_partitions(self, routes):
+
+        """Evaluates the total VRP cost of the cheapest partition of TSP routes into at most m capacity feasible trips.
+        Args:
+            routes: Integer array of shape (num_routes, n) of visited nodes.
+        Returns:
+            Array of num_routes VRP costs, which are infinite for routes that need more than m vehicles.
+        """
+
+        # Evaluate shortest walks of every route
+        vrp_costs = np.full(len(routes), np.inf)
+        for i, route in enumerate(routes):
+            success, path_length, _ = self.shortest_walk(self.partition_weights(route)[0], self.n, self.m)
+            if success:
+                vrp_costs[i] = path_length
+
+        # Return output
+        return vrp_costs
 
-        # Loop over nodes
-        for i in range(self.n + 1):
-
-            # Initialize
-            j = i + 1
-            demand = self.demand[self.route[j - 1] - 1] if j <= self.n else None
-            cost = self.cost[0, self.route[j - 1]] if j <= self.n else None
-
-            # Loop over target nodes
-            while j <= self.n and demand <= self.capacity:
-                trip_cost = cost + self.cost[self.route[j - 1], 0]
-                G.add_edge(i, j, weight=trip_cost)
-                j += 1
-                if j <= self.n:
-                    demand += self.demand[self.route[j - 1] - 1]
-                    cost += self.cost[self.route[j - 2], self.route[j - 1]]
-
-        # Return graph
-        return G
-    
     @staticmethod
-    def shortest_walk(dG, sink, m):
+    def shortest_walk(weights, sink, m):
 
-        """Function to find shortest path with at most m edges.
+        """Function to find shortest path with at most m edges, using a hop limited Bellman-Ford over dense arrays that
+        keeps one table of parent pointers per hop count and only reconstructs the path to the sink.
         Args:
-            dG: Input graph.
+            weights: (n + 1) x (n + 1) array of edge weights with np.inf for missing edges.
             sink: Destination Node.
             m: Max number of edges.
         Returns:
@@ -203,41 +376,36 @@ class CapcSolutionPartitionSolver(SolutionPartitionSolver):
             fields if path not found.
         """
 
-        # d(v,m) is the shortest walk length from source(0) to v using at most m edges
-        n = dG.number_of_nodes() - 1
-        d = [float('inf')] * (n + 1)
-        path = [None] * (n + 1)         # store path to v with atmost m edges
-        path[0] = [0]
-        d[0] = 0                        # d(0,0) = 0
-
-        # Initialization
-        d_nextround = [float('inf')] * (n + 1)
-        d_nextround[0] = 0
-        path_nextround = [None] * (n + 1)
-        path_nextround[0] = [0]
-
-        # Main loop
-        for i in range(m):
-            for v in range(1, n + 1):
-                path_dists = [(u, d[u]+dG.edges[u, v]['weight']) for u in dG.predecessors(v)]
-                min_path_dists = min(dist for (vertex, dist) in path_dists)
-                if min_path_dists < d[v]:
-                    d_nextround[v] = min_path_dists
-                    for (vertex, dist) in path_dists:
-                        if dist == min_path_dists:
-                            path_nextround[v] = path[int(vertex)] + [v]
-                else:
-                    d_nextround[v] = d[v]
-                    path_nextround[v] = path[v]
-            d = d_nextround.copy()
-            path = path_nextround.copy()
+        # d[k, v] is the shortest walk length from source(0) to v using at most k edges
+        weights = np.asarray(weights, dtype=float)
+        n = weights.shape[0] - 1
+        d = np.full((m + 1, n + 1), np.inf)
+        d[0, 0] = 0                     # d(0,0) = 0
+
+        # parent[k, v] is the predecessor of v if d(v) improved with the k-th edge, and -1 otherwise
+        parent = np.full((m + 1, n + 1), -1)
+
+        # Main loop - ties are resolved in favour of the last predecessor
+        for k in range(1, m + 1):
+            path_dists = d[k - 1][:, None] + weights
+            vertex = n - np.argmin(path_dists[::-1], axis=0)
+            min_path_dists = path_dists[vertex, np.arange(n + 1)]
+            improved = min_path_dists < d[k - 1]
+            improved[0] = False
+            d[k] = np.where(improved, min_path_dists, d[k - 1])
+            parent[k, improved] = vertex[improved]
 
         # Return output
-        if d[sink] == float('inf'):
+        if d[m, sink] == np.inf:
             return False, None, None
-        else:
-            path_length = d[sink]
-            return True, path_length, path[sink]
+
+        # Reconstruct path from parent pointers
+        path = [sink]
+        for k in range(m, 0, -1):
+            if parent[k, path[-1]] >= 0:
+                path.append(int(parent[k, path[-1]]))
+
+        return True, float(d[m, sink]), path[::-1]
 
     def solve(self, **params):
 
@@ -251,18 +419,27 @@ class CapcSolutionPartitionSolver(SolutionPartitionSolver):
         # Solve TSP
         VehicleRouter.solve(self, **params)
 
+        # Partition every valid TSP sample and select the cheapest VRP solution
+        if self.partition_all and self.sample_metrics is not None:
+            self.select_partitioned_sample()
+
         # Evaluate route
-        var_list = self.variables.reshape(-1)
-        sol_list = self.solution.reshape(-1)
-        active_vars = [var_list[k] for k in range(len(var_list)) if sol_list[k] == 1]
-        self.route = [int(var.split('.')[1]) for var in active_vars]
+        with self.tracer.span('decoding'):
+            self.route = self.decode_routes()[0][0].tolist()
 
-        # Evaluate minimum cost partition
-        G = self.build_partition_graph()
-        success, path_length, path = self.shortest_walk(G, self.n, self.m)
+        with self.tracer.span('partitioning', routes=1) as span:
+
+            # Build partition graph
+            weights, num_edges = self.partition_weights()
+            span.update(edges=num_edges)
+
+            # Evaluate minimum cost partition
+            success, path_length, path = self.shortest_walk(weights, self.n, self.m)
+            if not success:
+                warnings.warn('Unable to find route with given number of vehicles. Extending fleet...')
+                success, path_length, path = self.shortest_walk(weights, self.n, self.n)
         if not success:
-            warnings.warn('Unable to find route with given number of vehicles. Extending fleet...')
-            path_length, path = nx.single_source_dijkstra(G, source=0, target=self.n)
+            raise ValueError('Unable to find route as the demand of a node exceeds the capacity.')
 
         # Extract cuts from partition
         self.start_indices = path[:-1]
@@ -0,0 +1,28 @@
+class SolveResult:
+
+    """Result of a solve on a detached copy of a solver, as returned by VehicleRouter.solve_detached and
+    VehicleRouter.solve_async. The solver the solve was started from is left unchanged, and the result may be applied
+    to it with VehicleRouter.apply_result."""
+
+    def __init__(self, vrp):
+
+        """Extracts the result containers of a solved copy of a solver.
+        Args:
+            vrp: The detached VehicleRouter instance after solving.
+        """
+
+        # Store solved copy
+        self.vrp = vrp
+
+        # Store result containers
+        self.result = vrp.result
+        self.solution = vrp.solution
+        self.sample_index = vrp.sample_index
+        self.sample_metrics = vrp.sample_metrics
+        self.timing = vrp.timing
+        self.spans = vrp.tracer.spans
+
+        # Evaluate solution
+        self.cost = float(vrp.evaluate_vrp_cost())
+        self.routes = vrp.decode_solution_routes() if vrp.registry is not None else None
+        self.feasible = None if vrp.sample_metrics is None else bool(vrp.sample_metrics['feasible'][vrp.sample_index])
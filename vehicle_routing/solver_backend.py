@@ -1,13 +1,113 @@
+import os
+import sys
 import time
-import hybrid
-import dwave.inspector
+import importlib
+import numpy as np
 
-from greedy import SteepestDescentSolver
-from dwave.system import LeapHybridSampler
-from dwave.system import DWaveSampler, EmbeddingComposite
-from qiskit_optimization.algorithms import MinimumEigenOptimizer
-from qiskit.algorithms import QAOA
-from qiskit import Aer
+from functools import partial
+from importlib.metadata import entry_points
+from concurrent.futures import ProcessPoolExecutor
+
+
+# Entry point group in which third-party packages register backends
+ENTRY_POINT_GROUP = 'vehicle_routing.backends'
+
+
+class BackendRegistry:
+
+    """Registry of backend solvers which are only imported when first selected. A backend is registered either as the
+    name of a SolverBackend method, or as an import path 'module:function' or a callable, taking the SolverBackend
+    instance and the parameters sent to the backend. Backends registered by other packages as entry points in the
+    group vehicle_routing.backends are discovered on the first lookup of a name that is not registered, without
+    importing the packages until the backend is selected."""
+
+    def __init__(self):
+
+        """Initializes the stores."""
+
+        # Initialize stores
+        self.targets = {}
+        self.loaded = {}
+        self.discovered = False
+
+    def register(self, name, target):
+
+        """Registers a backend, replacing any backend with the same name.
+        Args:
+            name: Name used to select the backend, e.g. solver='sa'.
+            target: Name of a SolverBackend method, an import path 'module:function' or a callable.
+        """
+
+        self.targets[name] = target
+        self.loaded.pop(name, None)
+
+    def discover(self):
+
+        """Registers the import paths of all backends in the entry point group that are not registered yet."""
+
+        # Select entry point group, which is only supported as a keyword from Python 3.10
+        if sys.version_info >= (3, 10):
+            group = entry_points(group=ENTRY_POINT_GROUP)
+        else:
+            group = entry_points().get(ENTRY_POINT_GROUP, [])
+
+        # Register entry points without loading them
+        for entry_point in group:
+            self.targets.setdefault(entry_point.name, entry_point.value)
+        self.discovered = True
+
+    def names(self):
+
+        """Returns the names of all registered and discovered backends."""
+
+        if not self.discovered:
+            self.discover()
+        return list(self.targets)
+
+    def load(self, name, backend):
+
+        """Looks up a backend and imports it if it is selected for the first time.
+        Args:
+            name: Name of the backend.
+            backend: The SolverBackend instance to bind the backend to.
+        Returns:
+            The backend as a function of the parameters sent to the backend.
+        Raises:
+            ValueError: If no backend is registered under the name.
+        """
+
+        # Discover entry points
+        if name not in self.targets and not self.discovered:
+            self.discover()
+        if name not in self.targets:
+            raise ValueError(f'Unknown backend solver: {name}. Available backends: {", ".join(self.targets)}.')
+
+        # Import backend
+        if name not in self.loaded:
+            target = self.targets[name]
+            if isinstance(target, str) and ':' in target:
+                module, attribute = target.split(':', 1)
+                target = importlib.import_module(module)
+                for part in attribute.split('.'):
+                    target = getattr(target, part)
+            self.loaded[name] = target
+
+        # Bind backend
+        target = self.loaded[name]
+        return getattr(backend, target) if isinstance(target, str) else partial(target, backend)
+
+
+# Registry of all backends, with the built-in backends as SolverBackend methods
+BACKENDS = BackendRegistry()
+for name in ('dwave', 'leap', 'hybrid', 'qaoa', 'qaoa_cached', 'sa'):
+    BACKENDS.register(name, f'solve_{name}')
+
+
+def register_backend(name, target):
+
+    """Registers a backend in the global registry, see BackendRegistry.register."""
+
+    BACKENDS.register(name, target)
 
 
 class SolverBackend:
@@ -18,14 +118,13 @@ class SolverBackend:
 
         """Initializes required variables and stores the supplied instance of the VehicleRouter object."""
 
-        # Store relevant data
+        # Store relevant data - default caches are created on first use
         self.vrp = vrp
+        self.embedding_cache = vrp.embedding_cache
+        self.qaoa_cache = vrp.qaoa_cache
 
-        # Solver dictionary
-        self.solvers = {'dwave': self.solve_dwave,
-                        'leap': self.solve_leap,
-                        'hybrid': self.solve_hybrid,
-                        'qaoa': self.solve_qaoa}
+        # Solver registry
+        self.solvers = BACKENDS
 
         # Initialize necessary variables
         self.dwave_result = None
@@ -33,49 +132,71 @@ class SolverBackend:
 
     def solve(self, solver, **params):
 
-        """Takes the solver as input and redirects control to the corresponding solver.
+        """Takes the solver as input and redirects control to the corresponding solver, which is imported from the
+        registry in self.solvers if it is selected for the first time.
         Args:
             solver: The selected solver.
             params: Parameters to send to the selected backend solver..
         """
 
         # Select solver and solve
-        solver = self.solvers[solver]
-        solver(**params)
+        backend = self.solvers.load(solver, self)
+        with self.vrp.tracer.span('solve', solver=solver, variables=self.vrp.bqm.num_variables,
+                                  reads=self.vrp.num_reads):
+            backend(**params)
 
     def solve_dwave(self, **params):
 
-        """Solve using DWaveSampler and EmbeddingComposite.
+        """Solve using DWaveSampler and FixedEmbeddingComposite, with embeddings looked up in self.embedding_cache.
         Args:
             params: inspect: Defaults to False. Set to True to run D-Wave inspector for the sampled solution.
             params: post_process: Defaults to False. Set to True to run classical post processing for improving the
                 D-Wave solution.
         """
 
+        # Import backend
+        from dwave.system import DWaveSampler, FixedEmbeddingComposite
+        from greedy import SteepestDescentSolver
+        from embedding_cache import EmbeddingCache
+
         # Resolve parameters
         params['solver'] = 'dwave'
         inspect = params.setdefault('inspect', False)
         post_process = params.setdefault('post_process', False)
+        if self.embedding_cache is None:
+            self.embedding_cache = EmbeddingCache()
+
+        # Find embedding
+        sampler = DWaveSampler()
+        with self.vrp.tracer.span('embedding') as span:
+            embedding = self.embedding_cache.get(self.vrp.bqm, sampler.edgelist)
+            span.update(hit=self.embedding_cache.hit, qubits=sum(len(chain) for chain in embedding.values()))
+        self.vrp.timing['embedding_time'] = self.embedding_cache.embedding_time
 
         # Solve
-        sampler = EmbeddingComposite(DWaveSampler())
-        result = sampler.sample(self.vrp.bqm, num_reads=self.vrp.num_reads, chain_strength=self.vrp.chain_strength)
+        sampler = FixedEmbeddingComposite(sampler, embedding)
+        with self.vrp.tracer.span('sampling', reads=self.vrp.num_reads):
+            result = sampler.sample(self.vrp.bqm, num_reads=self.vrp.num_reads,
+                                    chain_strength=self.vrp.chain_strength)
+            result.resolve()
 
         # Post process
         if not post_process:
             self.vrp.result = result
         else:
-            post_processor = SteepestDescentSolver()
-            self.vrp.result = post_processor.sample(self.vrp.bqm, num_reads=self.vrp.num_reads, initial_states=result)
+            with self.vrp.tracer.span('steepest_descent', reads=self.vrp.num_reads):
+                post_processor = SteepestDescentSolver()
+                self.vrp.result = post_processor.sample(self.vrp.bqm, num_reads=self.vrp.num_reads,
+                                                        initial_states=result)
 
         # Extract solution
         self.vrp.timing.update(result.info["timing"])
-        self.result_dict = self.vrp.result.first.sample
-        self.vrp.extract_solution(self.result_dict)
+        self.result_dict = self.vrp.extract_best_solution()
 
         # Inspection
         self.dwave_result = result
         if inspect:
+            import dwave.inspector
             dwave.inspector.show(result)
 
     def solve_hybrid(self, **params):
@@ -85,6 +206,9 @@ class SolverBackend:
             params: Additional parameters that may be required by a solver. Not required here.
         """
 
+        # Import backend
+        import hybrid
+
         # Resolve parameters
         params['solver'] = 'hybrid'
 
@@ -98,12 +222,12 @@ class SolverBackend:
 
         # Solve
         sampler = hybrid.HybridSampler(workflow)
-        self.vrp.result = sampler.sample(self.vrp.bqm, num_reads=self.vrp.num_reads,
-                                         chain_strength=self.vrp.chain_strength)
+        with self.vrp.tracer.span('sampling', reads=self.vrp.num_reads):
+            self.vrp.result = sampler.sample(self.vrp.bqm, num_reads=self.vrp.num_reads,
+                                             chain_strength=self.vrp.chain_strength)
 
         # Extract solution
-        self.result_dict = self.vrp.result.first.sample
-        self.vrp.extract_solution(self.result_dict)
+        self.result_dict = self.vrp.extract_best_solution()
 
     def solve_leap(self, **params):
 
@@ -112,34 +236,46 @@ class SolverBackend:
             params: Additional parameters that may be required by a solver. Not required here.
         """
 
+        # Import backend
+        from dwave.system import LeapHybridSampler
+
         # Resolve parameters
         params['solver'] = 'leap'
 
         # Solve
         sampler = LeapHybridSampler()
-        self.vrp.result = sampler.sample(self.vrp.bqm)
+        with self.vrp.tracer.span('sampling'):
+            self.vrp.result = sampler.sample(self.vrp.bqm)
+            self.vrp.result.resolve()
 
         # Extract solution
         self.vrp.timing.update(self.vrp.result.info)
-        self.result_dict = self.vrp.result.first.sample
-        self.vrp.extract_solution(self.result_dict)
+        self.result_dict = self.vrp.extract_best_solution()
 
     def solve_qaoa(self, **params):
 
-        """Solve using qiskit Minimum Eigen Optimizer based on a QAOA backend.
+        """Solve using qiskit Minimum Eigen Optimizer based on a QAOA backend. Solvers built with build_qp=False or
+        restored from the build cache build their quadratic program from the index based model first.
         Args:
             params: Additional parameters that may be required by a solver. Not required here.
         """
 
+        # Import backend
+        from qiskit_optimization.algorithms import MinimumEigenOptimizer
+        from qiskit.algorithms import QAOA
+        from qiskit import Aer
+
         # Resolve parameters
         params['solver'] = 'qaoa'
-        self.vrp.clock = time.time()
+        self.vrp.clock = time.perf_counter_ns()
 
         # Build optimizer and solve
         solver = QAOA(quantum_instance=Aer.get_backend('qasm_simulator'))
         optimizer = MinimumEigenOptimizer(min_eigen_solver=solver)
-        self.vrp.result = optimizer.solve(self.vrp.qp)
-        self.vrp.timing['qaoa_solution_time'] = (time.time() - self.vrp.clock) * 1e6
+        qp = self.vrp.require_quadratic_program()
+        with self.vrp.tracer.span('sampling', variables=qp.get_num_vars()):
+            self.vrp.result = optimizer.solve(qp)
+        self.vrp.timing['qaoa_solution_time'] = (time.perf_counter_ns() - self.vrp.clock) / 1e3
 
         # Build result dictionary
         self.result_dict = {self.vrp.result.variable_names[i]: self.vrp.result.x[i]
@@ -147,3 +283,163 @@ class SolverBackend:
 
         # Extract solution
         self.vrp.extract_solution(self.result_dict)
+
+    def solve_qaoa_cached(self, **params):
+
+        """Solve the BQM using QAOA with ansatz circuits and variational parameters looked up in self.qaoa_cache. The
+        Ising Hamiltonian is normalized to a max absolute bias of 1, its biases are bound to a cached transpiled ansatz
+        and the parameters are optimized with COBYLA starting from the parameters of earlier solves. The final state is
+        sampled num_reads times.
+        Args:
+            params: reps: No. of QAOA layers. Defaults to 1.
+            params: simulator: Set to 'statevector' to simulate the QAOA state exactly with NumPy, which is limited to
+                small problems, or 'qasm' to sample the transpiled ansatz on the Aer qasm simulator. Defaults to 'qasm'.
+            params: shots: No. of shots per expectation value on the qasm simulator. Defaults to 1024.
+            params: maxiter: Max no. of optimizer iterations. Defaults to 100.
+            params: max_qubits: Max no. of qubits of the statevector simulator. Defaults to 20.
+            params: seed: Seed for sampling the final state. Defaults to None.
+        """
+
+        # Import backend
+        import dimod
+        from scipy.optimize import minimize
+        from qaoa_cache import QaoaCache, evolve_statevector
+
+        # Resolve parameters
+        params['solver'] = 'qaoa_cached'
+        reps = params.setdefault('reps', 1)
+        simulator = params.setdefault('simulator', 'qasm')
+        shots = params.setdefault('shots', 1024)
+        maxiter = params.setdefault('maxiter', 100)
+        max_qubits = params.setdefault('max_qubits', 20)
+        rng = np.random.default_rng(params.setdefault('seed', None))
+        if self.qaoa_cache is None:
+            self.qaoa_cache = QaoaCache()
+        self.vrp.clock = time.perf_counter_ns()
+
+        # Extract normalized Ising Hamiltonian
+        labels = list(self.vrp.bqm.variables)
+        num_qubits = len(labels)
+        h, edges, J = self.qaoa_cache.ising(self.vrp.bqm, labels)
+        key = self.qaoa_cache.key(num_qubits, reps, edges, simulator)
+
+        # Build expectation function and sampler for the statevector simulator
+        if simulator == 'statevector':
+            if num_qubits > max_qubits:
+                raise ValueError(f'Statevector simulation is limited to {max_qubits} qubits, got {num_qubits}.')
+            bits = (np.arange(2 ** num_qubits)[:, None] >> np.arange(num_qubits)) & 1
+            spins = 2 * bits - 1
+            energies = spins @ h + (spins[:, edges[:, 0]] * spins[:, edges[:, 1]]) @ J
+
+            def expectation(point):
+                return np.abs(evolve_statevector(energies, point, num_qubits)) ** 2 @ energies
+
+            def sample(point):
+                probabilities = np.abs(evolve_statevector(energies, point, num_qubits)) ** 2
+                return bits[rng.choice(len(bits), size=self.vrp.num_reads, p=probabilities / probabilities.sum())]
+
+        # Build expectation function and sampler for the qasm simulator
+        elif simulator == 'qasm':
+            from qiskit import Aer
+            backend = Aer.get_backend('qasm_simulator')
+            with self.vrp.tracer.span('transpile', qubits=num_qubits, reps=reps) as span:
+                circuit = self.qaoa_cache.circuit(num_qubits, reps, edges, backend)
+                span.update(hit=self.qaoa_cache.hit)
+            self.vrp.timing['qaoa_transpile_time'] = self.qaoa_cache.transpile_time
+            self.vrp.timing['qaoa_transpile_hit'] = self.qaoa_cache.hit
+
+            def run(point, num_shots):
+                bound = self.qaoa_cache.bind(circuit, point, h, J)
+                counts = backend.run(bound, shots=num_shots).result().get_counts()
+                states = np.array([int(state.replace(' ', ''), 2) for state in counts])
+                return (states[:, None] >> np.arange(num_qubits)) & 1, np.array(list(counts.values()))
+
+            def expectation(point):
+                states, counts = run(point, shots)
+                spins = 2 * states - 1
+                energies = spins @ h + (spins[:, edges[:, 0]] * spins[:, edges[:, 1]]) @ J
+                return counts @ energies / counts.sum()
+
+            def sample(point):
+                states, counts = run(point, self.vrp.num_reads)
+                return np.repeat(states, counts, axis=0)
+
+        else:
+            raise ValueError(f'Unknown QAOA simulator: {simulator}.')
+
+        # Optimize variational parameters from the cached initial point
+        initial_point = self.qaoa_cache.initial_point(key, reps)
+        with self.vrp.tracer.span('optimization', warm_start=self.qaoa_cache.warm_start) as span:
+            optimum = minimize(expectation, initial_point, method='COBYLA', options={'maxiter': maxiter})
+            span.update(evaluations=optimum.nfev)
+        self.qaoa_cache.store(key, optimum.x)
+
+        # Sample final state
+        with self.vrp.tracer.span('sampling', reads=self.vrp.num_reads):
+            self.vrp.result = dimod.SampleSet.from_samples_bqm((sample(optimum.x), labels), self.vrp.bqm)
+        self.vrp.timing['qaoa_solution_time'] = (time.perf_counter_ns() - self.vrp.clock) / 1e3
+        self.vrp.timing['qaoa_warm_start'] = self.qaoa_cache.warm_start
+        self.vrp.timing['qaoa_evaluations'] = optimum.nfev
+
+        # Extract solution
+        self.result_dict = self.vrp.extract_best_solution()
+
+    def solve_sa(self, **params):
+
+        """Solve locally using simulated annealing, with the reads split across a pool of worker processes.
+        Args:
+            params: workers: No. of worker processes. Defaults to the number of CPU cores.
+            params: num_sweeps: No. of sweeps per read. Defaults to 1000.
+            params: seed: Seed for the random number generators of the workers. Defaults to None, which sets a random
+                seed.
+        """
+
+        # Resolve parameters
+        params['solver'] = 'sa'
+        workers = params.setdefault('workers', os.cpu_count())
+        num_sweeps = params.setdefault('num_sweeps', 1000)
+        seed = params.setdefault('seed', None)
+        self.vrp.clock = time.perf_counter_ns()
+
+        # Split reads and seeds across workers - the sampler only accepts 31 bit seeds
+        reads = [len(chunk) for chunk in np.array_split(np.arange(self.vrp.num_reads), workers) if len(chunk)]
+        seeds = (np.random.SeedSequence(seed).generate_state(len(reads)) >> 1).tolist()
+
+        # Solve
+        with self.vrp.tracer.span('sampling', reads=self.vrp.num_reads, sweeps=num_sweeps, workers=len(reads)):
+            if len(reads) == 1:
+                results = [sample_simulated_annealing(self.vrp.bqm, reads[0], num_sweeps, seeds[0])]
+            else:
+                with ProcessPoolExecutor(max_workers=len(reads)) as executor:
+                    results = list(executor.map(sample_simulated_annealing, [self.vrp.bqm] * len(reads), reads,
+                                                [num_sweeps] * len(reads), seeds))
+
+            # Merge samplesets
+            import dimod
+            self.vrp.result = dimod.concatenate([result for result, _ in results])
+        self.vrp.timing['sa_solution_time'] = (time.perf_counter_ns() - self.vrp.clock) / 1e3
+        self.vrp.timing['sa_worker_times'] = [worker_time for _, worker_time in results]
+
+        # Extract solution
+        self.result_dict = self.vrp.extract_best_solution()
+
+
+def sample_simulated_annealing(bqm, num_reads, num_sweeps, seed):
+
+    """Samples a BQM with simulated annealing. Defined at module level so that it can be sent to worker processes.
+    Args:
+        bqm: The BQM to sample.
+        num_reads: No. of reads.
+        num_sweeps: No. of sweeps per read.
+        seed: Seed for the random number generator.
+    Returns:
+        The sampleset and the sampling time in microseconds.
+    """
+
+    # Import sampler
+    from neal import SimulatedAnnealingSampler
+
+    # Solve and time execution
+    clock = time.perf_counter_ns()
+    result = SimulatedAnnealingSampler().sample(bqm, num_reads=num_reads, num_sweeps=num_sweeps, seed=seed)
+    return result, (time.perf_counter_ns() - clock) / 1e3
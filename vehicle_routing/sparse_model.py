@@ -0,0 +1,438 @@
+import numpy as np
+
+from scipy.sparse import coo_matrix, csr_matrix, vstack
+
+
+class SparseModel:
+
+    """Index-based representation of a binary quadratic program with linear constraints. The objective and the
+    constraints are held as NumPy arrays and scipy sparse matrices over contiguous integer variable indices instead
+    of name-keyed dictionaries."""
+
+    # Absolute tolerance used in all feasibility checks
+    tolerance = 1e-6
+
+    def __init__(self, num_variables, linear, quadratic, constant=0.0):
+
+        """Initializes the objective and an empty constraint set.
+        Args:
+            num_variables: No. of binary variables in the model.
+            linear: Array of length num_variables containing the linear objective coefficients.
+            quadratic: num_variables x num_variables scipy sparse matrix containing the quadratic objective
+                coefficients.
+            constant: Constant offset of the objective. Defaults to 0.
+        """
+
+        # Store objective
+        self.num_variables = num_variables
+        self.set_objective(linear, quadratic, constant)
+
+        # Initialize constraints
+        self.constraints = csr_matrix((0, num_variables))
+        self.rhs = np.zeros(0)
+        self.sense = np.zeros(0, dtype='<U2')
+        self.constraint_names = []
+
+    def set_objective(self, linear, quadratic, constant=0.0):
+
+        """Replaces the objective while keeping the variables and constraints.
+        Args:
+            linear: Array of length num_variables containing the linear objective coefficients.
+            quadratic: num_variables x num_variables scipy sparse matrix containing the quadratic objective
+                coefficients.
+            constant: Constant offset of the objective. Defaults to 0.
+        """
+
+        # Store objective
+        self.linear = np.asarray(linear, dtype=float)
+        self.quadratic = coo_matrix(quadratic, shape=(self.num_variables, self.num_variables))
+        self.constant = constant
+
+    @classmethod
+    def from_quadratic_program(cls, qp):
+
+        """Extracts the objective and linear constraints of a qiskit QuadraticProgram with only binary variables.
+        Args:
+            qp: The quadratic program. Maximization problems are negated into minimization problems.
+        Returns:
+            The equivalent SparseModel.
+        """
+
+        # Extract objective
+        sign = qp.objective.sense.value
+        model = cls(qp.get_num_vars(), sign * qp.objective.linear.to_array(),
+                    sign * qp.objective.quadratic.coefficients.tocoo(), sign * qp.objective.constant)
+
+        # Extract constraints
+        if qp.linear_constraints:
+            senses = {'EQ': '==', 'LE': '<=', 'GE': '>='}
+            model.add_constraints(vstack([c.linear.coefficients for c in qp.linear_constraints]),
+                                  [c.rhs for c in qp.linear_constraints],
+                                  [senses[c.sense.name] for c in qp.linear_constraints],
+                                  [c.name for c in qp.linear_constraints])
+
+        # Return output
+        return model
+
+    @classmethod
+    def from_arrays(cls, data):
+
+        """Restores a model from the arrays returned by to_arrays.
+        Args:
+            data: Dictionary of NumPy arrays.
+        Returns:
+            The restored SparseModel.
+        """
+
+        # Restore objective
+        num_variables = int(data['num_variables'])
+        model = cls(num_variables, data['linear'], coo_matrix((data['quadratic_data'], (data['quadratic_row'],
+                                                                                        data['quadratic_col'])),
+                                                              shape=(num_variables, num_variables)),
+                    float(data['constant']))
+
+        # Restore constraints
+        model.constraints = csr_matrix((data['constraints_data'], data['constraints_indices'],
+                                        data['constraints_indptr']), shape=(len(data['rhs']), num_variables))
+        model.rhs = data['rhs'].astype(float)
+        model.sense = data['sense'].astype('<U2')
+        model.constraint_names = data['constraint_names'].tolist()
+
+        # Return output
+        return model
+
+    def to_arrays(self):
+
+        """Exports the model as a dictionary of NumPy arrays without any Python objects, e.g. for storing as .npz.
+        Returns:
+            Dictionary of NumPy arrays.
+        """
+
+        # Export objective and constraints
+        return {'num_variables': np.array(self.num_variables), 'linear': self.linear,
+                'quadratic_row': self.quadratic.row, 'quadratic_col': self.quadratic.col,
+                'quadratic_data': self.quadratic.data, 'constant': np.array(self.constant),
+                'constraints_data': self.constraints.data, 'constraints_indices': self.constraints.indices,
+                'constraints_indptr': self.constraints.indptr, 'rhs': self.rhs, 'sense': self.sense,
+                'constraint_names': np.array(self.constraint_names, dtype=str)}
+
+    def add_constraints(self, matrix, rhs, sense, names):
+
+        """Appends a block of linear constraints of the form matrix @ x (sense) rhs.
+        Args:
+            matrix: k x num_variables sparse matrix of constraint coefficients.
+            rhs: Array of k right hand side values.
+            sense: Constraint sense, one of '==', '<=' or '>='. Either a single string or an array of k strings.
+            names: List of k constraint names.
+        """
+
+        # Resolve inputs
+        matrix = csr_matrix(matrix, shape=(matrix.shape[0], self.num_variables))
+        rhs = np.broadcast_to(np.asarray(rhs, dtype=float), (matrix.shape[0],))
+        sense = np.broadcast_to(np.asarray(sense, dtype='<U2'), (matrix.shape[0],))
+
+        # Append constraints
+        self.constraints = vstack([self.constraints, matrix], format='csr')
+        self.rhs = np.concatenate([self.rhs, rhs])
+        self.sense = np.concatenate([self.sense, sense])
+        self.constraint_names += list(names)
+
+    def add_one_hot_constraints(self, index, axis, names):
+
+        """Appends equality constraints forcing exactly one variable to be active along the given axes of an index
+        tensor.
+        Args:
+            index: Integer array mapping a multidimensional position to its variable index.
+            axis: Axis or tuple of axes of index that are summed over within a single constraint.
+            names: List of constraint names, one per remaining position of index after summation.
+        """
+
+        # Move summed axes to the end and flatten to (constraints, terms)
+        axis = (axis,) if np.isscalar(axis) else tuple(axis)
+        keep = [i for i in range(index.ndim) if i not in axis]
+        rows = np.transpose(index, keep + list(axis)).reshape(len(names), -1)
+
+        # Build constraint matrix
+        row_ids = np.repeat(np.arange(rows.shape[0]), rows.shape[1])
+        matrix = coo_matrix((np.ones(rows.size), (row_ids, rows.reshape(-1))), shape=(rows.shape[0],
+                                                                                       self.num_variables))
+        self.add_constraints(matrix, 1, '==', names)
+
+    def evaluate(self, samples):
+
+        """Evaluates the objective, excluding any constraint penalties, for many samples at once.
+        Args:
+            samples: Array of shape (num_samples, num_variables) or (num_variables,).
+        Returns:
+            Array of num_samples objective values.
+        """
+
+        # Evaluate linear and quadratic terms row wise
+        samples = np.atleast_2d(np.asarray(samples, dtype=float))
+        quadratic = (self.quadratic @ samples.T).T
+        return samples @ self.linear + np.einsum('ij,ij->i', quadratic, samples) + self.constant
+
+    def violations(self, samples):
+
+        """Evaluates by how much every constraint is violated for many samples at once.
+        Args:
+            samples: Array of shape (num_samples, num_variables) or (num_variables,).
+        Returns:
+            Array of shape (num_samples, num_constraints) containing the absolute residual of equality constraints and
+            the positive part of the residual of inequality constraints.
+        """
+
+        # Evaluate constraint residuals
+        samples = np.atleast_2d(np.asarray(samples, dtype=float))
+        residual = (self.constraints @ samples.T).T - self.rhs
+
+        # Resolve violation by sense
+        return np.where(self.sense == '==', np.abs(residual),
+                        np.maximum(np.where(self.sense == '<=', residual, -residual), 0))
+
+    def get_feasibility_info(self, data, variable_names):
+
+        """Evaluates the feasibility of a single solution like qiskit's QuadraticProgram.get_feasibility_info, without
+        requiring the quadratic program. Variables and constraints are returned by name instead of as qiskit objects.
+        Args:
+            data: Values of the num_variables variables.
+            variable_names: Array of num_variables variable names in index order.
+        Returns:
+            A 3-tuple containing a boolean value indicating whether the solution is feasible or not, a list of names of
+            variables outside their binary bounds and a list of names of violated constraints.
+        """
+
+        # Evaluate bounds and constraints
+        data = np.asarray(data, dtype=float).reshape(-1)
+        violated_variables = np.flatnonzero((data < -self.tolerance) | (data > 1 + self.tolerance))
+        violated_constraints = np.flatnonzero(self.violations(data)[0] > self.tolerance)
+
+        # Return output
+        return (len(violated_variables) == 0 and len(violated_constraints) == 0,
+                [variable_names[i] for i in violated_variables],
+                [self.constraint_names[i] for i in violated_constraints])
+
+    def get_feasibility_masks(self, samples):
+
+        """Evaluates the feasibility of many solutions at once with a single sparse product against the constraint
+        matrix.
+        Args:
+            samples: Array of shape (num_samples, num_variables) or (num_variables,).
+        Returns:
+            A 3-tuple containing a boolean array of num_samples feasibility flags, a boolean array of shape
+            (num_samples, num_constraints) marking the violated constraints of every sample and an array of
+            num_constraints counts of samples violating each constraint.
+        """
+
+        # Check bounds and constraints
+        samples = np.atleast_2d(np.asarray(samples, dtype=float))
+        in_bounds = ((samples >= -self.tolerance) & (samples <= 1 + self.tolerance)).all(axis=1)
+        violated = self.violations(samples) > self.tolerance
+
+        # Return output
+        return in_bounds & ~violated.any(axis=1), violated, violated.sum(axis=0)
+
+    def to_quadratic_program(self, variable_names, name='Vehicle Routing Problem'):
+
+        """Builds a qiskit QuadraticProgram equivalent to this model.
+        Args:
+            variable_names: Array of num_variables variable names in index order.
+            name: Name of the quadratic program.
+        Returns:
+            A QuadraticProgram with binary variables, objective and linear constraints matching this model.
+        """
+
+        # Add variables
+        from qiskit_optimization import QuadraticProgram
+        qp = QuadraticProgram(name=name)
+        for var in variable_names:
+            qp.binary_var(name=var)
+
+        # Add objective as an upper triangular matrix without explicit zeros, as qiskit stores name-keyed dictionaries
+        quadratic = upper_triangular(self.quadratic)
+        qp.minimize(constant=self.constant, linear=self.linear, quadratic=quadratic)
+
+        # Add constraints
+        for k in range(self.constraints.shape[0]):
+            qp.linear_constraint(linear=self.constraints[k], sense=self.sense[k], rhs=self.rhs[k],
+                                 name=self.constraint_names[k])
+
+        # Return output
+        return qp
+
+
+def upper_triangular(matrix):
+
+    """Folds a square sparse matrix into upper triangular form by adding every (j, i) coefficient to (i, j), which is
+    how qiskit stores quadratic coefficients.
+    Args:
+        matrix: Square scipy sparse matrix.
+    Returns:
+        The upper triangular matrix in CSR format with duplicates summed and explicit zeros removed.
+    """
+
+    # Fold lower triangle onto upper triangle
+    matrix = coo_matrix(matrix)
+    upper = matrix.row <= matrix.col
+    rows = np.where(upper, matrix.row, matrix.col)
+    cols = np.where(upper, matrix.col, matrix.row)
+    matrix = csr_matrix((matrix.data, (rows, cols)), shape=matrix.shape)
+
+    # Clean up
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()
+    return matrix
+
+
+def candidate_edges(cost, neighbors):
+
+    """Selects the candidate edges of a routing problem as the edges between every node and its nearest neighbours
+    under the cost matrix. The edges are symmetrized, and all depot edges and self loops are always candidates.
+    Args:
+        cost: Cost matrix including the depot as node 0.
+        neighbors: No. of nearest neighbours per node.
+    Returns:
+        Boolean mask of the same shape as the cost matrix marking candidate edges.
+    """
+
+    # Initialization
+    cost = np.asarray(cost, dtype=float)
+    size = len(cost)
+    neighbors = min(neighbors, size - 1)
+    candidates = np.zeros((size, size), dtype=bool)
+
+    # Select nearest neighbours per row, excluding the node itself
+    if neighbors > 0:
+        distance = cost + np.diag(np.full(size, np.inf))
+        nearest = np.argpartition(distance, neighbors - 1, axis=1)[:, :neighbors]
+        candidates[np.arange(size)[:, None], nearest] = True
+
+    # Symmetrize and add depot edges and self loops
+    candidates |= candidates.T
+    candidates[0, :] = True
+    candidates[:, 0] = True
+    np.fill_diagonal(candidates, True)
+
+    # Return output
+    return candidates
+
+
+def build_position_model(cost, n_vehicles, n_nodes, n_steps, candidates=None):
+
+    """Builds the position based routing model shared by FQS and APS without formatting any variable names. The
+    variable x.i.j.k (vehicle i, node j, step k) is mapped to the index of position (i - 1, j, k - 1) in an array of
+    shape (n_vehicles, n_nodes + 1, n_steps), matching the layout of self.variables in these solvers.
+    Args:
+        cost: (n_nodes + 1) x (n_nodes + 1) cost matrix.
+        n_vehicles: No. of vehicles.
+        n_nodes: No. of nodes excluding the depot.
+        n_steps: No. of time steps per vehicle.
+        candidates: Boolean mask of candidate edges passed to build_position_objective. Defaults to None.
+    Returns:
+        The SparseModel for the routing problem and the integer index tensor of shape
+        (n_vehicles, n_nodes + 1, n_steps).
+    """
+
+    # Initialization
+    index = np.arange(n_vehicles * (n_nodes + 1) * n_steps).reshape(n_vehicles, n_nodes + 1, n_steps)
+    linear, quadratic = build_position_objective(cost, index, np.arange(n_nodes + 1), index.size, candidates=candidates)
+
+    # Build model
+    model = SparseModel(index.size, linear, quadratic)
+
+    # Add constraints - single delivery per client
+    model.add_one_hot_constraints(index[:, 1:, :], axis=(0, 2),
+                                  names=[f'single_delivery_{k}' for k in range(1, n_nodes + 1)])
+
+    # Add constraints - vehicle at one place at one time
+    model.add_one_hot_constraints(index, axis=1, names=[f'single_location_{m + 1}_{n + 1}' for m in range(n_vehicles)
+                                                        for n in range(n_steps)])
+
+    # Return output
+    return model, index
+
+
+def position_model_size(n_vehicles, n_nodes, n_steps, num_edges, depot=True):
+
+    """Evaluates an upper bound on the size of the BQM of a position based routing model before building it, as the
+    no. of variables and the no. of couplings of the objective and of the one-hot constraints.
+    Args:
+        n_vehicles: No. of vehicles.
+        n_nodes: No. of nodes excluding the depot.
+        n_steps: No. of time steps per vehicle.
+        num_edges: No. of edges coupling consecutive steps, e.g. the no. of candidate edges.
+        depot: Set to False for models without depot positions, e.g. SPS. Defaults to True.
+    Returns:
+        Dictionary containing the no. of variables and the max no. of interactions.
+    """
+
+    # Count positions and couplings
+    positions = n_nodes + 1 if depot else n_nodes
+    steps = n_vehicles * n_steps
+    objective = n_vehicles * max(n_steps - 1, 0) * num_edges
+    single_delivery = n_nodes * steps * (steps - 1) // 2
+    single_location = steps * positions * (positions - 1) // 2
+
+    # Return output
+    return {'num_variables': steps * positions, 'num_interactions': objective + single_delivery + single_location}
+
+
+def build_position_objective(cost, index, nodes, num_variables, self_loops=True, candidates=None):
+
+    """Builds the routing objective of position based formulations, in which variable index[g, a, t] indicates that
+    route g visits node nodes[a] at step t. Every route leaves the depot before its first step and returns to it after
+    its last step.
+
+    If candidate edges are supplied, consecutive steps are only coupled along candidate edges. Every coupling is then
+    shifted by the max cost M and M is added to every variable before the last step, so that solutions satisfying the
+    one-hot constraints per step keep their exact energy if they only use candidate edges, and pay M for every other
+    edge.
+    Args:
+        cost: Cost matrix including the depot as node 0.
+        index: Integer array of shape (num_routes, num_nodes, num_steps) containing variable indices.
+        nodes: Array of num_nodes node labels. Linear terms are skipped for the depot.
+        num_variables: Total no. of variables in the model.
+        self_loops: Set to False to skip quadratic terms between the same node in consecutive steps. Defaults to True.
+        candidates: Boolean mask over the cost matrix marking candidate edges, e.g. from candidate_edges. Defaults to
+            None, which couples all edges.
+    Returns:
+        The linear objective coefficients as an array of length num_variables and the quadratic objective coefficients
+        as a sparse matrix.
+    """
+
+    # Initialization
+    cost = np.asarray(cost, dtype=float)
+    nodes = np.asarray(nodes)
+    num_routes, num_nodes, num_steps = index.shape
+    linear = np.zeros(num_variables)
+
+    # Build linear terms - leaving and returning to the depot
+    clients = nodes != 0
+    np.add.at(linear, index[:, clients, 0].reshape(-1), np.tile(cost[0, nodes[clients]], num_routes))
+    np.add.at(linear, index[:, clients, -1].reshape(-1), np.tile(cost[nodes[clients], 0], num_routes))
+
+    # Build quadratic terms - node a at step t followed by node b at step t + 1
+    shape = (num_routes, num_nodes, num_nodes, num_steps - 1)
+    rows = np.broadcast_to(index[:, :, None, :-1], shape)
+    cols = np.broadcast_to(index[:, None, :, 1:], shape)
+    edge_cost = cost[np.ix_(nodes, nodes)]
+    keep = np.ones((num_nodes, num_nodes), dtype=bool) if self_loops else ~np.eye(num_nodes, dtype=bool)
+
+    # Restrict quadratic terms to candidate edges
+    if candidates is not None:
+        bonus = cost.max()
+        edge_cost = edge_cost - bonus
+        keep &= candidates[np.ix_(nodes, nodes)]
+        np.add.at(linear, index[:, :, :-1].reshape(-1), bonus)
+
+    # Select quadratic terms
+    values = np.broadcast_to(edge_cost[None, :, :, None], shape)
+    if keep.all():
+        rows, cols, values = rows.reshape(-1), cols.reshape(-1), values.reshape(-1)
+    else:
+        keep = np.broadcast_to(keep[None, :, :, None], shape)
+        rows, cols, values = rows[keep], cols[keep], values[keep]
+    quadratic = coo_matrix((values, (rows, cols)), shape=(num_variables, num_variables))
+
+    # Return output
+    return linear, quadratic
@@ -0,0 +1,64 @@
+import pytest
+import batch_solver
+
+from utility import generate_vrp_instance
+from batch_solver import solve_many
+from qaoa_cache import QaoaCache
+from embedding_cache import EmbeddingCache
+from route_activation_solver import RouteActivationSolver
+from solution_partition_solver import SolutionPartitionSolver
+
+
+def test_solve_many_streams_all_instances():
+
+    instances = [(4, 2, generate_vrp_instance(4, seed)[0]) for seed in range(4)]
+    results = list(solve_many(SolutionPartitionSolver, instances, workers=2, solver_params={'num_reads': 20},
+                              solve_params={'seed': 0, 'num_sweeps': 100}))
+
+    assert sorted(result['index'] for result in results) == [0, 1, 2, 3]
+    assert all(result['error'] is None and result['routes'] is not None for result in results)
+
+
+def test_solve_many_without_route_decoding():
+
+    instances = [(4, 2, generate_vrp_instance(4, seed)[0]) for seed in range(2)]
+    results = list(solve_many(RouteActivationSolver, instances, workers=2, solver_params={'num_reads': 20},
+                              solve_params={'seed': 0, 'num_sweeps': 100}))
+
+    assert all(result['error'] is None for result in results)
+    assert all(result['routes'] is None and result['cost'] is not None for result in results)
+
+
+def test_solve_many_results_match_their_instances():
+
+    # Results stream in submission order with a single instance in flight
+    instances = [(4, 2, generate_vrp_instance(4, seed)[0]) for seed in range(4)]
+    results = list(solve_many(SolutionPartitionSolver, instances, workers=2, max_pending=1,
+                              solver_params={'num_reads': 20}, solve_params={'seed': 0, 'num_sweeps': 100}))
+    assert [result['index'] for result in results] == [0, 1, 2, 3]
+
+    # The result of every index is the result of solving its instance alone
+    for result, args in zip(results, instances):
+        vrp = SolutionPartitionSolver(*args, solver='sa', num_reads=20)
+        vrp.solve(seed=0, num_sweeps=100, workers=1)
+        assert result['cost'] == pytest.approx(float(vrp.evaluate_vrp_cost()))
+
+
+def test_worker_caches_are_shared_by_instances(monkeypatch):
+
+    monkeypatch.setattr(batch_solver, 'WORKER_CACHES', {})
+    batch_solver.initialize_worker('solution_partition_solver')
+    caches = dict(batch_solver.WORKER_CACHES)
+    assert isinstance(caches['embedding_cache'], EmbeddingCache)
+    assert isinstance(caches['qaoa_cache'], QaoaCache)
+
+    # Every instance solved by the worker receives the same caches
+    built = []
+    monkeypatch.setattr(SolutionPartitionSolver, 'rebuild', lambda self: built.append(self))
+    for index in range(2):
+        batch_solver.solve_instance(index, SolutionPartitionSolver, (4, 2, generate_vrp_instance(4, index)[0]),
+                                    {'solver': 'sa'}, {})
+    assert len(built) == 2
+    assert all(vrp.embedding_cache is caches['embedding_cache'] for vrp in built)
+    assert all(vrp.qaoa_cache is caches['qaoa_cache'] for vrp in built)
+
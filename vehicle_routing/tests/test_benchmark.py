@@ -0,0 +1,33 @@
+import sys
+import csv
+import json
+import benchmark
+
+
+def test_benchmark_smoke_run(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(sys, 'argv', ['benchmark.py', '--solvers', 'fqs', 'capc_sps', '--n', '3', '4', '--m', '1', '2',
+                                      '--num-reads', '5', '--num-sweeps', '20', '--output', str(tmp_path)])
+    benchmark.main()
+
+    # Every run is recorded without errors in both outputs
+    with open(tmp_path / 'benchmark.json') as file:
+        records = json.load(file)
+    with open(tmp_path / 'benchmark.csv', newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert len(records) == len(rows) == 8
+    assert all(record['error'] is None for record in records)
+    assert all(record[key] is not None for record in records for key in ('build_time', 'num_variables',
+                                                                          'peak_memory', 'solve_time', 'route_cost'))
+
+    # Complexity plots are regenerated
+    for name in ('fqs_complexity.png', 'capc_sps_complexity.png', 'qubit_complexity.png'):
+        assert (tmp_path / name).exists()
+
+
+def test_sweep_skips_more_vehicles_than_clients():
+
+    records = list(benchmark.sweep(['sps'], [2], [1, 3], track_memory=False, solver_params={'num_reads': 5},
+                                   solve_params={'num_sweeps': 20}))
+
+    assert [(record['n'], record['m']) for record in records] == [(2, 1)]
@@ -0,0 +1,52 @@
+import pytest
+
+from utility import generate_vrp_instance, generate_cvrp_instance
+from clustered_tsp_solver import ClusteredTspSolver, CapcClusteredTspSolver
+
+
+def test_clustering_timing():
+
+    cost, _, _ = generate_vrp_instance(6, 0)
+    vrp = ClusteredTspSolver(6, 2, cost, clustering_solver='kmedoids', clustering_params={'seed': 0})
+
+    assert isinstance(vrp.timing['clustering_time'], float)
+    assert vrp.timing['clustering_info'] == vrp.cluster.result.info
+
+
+def test_capacitated_clustering_timing():
+
+    cost, _, _, capacity, demand = generate_cvrp_instance(6, 2, 0)
+    vrp = CapcClusteredTspSolver(6, 2, cost, capacity, demand, clustering_solver='sa', clustering_params={'seed': 0})
+
+    assert isinstance(vrp.timing['clustering_time'], float)
+    assert vrp.timing['clustering_info'] == vrp.cluster.result.info
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_parallel_clusters_stitch_cluster_routes(executor):
+
+    cost, _, _ = generate_vrp_instance(6, 0)
+    vrp = ClusteredTspSolver(6, 2, cost, solver='sa', num_reads=10, clustering_solver='kmedoids',
+                             clustering_params={'seed': 0}, parallel_clusters=True)
+    vrp.solve(cluster_executor=executor, num_sweeps=100, seed=0)
+    clusters = [i for i in range(2) if vrp.cluster_dict[i]]
+
+    # Every cluster is routed over exactly its own nodes
+    routes = vrp.decode_routes()[0]
+    for i in range(2):
+        assert sorted(routes[i].tolist()) == sorted(vrp.cluster_dict[i])
+
+    # Timings and spans of every subproblem are merged
+    assert len(vrp.timing['cluster_timing']) == len(clusters)
+    assert vrp.timing['cluster_solution_time'] > 0
+    names = [span['name'] for span in vrp.tracer.spans]
+    assert names.count('cluster_solve') == 1 and names.count('rebuild') >= len(clusters)
+    assert vrp.sample_metrics['feasible'][vrp.sample_index]
+
+
+def test_parallel_clusters_reject_unknown_executor():
+
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = ClusteredTspSolver(4, 2, cost, solver='sa', clustering_solver='kmedoids', parallel_clusters=True)
+    with pytest.raises(ValueError):
+        vrp.solve(cluster_executor='cluster')
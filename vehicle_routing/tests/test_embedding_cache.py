@@ -0,0 +1,70 @@
+import os
+import dimod
+import pytest
+
+from embedding_cache import EmbeddingCache
+
+dnx = pytest.importorskip('dwave_networkx')
+
+
+def ring_bqm(labels, bias=1.0):
+
+    # Ring of interactions over the supplied labels
+    return dimod.BQM({label: bias for label in labels},
+                     {(labels[i], labels[(i + 1) % len(labels)]): bias for i in range(len(labels))}, 0.0,
+                     dimod.BINARY)
+
+
+def test_key_canonicalization():
+
+    target = dnx.chimera_graph(2)
+    cache = EmbeddingCache()
+    bqm = ring_bqm(['a', 'b', 'c', 'd'])
+
+    # Biases and the order of variables and interactions do not change the key
+    reordered = dimod.BQM({'d': 3.0, 'c': 0.0, 'b': 1.0, 'a': 2.0},
+                          {('a', 'd'): -1.0, ('c', 'd'): 2.0, ('c', 'b'): 1.0, ('a', 'b'): 5.0}, 1.0, dimod.BINARY)
+    assert cache.key(reordered, target) == cache.key(bqm, target)
+
+    # Edge lists with reordered or reversed couplers give the key of the graph
+    edges = [(v, u) for u, v in reversed(list(target.edges))]
+    assert cache.key(bqm, edges) == cache.key(bqm, target)
+
+    # Different interactions or targets change the key
+    assert cache.key(ring_bqm(['a', 'c', 'b', 'd']), target) != cache.key(bqm, target)
+    assert cache.key(bqm, dnx.chimera_graph(1)) != cache.key(bqm, target)
+
+
+def test_disk_round_trip(tmp_path):
+
+    target = dnx.chimera_graph(2)
+    bqm = ring_bqm(['a', 'b', 'c', 'd', 'e'])
+
+    # A miss finds and stores the embedding
+    cache = EmbeddingCache(str(tmp_path), random_seed=0)
+    embedding = cache.get(bqm, target)
+    assert cache.hit is False
+    assert os.path.exists(cache.path(cache.key(bqm, target)))
+
+    # A new cache on the same directory loads it from disk
+    restored = EmbeddingCache(str(tmp_path))
+    assert restored.get(bqm, target) == embedding
+    assert restored.hit is True
+    assert restored.embedding_time is not None
+
+
+def test_get_remaps_labels():
+
+    target = dnx.chimera_graph(2)
+    cache = EmbeddingCache(random_seed=0)
+
+    # Integer labels with the same string labels share the embedding and get it under their own labels
+    bqm = ring_bqm([0, 1, 2, 3])
+    embedding = cache.get(ring_bqm(['0', '1', '2', '3']), target)
+    remapped = cache.get(bqm, target)
+    assert cache.hit is True
+    assert remapped == {int(label): chain for label, chain in embedding.items()}
+
+    # Every interaction is covered by a coupler between the chains of its variables
+    for u, v in bqm.quadratic:
+        assert any(target.has_edge(p, q) for p in remapped[u] for q in remapped[v])
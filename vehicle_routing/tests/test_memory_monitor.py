@@ -0,0 +1,64 @@
+import pytest
+import tracemalloc
+import memory_monitor
+
+from utility import generate_vrp_instance
+from full_qubo_solver import FullQuboSolver
+from memory_monitor import MemoryMonitor, MemoryBudgetError, BYTES_PER_INTERACTION
+
+
+def test_calibrate_measures_both_modes():
+
+    defaults = dict(BYTES_PER_INTERACTION)
+    measured = memory_monitor.calibrate(n=6)
+
+    assert set(measured) == set(BYTES_PER_INTERACTION)
+    assert 0 < measured['sparse'] < measured['dict']
+    assert BYTES_PER_INTERACTION == defaults
+
+
+def test_stage_without_reset_peak(monkeypatch):
+
+    monkeypatch.delattr(tracemalloc, 'reset_peak')
+    monitor = MemoryMonitor(track=True)
+    with monitor.stage('build'):
+        data = list(range(10000))
+
+    assert monitor.stages['build']['traced_peak'] >= monitor.stages['build']['traced_delta'] > 0
+    assert len(data) == 10000
+
+
+def test_stages_are_accounted_in_timing():
+
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = FullQuboSolver(4, 2, cost, solver='sa', num_reads=5, track_memory=True)
+    vrp.solve(num_sweeps=20, seed=0)
+
+    assert set(vrp.timing['memory']) == {'build_quadratic_program', 'build_bqm', 'solve'}
+    for stage in vrp.timing['memory'].values():
+        assert stage['traced_peak'] >= max(stage['traced_delta'], 0)
+        assert stage['rss'] > 0
+    assert not tracemalloc.is_tracing()
+
+
+def test_budget_raises_or_falls_back(monkeypatch):
+
+    # Measure the estimates with a resident set size of zero, so that the budget only covers the build
+    monkeypatch.setattr(MemoryMonitor, 'rss', staticmethod(lambda: 0))
+    cost, _, _ = generate_vrp_instance(6, 0)
+    dict_estimate = FullQuboSolver(6, 2, cost).estimate_memory()
+    sparse_estimate = FullQuboSolver(6, 2, cost, vectorized=True).estimate_memory()
+    assert sparse_estimate < dict_estimate
+
+    with pytest.raises(MemoryBudgetError):
+        FullQuboSolver(6, 2, cost, max_memory=sparse_estimate)
+
+    vrp = FullQuboSolver(6, 2, cost, max_memory=sparse_estimate, memory_fallback=True)
+    assert vrp.timing['memory_fallback'] == ['index_build']
+    assert vrp.timing['memory_estimate'] == sparse_estimate
+    assert vrp.vectorized and vrp.qp is None
+
+    budget = FullQuboSolver(6, 2, cost, vectorized=True, neighbors=3).estimate_memory()
+    vrp = FullQuboSolver(6, 2, cost, max_memory=budget, memory_fallback=True)
+    assert vrp.timing['memory_fallback'] == ['index_build', 'neighbors_3']
+    assert vrp.timing['memory_estimate'] == budget
@@ -0,0 +1,102 @@
+import warnings
+import numpy as np
+import pytest
+
+from itertools import product
+from utility import generate_vrp_instance, generate_cvrp_instance
+from node_clustering import NodeClustering, CapcNodeClustering
+
+
+def test_sa_emits_no_warnings():
+
+    cost, _, _, capacity, demand = generate_cvrp_instance(6, 2, 0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        cluster = NodeClustering(6, 2, cost[1:, 1:], solver='sa')
+        cluster.solve(seed=0, num_sweeps=50)
+        capc_cluster = CapcNodeClustering(6, 2, cost[1:, 1:], capacity, demand, solver='sa')
+        capc_cluster.solve(seed=0, num_sweeps=50)
+
+    assert cluster.solution.shape == (6,)
+    assert capc_cluster.result is not None
+
+
+def test_sa_finds_lowest_energy_clustering():
+
+    cost, _, _ = generate_vrp_instance(6, 0)
+    cluster = NodeClustering(6, 2, cost[1:, 1:], solver='sa')
+    cluster.solve(seed=0, num_reads=10, num_sweeps=100)
+
+    # Brute force over all assignments of 6 nodes to 2 clusters
+    samples = np.array(list(product(range(2), repeat=6)))
+    energies = cluster.dqm.energies((samples, list(cluster.variables)))
+
+    assert cluster.solution.shape == (6,)
+    assert cluster.result.first.energy == pytest.approx(energies.min())
+    assert 'run_time' in cluster.result.info
+
+
+def test_kmedoids_separates_distant_groups():
+
+    # Two groups of three nodes with cheap costs within and expensive costs across groups
+    groups = np.array([0, 0, 0, 1, 1, 1])
+    cost = np.where(groups[:, None] == groups[None], 1.0, 100.0)
+    np.fill_diagonal(cost, 0)
+    cluster = NodeClustering(6, 2, cost, solver='kmedoids')
+    cluster.solve(seed=0)
+
+    assert cluster.solution.shape == (6,)
+    assert len(set(cluster.solution[:3])) == 1 and len(set(cluster.solution[3:])) == 1
+    assert cluster.solution[0] != cluster.solution[3]
+
+
+def test_capacitated_kmedoids_respects_capacity():
+
+    # Instance whose unlimited clustering assigns four of six unit demand nodes to one cluster
+    cost, _, _ = generate_vrp_instance(6, 2)
+    solutions = []
+    for capacity in (6, 3):
+        cluster = CapcNodeClustering(6, 2, cost[1:, 1:], [capacity] * 2, np.ones(6), solver='kmedoids')
+        cluster.solve(seed=0)
+        solutions.append(cluster.solution)
+
+    assert np.bincount(solutions[0], minlength=2).max() == 4
+    assert (np.bincount(solutions[1], minlength=2) == 3).all()
+
+
+def test_unknown_solver_raises():
+
+    cost, _, _ = generate_vrp_instance(4, 0)
+    cluster = NodeClustering(4, 2, cost[1:, 1:], solver='sa')
+    with pytest.raises(ValueError):
+        cluster.solve(solver='annealer')
+
+
+@pytest.mark.parametrize('capacity', [1, 2, 3, 5, 8, 13, 64, 100])
+def test_binary_slack_covers_capacity(capacity):
+
+    cost, _, _ = generate_vrp_instance(3, 0)
+    cluster = CapcNodeClustering(3, 1, cost[1:, 1:], [capacity], np.ones(3), slack_encoding='binary')
+    weights = [int(values[1]) for values in cluster.slack_values()[0]]
+
+    # Every slack from 0 to the capacity is reachable, and no larger slack
+    reachable = {int(np.dot(bits, weights)) for bits in product((0, 1), repeat=len(weights))}
+    assert reachable == set(range(capacity + 1))
+    assert len(weights) == capacity.bit_length()
+
+    # Sampled cases encode the unused capacity
+    samples, labels = cluster.sample_cases(np.zeros(3, dtype=int))
+    cases = dict(zip(labels, samples[0]))
+    slack = sum(weight * cases[f'c.0.{b}'] for b, weight in enumerate(weights))
+    assert slack == max(capacity - 3, 0)
+
+
+def test_binary_slack_shrinks_dqm():
+
+    cost, _, _, capacity, demand = generate_cvrp_instance(6, 2, 0)
+    capacity = np.asarray(capacity) * 20
+    unary = CapcNodeClustering(6, 2, cost[1:, 1:], capacity, demand, slack_encoding='unary')
+    binary = CapcNodeClustering(6, 2, cost[1:, 1:], capacity, demand, slack_encoding='binary')
+
+    assert unary.dqm_size()['num_cases'] == binary.dqm_size()['unary_num_cases']
+    assert binary.dqm_size()['num_cases'] < unary.dqm_size()['num_cases']
@@ -0,0 +1,76 @@
+import pytest
+import numpy as np
+
+from build_cache import BuildCache
+from utility import generate_vrp_instance
+from full_qubo_solver import FullQuboSolver
+from average_partition_solver import AveragePartitionSolver
+
+
+def test_quadratic_program_built_from_index_model():
+
+    # Skipping the quadratic program and building it on demand gives the same program
+    cost, _, _ = generate_vrp_instance(4, 0)
+    reference = FullQuboSolver(4, 2, cost, vectorized=True, build_qp=True)
+    vrp = FullQuboSolver(4, 2, cost, vectorized=True)
+
+    assert vrp.qp is None
+    assert vrp.require_quadratic_program().export_as_lp_string() == reference.qp.export_as_lp_string()
+
+
+def test_quadratic_program_without_index_model():
+
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = FullQuboSolver(4, 2, cost, vectorized=True, build_qp=False)
+    vrp.model = None
+
+    with pytest.raises(ValueError, match='build_qp=True'):
+        vrp.require_quadratic_program()
+
+
+def test_quadratic_program_after_build_cache_restore(tmp_path):
+
+    # Instances restored from the on-disk cache rebuild an equivalent quadratic program on demand
+    cost, _, _ = generate_vrp_instance(4, 0)
+    reference = FullQuboSolver(4, 2, cost)
+    FullQuboSolver(4, 2, cost, build_cache=BuildCache(str(tmp_path)))
+    vrp = FullQuboSolver(4, 2, cost, build_cache=BuildCache(str(tmp_path)))
+
+    assert 'qubo_cache_load_time' in vrp.timing
+    assert vrp.qp is None
+    qp = vrp.require_quadratic_program()
+    samples = np.random.default_rng(0).integers(0, 2, (16, qp.get_num_vars()))
+    for sample in samples:
+        assert qp.objective.evaluate(sample) == pytest.approx(reference.qp.objective.evaluate(sample))
+        assert qp.is_feasible(sample) == reference.qp.is_feasible(sample)
+    assert vrp.evaluate_qubo_feasibility(samples[0])[0] == reference.evaluate_qubo_feasibility(samples[0])[0]
+
+
+@pytest.mark.parametrize('solver_cls', [FullQuboSolver, AveragePartitionSolver])
+def test_vectorized_build_defers_quadratic_program(solver_cls):
+
+    # The vectorized build skips the quadratic program by default and compiles the same BQM as the dictionary build
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = solver_cls(4, 2, cost, vectorized=True)
+    reference = solver_cls(4, 2, cost)
+
+    assert vrp.qp is None and reference.qp is not None
+    labels = list(reference.bqm.variables)
+    samples = np.random.default_rng(0).integers(0, 2, (16, len(labels)))
+    assert vrp.bqm.energies((samples, labels)) == pytest.approx(reference.bqm.energies((samples, labels)))
+
+
+def test_feasibility_report_matches_between_model_and_program():
+
+    # An infeasible sample is reported with the same names by the index based model and the quadratic program
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = FullQuboSolver(4, 2, cost, vectorized=True)
+    sample = np.zeros(vrp.variables.size)
+    sample[:3] = 1
+    sample[5] = 2
+    report = vrp.evaluate_qubo_feasibility(sample)
+    vrp.require_quadratic_program()
+
+    assert not report[0] and report[1] == [vrp.variables.reshape(-1)[5]] and report[2]
+    assert all(isinstance(name, str) for name in report[2])
+    assert vrp.evaluate_qubo_feasibility(sample) == report
@@ -0,0 +1,49 @@
+import dimod
+import numpy as np
+import pytest
+
+from qiskit_optimization.converters import QuadraticProgramToQubo
+from utility import generate_vrp_instance
+from qubo_compiler import QuboCompiler
+from sparse_model import SparseModel
+from full_qubo_solver import FullQuboSolver
+from average_partition_solver import AveragePartitionSolver
+from solution_partition_solver import SolutionPartitionSolver
+from route_activation_solver import RouteActivationSolver
+
+
+def qiskit_bqm(qp, penalty):
+
+    # Reference BQM built from the QUBO of qiskit converters
+    qubo = QuadraticProgramToQubo(penalty=penalty).convert(qp)
+    return dimod.BQM(qubo.objective.linear.to_dict(use_name=True), qubo.objective.quadratic.to_dict(use_name=True),
+                     qubo.objective.constant, dimod.BINARY)
+
+
+@pytest.mark.parametrize('solver_cls', [FullQuboSolver, AveragePartitionSolver, SolutionPartitionSolver,
+                                        RouteActivationSolver])
+@pytest.mark.parametrize('penalty', [None, 50.0])
+def test_compiler_matches_qiskit_converters(solver_cls, penalty):
+
+    # The compiled BQM has the same variables and energies as the QUBO of qiskit converters
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = solver_cls(4, 2, cost)
+    bqm = QuboCompiler(penalty=penalty).compile(SparseModel.from_quadratic_program(vrp.qp),
+                                                [variable.name for variable in vrp.qp.variables])
+    reference = qiskit_bqm(vrp.qp, penalty)
+
+    assert set(bqm.variables) == set(reference.variables)
+    labels = list(reference.variables)
+    samples = np.random.default_rng(0).integers(0, 2, (32, len(labels)))
+    assert bqm.energies((samples, labels)) == pytest.approx(reference.energies((samples, labels)))
+
+
+def test_vectorized_build_matches_qiskit_converters():
+
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = FullQuboSolver(4, 2, cost, vectorized=True, constraint_penalty=50.0)
+    reference = qiskit_bqm(vrp.require_quadratic_program(), 50.0)
+
+    labels = list(reference.variables)
+    samples = np.random.default_rng(0).integers(0, 2, (32, len(labels)))
+    assert vrp.bqm.energies((samples, labels)) == pytest.approx(reference.energies((samples, labels)))
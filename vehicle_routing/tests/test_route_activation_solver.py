@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from utility import generate_vrp_instance
+from batch_solver import solve_instance
+from route_activation_solver import CapcRouteActivationSolver
+
+
+def build_solver():
+
+    # RAS takes one capacity for all vehicles
+    cost, _, _ = generate_vrp_instance(3, 0)
+    return (3, 1, cost, 20, np.array([5, 4, 6])), {'solver': 'sa', 'num_reads': 10}
+
+
+def test_capc_unsupported_evaluations_raise():
+
+    args, params = build_solver()
+    vrp = CapcRouteActivationSolver(*args, **params)
+    vrp.solve(seed=0, num_sweeps=100)
+
+    for evaluate in (vrp.evaluate_samples, vrp.evaluate_qubo_feasibility, vrp.evaluate_qubo_feasibility_batch):
+        with pytest.raises(NotImplementedError):
+            evaluate()
+
+
+def test_capc_solve_result_and_batch():
+
+    args, params = build_solver()
+    vrp = CapcRouteActivationSolver(*args, **params)
+    result = vrp.solve_detached(seed=0, num_sweeps=100)
+
+    assert result.routes is None and result.feasible is None
+    assert result.cost == result.vrp.evaluate_vrp_cost()
+
+    summary = solve_instance(0, CapcRouteActivationSolver, args, params, {'seed': 0, 'num_sweeps': 100})
+    assert summary['error'] is None
+    assert summary['routes'] is None and summary['feasible'] is None
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from utility import generate_vrp_instance, generate_cvrp_instance
+from solution_partition_solver import SolutionPartitionSolver, CapcSolutionPartitionSolver
+
+
+def build_solver(solver_cls, partition_all):
+
+    # Instance with enough capacity for the capacitated solver to partition most routes with two vehicles
+    cost, _, _ = generate_vrp_instance(4, 0)
+    if solver_cls is CapcSolutionPartitionSolver:
+        return solver_cls(4, 2, cost, 15, np.array([5, 4, 6, 3]), solver='sa', num_reads=20,
+                          partition_all=partition_all)
+    return solver_cls(4, 2, cost, solver='sa', num_reads=20, partition_all=partition_all)
+
+
+@pytest.mark.parametrize('solver_cls', [SolutionPartitionSolver, CapcSolutionPartitionSolver])
+def test_partition_all_selects_cheapest_partition(solver_cls):
+
+    vrp = build_solver(solver_cls, True)
+    vrp.solve(workers=1, num_sweeps=50, seed=0)
+    vrp_costs = vrp.sample_metrics['vrp_cost']
+
+    # The selected sample has the lowest VRP cost of all samples and the partition reproduces it
+    assert np.isfinite(vrp_costs).any()
+    assert vrp.sample_index == int(np.argmin(vrp_costs))
+    assert vrp.evaluate_vrp_cost() == pytest.approx(vrp_costs.min())
+
+    # Partitioning the selected sample only is never cheaper
+    reference = build_solver(solver_cls, False)
+    reference.solve(workers=1, num_sweeps=50, seed=0)
+    assert 'vrp_cost' not in reference.sample_metrics
+    assert vrp.evaluate_vrp_cost() <= reference.evaluate_vrp_cost() + 1e-9
+
+
+def build_capacitated_solver(n, m, seed):
+
+    # Random demands with a capacity of about a third of the total demand
+    rng = np.random.default_rng(seed)
+    cost, _, _ = generate_vrp_instance(n, seed)
+    demand = rng.integers(1, 10, n)
+    return CapcSolutionPartitionSolver(n, m, cost, int(demand.sum()) // 3 + 9, demand), rng
+
+
+def reference_shortest_walk(dG, sink, m):
+
+    # Hop limited Bellman-Ford over the networkx partition graph, as before the array implementation
+    d = {v: np.inf for v in dG.nodes}
+    d[0] = 0
+    for _ in range(m):
+        d_nextround = dict(d)
+        for u, v, weight in dG.edges(data='weight'):
+            d_nextround[v] = min(d_nextround[v], d[u] + weight)
+        d = d_nextround
+    return d[sink]
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_shortest_walk_matches_networkx(seed):
+
+    import networkx as nx
+
+    vrp, rng = build_capacitated_solver(10, 3, seed)
+    weights, _ = vrp.partition_weights(rng.permutation(10) + 1)
+    dG = nx.DiGraph()
+    dG.add_nodes_from(range(11))
+    dG.add_weighted_edges_from((u, v, weights[u, v]) for u, v in zip(*np.nonzero(np.isfinite(weights))))
+
+    for m in (1, 2, 3, 10):
+        success, path_length, path = vrp.shortest_walk(weights, 10, m)
+        reference = reference_shortest_walk(dG, 10, m)
+        assert success == np.isfinite(reference)
+        if success:
+            assert path_length == pytest.approx(reference)
+            assert path[0] == 0 and path[-1] == 10 and len(path) - 1 <= m
+            assert sum(weights[u, v] for u, v in zip(path[:-1], path[1:])) == pytest.approx(path_length)
+
+    # Without a hop limit the walk is the shortest path
+    assert vrp.shortest_walk(weights, 10, 10)[1] == pytest.approx(nx.dijkstra_path_length(dG, 0, 10))
+
+
+def reference_partition_graph(vrp, route):
+
+    # Partition graph built edge by edge with networkx, as before the prefix sum implementation
+    import networkx as nx
+    G = nx.DiGraph()
+    G.add_nodes_from(range(vrp.n + 1))
+    for i in range(vrp.n + 1):
+        j = i + 1
+        demand = vrp.demand[route[j - 1] - 1] if j <= vrp.n else None
+        cost = vrp.cost[0, route[j - 1]] if j <= vrp.n else None
+        while j <= vrp.n and demand <= vrp.capacity:
+            G.add_edge(i, j, weight=cost + vrp.cost[route[j - 1], 0])
+            j += 1
+            if j <= vrp.n:
+                demand += vrp.demand[route[j - 1] - 1]
+                cost += vrp.cost[route[j - 2], route[j - 1]]
+    return G
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2, 3])
+def test_build_partition_graph_matches_networkx(seed):
+
+    vrp, rng = build_capacitated_solver(10, 3, seed)
+    route = (rng.permutation(10) + 1).tolist()
+    sources, targets, weights = vrp.build_partition_graph(route)
+    reference = reference_partition_graph(vrp, route)
+
+    assert sorted(zip(sources.tolist(), targets.tolist())) == sorted(reference.edges)
+    for u, v, weight in zip(sources, targets, weights):
+        assert weight == pytest.approx(reference.edges[u, v]['weight'])
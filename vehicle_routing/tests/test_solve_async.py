@@ -0,0 +1,52 @@
+import asyncio
+
+from utility import generate_vrp_instance
+from route_activation_solver import RouteActivationSolver
+from solution_partition_solver import SolutionPartitionSolver
+
+
+def test_solve_async_without_route_decoding():
+
+    # RAS has a registry but no route decoding
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = RouteActivationSolver(4, 2, cost, solver='sa', num_reads=20)
+    result = asyncio.run(vrp.solve_async(seed=0, workers=1, num_sweeps=100))
+
+    assert result.routes is None
+    assert result.cost == result.vrp.evaluate_vrp_cost()
+    assert vrp.result is None
+
+
+def test_solve_async_leaves_solver_unchanged():
+
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = SolutionPartitionSolver(4, 2, cost, solver='sa', num_reads=20)
+    result = asyncio.run(vrp.solve_async(seed=0, workers=1, num_sweeps=100))
+
+    assert vrp.result is None and vrp.solution is None
+    assert sorted(node for route in result.routes for node in route) == [1, 2, 3, 4]
+    vrp.apply_result(result)
+    assert vrp.evaluate_vrp_cost() == result.cost
+
+
+def test_concurrent_solves_keep_instrumentation_separate():
+
+    # Concurrent detached solves record spans in their own tracers
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = SolutionPartitionSolver(4, 2, cost, solver='sa', num_reads=20, track_memory=True)
+    spans = len(vrp.tracer.spans)
+
+    async def solve_all():
+        return await asyncio.gather(*[vrp.solve_async(seed=seed, workers=1, num_sweeps=100) for seed in range(8)])
+
+    results = asyncio.run(solve_all())
+    assert len(vrp.tracer.spans) == spans
+    for result in results:
+        assert result.vrp.tracer is not vrp.tracer and result.vrp.memory is not vrp.memory
+        assert 'memory' not in result.timing
+        assert [span['name'] for span in result.spans if span['parent'] is None][0] == 'solve'
+        assert all(span['parent'] is None or span['parent'] < index for index, span in enumerate(result.spans))
+
+    # Applied spans are added to the tracer of the solver
+    vrp.apply_result(results[0])
+    assert len(vrp.tracer.spans) == spans + len(results[0].spans)
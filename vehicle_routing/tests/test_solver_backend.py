@@ -0,0 +1,78 @@
+import os
+import sys
+import subprocess
+import solver_backend
+
+from types import SimpleNamespace
+from utility import generate_vrp_instance
+from qaoa_cache import QaoaCache
+from full_qubo_solver import FullQuboSolver
+from solution_partition_solver import SolutionPartitionSolver
+
+
+def test_sa_merges_reads_of_all_workers():
+
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = FullQuboSolver(4, 2, cost, solver='sa', num_reads=10)
+    vrp.solve(workers=3, num_sweeps=100, seed=0)
+
+    assert len(vrp.result) == 10
+    assert len(vrp.timing['sa_worker_times']) == 3
+    assert vrp.timing['sa_solution_time'] > 0
+    assert vrp.solution.shape == vrp.variables.shape
+
+
+def test_sa_seed_reproducible():
+
+    cost, _, _ = generate_vrp_instance(4, 0)
+    energies = []
+    for _ in range(2):
+        vrp = FullQuboSolver(4, 2, cost, solver='sa', num_reads=6)
+        vrp.solve(workers=2, num_sweeps=100, seed=1)
+        energies.append(vrp.result.record.energy.tolist())
+
+    assert energies[0] == energies[1]
+
+
+def test_sa_path_does_not_import_qiskit():
+
+    # Run in a new interpreter, as other tests import qiskit
+    script = ('import sys\n'
+              'from utility import generate_vrp_instance\n'
+              'from full_qubo_solver import FullQuboSolver\n'
+              'cost, _, _ = generate_vrp_instance(4, 0)\n'
+              'vrp = FullQuboSolver(4, 2, cost, vectorized=True, build_qp=False, solver="sa", num_reads=4)\n'
+              'vrp.solve(workers=1, num_sweeps=10, seed=0)\n'
+              'vrp.evaluate_vrp_cost()\n'
+              'assert not any(name.split(".")[0].startswith("qiskit") for name in sys.modules), "qiskit imported"\n')
+    directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, '-c', script], cwd=directory, check=True)
+
+
+def test_discover_entry_points_before_python_310(monkeypatch):
+
+    # Before Python 3.10, entry_points takes no group and returns a dictionary of groups
+    entry_point = SimpleNamespace(name='exact', value='exact_backend:solve_exact')
+    monkeypatch.setattr(solver_backend, 'entry_points', lambda: {solver_backend.ENTRY_POINT_GROUP: [entry_point]})
+    monkeypatch.setattr(solver_backend, 'sys', SimpleNamespace(version_info=(3, 9)))
+    registry = solver_backend.BackendRegistry()
+
+    assert registry.names() == ['exact']
+    assert registry.targets['exact'] == 'exact_backend:solve_exact'
+
+
+def test_qaoa_cached_statevector_warm_starts():
+
+    cost, _, _ = generate_vrp_instance(3, 0)
+    cache = QaoaCache()
+    warm_starts = []
+    for _ in range(2):
+        vrp = SolutionPartitionSolver(3, 1, cost, solver='qaoa_cached', num_reads=16, qaoa_cache=cache)
+        vrp.solve(simulator='statevector', maxiter=20, seed=0)
+        warm_starts.append(vrp.timing['qaoa_warm_start'])
+
+        assert len(vrp.result) == 16
+        assert vrp.solution.shape == vrp.variables.shape
+        assert 'qaoa_transpile_time' not in vrp.timing
+
+    assert warm_starts == [False, True]
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from utility import generate_vrp_instance
+from full_qubo_solver import FullQuboSolver
+from solution_partition_solver import SolutionPartitionSolver
+
+
+def ground_energy(bqm):
+
+    # Exhaustive search over all samples of a small BQM
+    labels = list(bqm.variables)
+    samples = (np.arange(2 ** len(labels))[:, None] >> np.arange(len(labels))) & 1
+    return bqm.energies((samples.astype(np.int8), labels)).min()
+
+
+@pytest.mark.parametrize('solver_cls, n, seed', [(FullQuboSolver, 3, 0), (FullQuboSolver, 3, 1),
+                                                 (SolutionPartitionSolver, 4, 1), (SolutionPartitionSolver, 4, 2)])
+def test_candidate_edges_keep_optimum_with_fewer_interactions(solver_cls, n, seed):
+
+    cost, _, _ = generate_vrp_instance(n, seed)
+    dense = solver_cls(n, 1, cost, constraint_penalty=200.0)
+    sparse = solver_cls(n, 1, cost, constraint_penalty=200.0, neighbors=2)
+    report = sparse.timing['candidate_edges']
+
+    # The sparsified BQM is smaller and the savings are reported against the dense estimate
+    assert sparse.bqm.num_interactions < dense.bqm.num_interactions
+    assert report['interactions'] == sparse.bqm.num_interactions
+    assert report['saved_interactions'] == report['dense_interactions'] - report['sparse_interactions'] >= 0
+    assert report['saved_memory'] >= 0 and report['build_time'] > 0
+
+    # Both BQMs have the same optimum
+    assert ground_energy(sparse.bqm) == pytest.approx(ground_energy(dense.bqm))
@@ -0,0 +1,58 @@
+from tracer import Tracer
+from utility import generate_vrp_instance
+from full_qubo_solver import FullQuboSolver
+from clustered_tsp_solver import ClusteredTspSolver
+
+
+def test_owned_tracer_keeps_latest_build_and_solve():
+
+    cost, _, _ = generate_vrp_instance(3, 0)
+    vrp = FullQuboSolver(3, 1, cost, solver='sa', num_reads=5)
+    vrp.solve(num_sweeps=50, seed=0)
+    count = len(vrp.tracer.spans)
+    build = [span['name'] for span in vrp.tracer.spans].count('rebuild')
+
+    for seed in range(3):
+        vrp.solve(num_sweeps=50, seed=seed)
+        assert len(vrp.tracer.spans) == count
+    assert [span['name'] for span in vrp.tracer.spans].count('rebuild') == build
+
+    vrp.rebuild()
+    assert [span['name'] for span in vrp.tracer.spans].count('rebuild') == 1
+
+
+def test_shared_tracer_is_not_reset():
+
+    tracer = Tracer()
+    cost, _, _ = generate_vrp_instance(3, 0)
+    vrp = FullQuboSolver(3, 1, cost, solver='sa', num_reads=5, tracer=tracer)
+    vrp.solve(num_sweeps=50, seed=0)
+    count = len(tracer.spans)
+    vrp.solve(num_sweeps=50, seed=0)
+
+    assert len(tracer.spans) > count
+
+
+def test_truncate():
+
+    tracer = Tracer()
+    for name in ('a', 'b', 'c'):
+        with tracer.span(name):
+            pass
+    tracer.truncate(1)
+
+    assert [span['name'] for span in tracer.spans] == ['a']
+    tracer.clear()
+    assert tracer.spans == []
+
+
+def test_owned_tracer_keeps_latest_parallel_cluster_solve():
+
+    cost, _, _ = generate_vrp_instance(4, 0)
+    vrp = ClusteredTspSolver(4, 2, cost, solver='sa', num_reads=5, clustering_solver='kmedoids',
+                             clustering_params={'seed': 0}, parallel_clusters=True)
+    vrp.solve(cluster_executor='thread', num_sweeps=50, seed=0)
+    count = len(vrp.tracer.spans)
+    vrp.solve(cluster_executor='thread', num_sweeps=50, seed=1)
+
+    assert len(vrp.tracer.spans) == count
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from utility import generate_vrp_instance
+from full_qubo_solver import FullQuboSolver
+from average_partition_solver import AveragePartitionSolver
+from solution_partition_solver import SolutionPartitionSolver
+
+
+def assert_same_energies(bqm, reference, seed=0):
+
+    # Both BQMs assign the same energy to random samples over the same variables
+    assert set(bqm.variables) == set(reference.variables)
+    labels = list(reference.variables)
+    samples = np.random.default_rng(seed).integers(0, 2, (32, len(labels)))
+    assert bqm.energies((samples, labels)) == pytest.approx(reference.energies((samples, labels)))
+
+
+@pytest.mark.parametrize('solver_cls', [FullQuboSolver, AveragePartitionSolver, SolutionPartitionSolver])
+@pytest.mark.parametrize('neighbors', [None, 2])
+def test_update_matches_fresh_build(solver_cls, neighbors):
+
+    # Updating the cost matrix gives the same BQM as building the new instance from scratch
+    cost, _, _ = generate_vrp_instance(5, 0)
+    new_cost, _, _ = generate_vrp_instance(5, 1)
+    vrp = solver_cls(5, 2, cost, vectorized=True, neighbors=neighbors)
+    vrp.update(new_cost)
+    reference = solver_cls(5, 2, new_cost, vectorized=True, neighbors=neighbors)
+
+    assert_same_energies(vrp.bqm, reference.bqm)
+    if neighbors is not None:
+        assert (vrp.candidates == reference.candidates).all()
+
+
+def test_penalty_update_matches_fresh_build():
+
+    cost, _, _ = generate_vrp_instance(5, 0)
+    vrp = FullQuboSolver(5, 2, cost, vectorized=True, constraint_penalty=100)
+    vrp.update(constraint_penalty=250)
+    reference = FullQuboSolver(5, 2, cost, vectorized=True, constraint_penalty=250)
+
+    assert_same_energies(vrp.bqm, reference.bqm)
@@ -0,0 +1,23 @@
+import numpy as np
+
+from utility import generate_vrp_instance
+
+
+def test_unseeded_instances_leave_global_state_unchanged():
+
+    np.random.seed(0)
+    generate_vrp_instance(4)
+    draw = np.random.random()
+    np.random.seed(0)
+
+    assert draw == np.random.random()
+
+
+def test_seeded_instances_match_global_seeding():
+
+    # Seeded instances match those generated by seeding the global numpy state
+    cost, xc, yc = generate_vrp_instance(4, 3)
+    np.random.seed(3)
+    reference = (np.random.random(5) - 0.5) * 10
+
+    assert np.allclose(xc, reference)
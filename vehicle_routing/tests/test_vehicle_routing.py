@@ -0,0 +1,23 @@
+import dimod
+import pytest
+
+from utility import generate_cvrp_instance
+from full_qubo_solver import CapcFullQuboSolver
+
+
+def test_cost_excludes_misaligned_slack_penalty():
+
+    cost, _, _, capacity, demand = generate_cvrp_instance(3, 1, 0)
+    vrp = CapcFullQuboSolver(3, 1, cost, capacity, demand, constraint_penalty=100.0)
+
+    # Route 0 -> 1 -> 2 -> 3 -> 0 within capacity, with all slack bits off so that the slack is misaligned
+    sample = {label: 0 for label in vrp.bqm.variables}
+    for step, node in enumerate([1, 2, 3]):
+        sample[vrp.variables[0, node, step]] = 1
+    vrp.result = dimod.SampleSet.from_samples_bqm(sample, vrp.bqm)
+    vrp.extract_best_solution()
+
+    route_cost = cost[0, 1] + cost[1, 2] + cost[2, 3] + cost[3, 0]
+    assert vrp.sample_metrics['feasible'][vrp.sample_index]
+    assert vrp.result.record.energy[vrp.sample_index] > route_cost + 1
+    assert vrp.evaluate_vrp_cost() == pytest.approx(route_cost)
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import threading
+
+from contextlib import contextmanager
+
+
+class Tracer:
+
+    """Records nested timing spans of the stages of a solve with time.perf_counter_ns. Every span is stored as a
+    dictionary with its name, start time and duration in nanoseconds, the index of its parent span in self.spans, the
+    process and thread it ran in and an args dictionary of counts such as variables, interactions or reads. Spans can be
+    exported as JSON or as a Chrome trace, which flame chart viewers such as chrome://tracing or Perfetto display."""
+
+    def __init__(self):
+
+        """Initializes the span store."""
+
+        # Initialize stores
+        self.spans = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+
+        """Excludes the lock and the thread local stacks of open spans when pickling, e.g. to send results between
+        processes."""
+
+        return {'spans': self.spans}
+
+    def __setstate__(self, state):
+
+        """Restores the spans and initializes the lock and empty stacks of open spans."""
+
+        self.spans = state['spans']
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name, **args):
+
+        """Times the enclosed block as a span nested in the innermost open span of the current thread.
+        Args:
+            name: Name of the stage.
+            args: Counts describing the stage, e.g. variables=100. More counts may be added to the yielded dictionary
+                within the block.
+        Yields:
+            The args dictionary of the span.
+        """
+
+        # Open span
+        stack = self.local.__dict__.setdefault('stack', [])
+        record = {'name': name, 'start': time.perf_counter_ns(), 'duration': None,
+                  'parent': stack[-1] if stack else None, 'pid': os.getpid(), 'tid': threading.get_ident(),
+                  'args': args}
+        with self.lock:
+            stack.append(len(self.spans))
+            self.spans.append(record)
+
+        # Close span
+        try:
+            yield args
+        finally:
+            record['duration'] = time.perf_counter_ns() - record['start']
+            stack.pop()
+
+    def extend(self, spans):
+
+        """Adds spans recorded by another tracer, e.g. in a worker process, below the innermost open span of the
+        current thread.
+        Args:
+            spans: List of spans from the spans attribute of another tracer.
+        """
+
+        # Re-index parents
+        stack = self.local.__dict__.setdefault('stack', [])
+        with self.lock:
+            offset = len(self.spans)
+            for record in spans:
+                record = dict(record, args=dict(record['args']))
+                record['parent'] = (stack[-1] if stack else None) if record['parent'] is None else \
+                    record['parent'] + offset
+                self.spans.append(record)
+
+    def clear(self):
+
+        """Removes all spans."""
+
+        self.truncate(0)
+
+    def truncate(self, count):
+
+        """Removes all spans after the first count spans.
+        Args:
+            count: No. of spans to keep.
+        """
+
+        with self.lock:
+            del self.spans[count:]
+
+    def summary(self):
+
+        """Returns the no. of spans and their total duration in nanoseconds per stage name."""
+
+        # Aggregate spans
+        summary = {}
+        for record in self.spans:
+            stage = summary.setdefault(record['name'], {'count': 0, 'duration': 0})
+            stage['count'] += 1
+            stage['duration'] += record['duration'] or 0
+
+        # Return output
+        return summary
+
+    def to_json(self, path=None):
+
+        """Exports the spans as JSON.
+        Args:
+            path: File to write to. Defaults to None, which returns the JSON string instead.
+        """
+
+        return self.dump({'spans': self.spans}, path)
+
+    def to_chrome_trace(self, path=None):
+
+        """Exports the spans in the Chrome trace event format, with times in microseconds.
+        Args:
+            path: File to write to. Defaults to None, which returns the JSON string instead.
+        """
+
+        # Build complete events
+        events = [{'name': record['name'], 'ph': 'X', 'ts': record['start'] / 1e3,
+                   'dur': (record['duration'] or 0) / 1e3, 'pid': record['pid'], 'tid': record['tid'],
+                   'args': record['args']} for record in self.spans]
+
+        # Return output
+        return self.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, path)
+
+    @staticmethod
+    def dump(data, path):
+
+        """Writes data as JSON to a file, or returns the JSON string if no path is supplied."""
+
+        # Return string
+        if path is None:
+            return json.dumps(data, default=str)
+
+        # Write file
+        with open(path, 'w') as file:
+            json.dump(data, file, default=str)
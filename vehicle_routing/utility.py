@@ -1,61 +1,174 @@
 import numpy as np
 
 
-def generate_vrp_instance(n, seed=None):
+def resolve_rng(seed=None, rng=None):
+
+    """Resolve the random number source used by the instance generators without touching the global numpy state.
+    Args:
+        seed: Seed value for random number generator. Seeded instances match those generated by earlier versions,
+            which seeded the global numpy state.
+        rng: A numpy.random.Generator or numpy.random.RandomState to draw from. Overrides seed if supplied.
+    Returns:
+        An object providing a random(size) method. Defaults to a new numpy.random.Generator with a random seed if
+        neither seed nor rng is supplied.
+    """
+
+    # Resolve random number source
+    if rng is not None:
+        return rng
+    elif seed is not None:
+        return np.random.RandomState(seed)
+    else:
+        return np.random.default_rng()
+
+
+def squared_distance_matrix(xc, yc, dtype=np.float64):
+
+    """Evaluate squared euclidean distances between all pairs of points via broadcasting.
+    Args:
+        xc: Array of x coordinates with shape (..., k).
+        yc: Array of y coordinates with shape (..., k).
+        dtype: Data type of the output. Defaults to float64.
+    Returns:
+        An array of shape (..., k, k) containing the squared distances.
+    """
+
+    # Evaluate squared differences in place
+    xc = np.asarray(xc, dtype=dtype)
+    yc = np.asarray(yc, dtype=dtype)
+    instance = xc[..., :, None] - xc[..., None, :]
+    instance *= instance
+    dy = yc[..., :, None] - yc[..., None, :]
+    dy *= dy
+    instance += dy
+
+    # Return output
+    return instance
+
+
+def generate_vrp_instance(n, seed=None, rng=None, dtype=np.float64):
 
     """Generate a random VRP instance.
     Args:
         n: No. of nodes exclusing depot.
         seed: Seed value for random number generator. Defaults to None, which sets a random seed.
+        rng: A numpy.random.Generator to draw from instead of seeding. Defaults to None.
+        dtype: Data type of the coordinates and cost matrix, e.g. np.float32. Defaults to float64.
     Returns:
         A list of (n + 1) x coordinates, a list of (n + 1) y coordinates and an (n + 1) x (n + 1) numpy array as the
         cost matrix.
     """
 
-    # Set seed
-    if seed is not None:
-        np.random.seed(seed)
+    # Resolve random number source
+    rng = resolve_rng(seed, rng)
 
     # Generate VRP instance
-    xc = (np.random.rand(n + 1) - 0.5) * 10
-    yc = (np.random.rand(n + 1) - 0.5) * 10
-    instance = np.zeros((n + 1, n + 1))
-    for ii in range(n + 1):
-        for jj in range(ii + 1, n + 1):
-            instance[ii, jj] = (xc[ii] - xc[jj]) ** 2 + (yc[ii] - yc[jj]) ** 2
-            instance[jj, ii] = instance[ii, jj]
+    xc = ((rng.random(n + 1) - 0.5) * 10).astype(dtype)
+    yc = ((rng.random(n + 1) - 0.5) * 10).astype(dtype)
+    instance = squared_distance_matrix(xc, yc, dtype)
 
     # Return output
     return instance, xc, yc
 
 
-def generate_cvrp_instance(n, m, seed=None):
+def generate_cvrp_instance(n, m, seed=None, rng=None, dtype=np.float64):
 
     """Generate a random CVRP instance.
     Args:
         n: No. of nodes exclusing depot.
         m: No. of vehicles in the problem.
         seed: Seed value for random number generator. Defaults to None, which sets a random seed.
+        rng: A numpy.random.Generator to draw from instead of seeding. Defaults to None.
+        dtype: Data type of the coordinates and cost matrix, e.g. np.float32. Defaults to float64.
     Returns:
         A list of (n + 1) x coordinates, a list of (n + 1) y coordinates, an (n + 1) x (n + 1) numpy array as the
         cost matrix, a list of m capacities for the vehicles and a list of n demads for the nodes.
     """
 
-    # Set seed
-    if seed is not None:
-        np.random.seed(seed)
+    # Resolve random number source
+    rng = resolve_rng(seed, rng)
 
     # Acquire vrp instance
-    instance, xc, yc = generate_vrp_instance(n)
+    instance, xc, yc = generate_vrp_instance(n, rng=rng, dtype=dtype)
 
     # Generate capacity and demand
-    demands = np.random.rand(n) * 10
-    capacities = np.random.rand(m)
-    capacities = 4 * capacities * sum(demands) / sum(capacities)
+    capacities, demands = generate_capacities(m, n, rng)
+
+    # Return output
+    return instance, xc, yc, capacities, demands
+
+
+def generate_capacities(m, n, rng, count=None):
+
+    """Generate random vehicle capacities and node demands.
+    Args:
+        m: No. of vehicles in the problem.
+        n: No. of nodes exclusing depot.
+        rng: Random number source providing a random(size) method.
+        count: No. of instances to generate at once. Defaults to None, which generates a single instance.
+    Returns:
+        Integer arrays of capacities with shape (m,) and demands with shape (n,), with a leading axis of length count
+        if count is supplied.
+    """
+
+    # Generate capacity and demand
+    demands = rng.random(n if count is None else (count, n)) * 10
+    capacities = rng.random(m if count is None else (count, m))
+    capacities = 4 * capacities * demands.sum(axis=-1, keepdims=True) / capacities.sum(axis=-1, keepdims=True)
 
     # Floor data
     demands = np.floor(demands).astype(int)
     capacities = np.floor(capacities).astype(int)
 
     # Return output
-    return instance, xc, yc, capacities, demands
+    return capacities, demands
+
+
+def generate_vrp_instances(n, count, batch_size=16, seed=None, rng=None, dtype=np.float64):
+
+    """Stream random VRP instances in batches, e.g. for benchmark sweeps.
+    Args:
+        n: No. of nodes exclusing depot.
+        count: Total no. of instances to generate.
+        batch_size: Max no. of instances per batch. Defaults to 16.
+        seed: Seed value for a new numpy.random.Generator. Defaults to None, which sets a random seed.
+        rng: A numpy.random.Generator to draw from instead of seeding. Defaults to None.
+        dtype: Data type of the coordinates and cost matrices, e.g. np.float32. Defaults to float64.
+    Yields:
+        A batch of cost matrices with shape (b, n + 1, n + 1), and x and y coordinates with shape (b, n + 1).
+    """
+
+    # Resolve random number source
+    rng = np.random.default_rng(seed) if rng is None else rng
+
+    # Generate batches
+    for start in range(0, count, batch_size):
+        b = min(batch_size, count - start)
+        xc = ((rng.random((b, n + 1)) - 0.5) * 10).astype(dtype)
+        yc = ((rng.random((b, n + 1)) - 0.5) * 10).astype(dtype)
+        yield squared_distance_matrix(xc, yc, dtype), xc, yc
+
+
+def generate_cvrp_instances(n, m, count, batch_size=16, seed=None, rng=None, dtype=np.float64):
+
+    """Stream random CVRP instances in batches, e.g. for benchmark sweeps.
+    Args:
+        n: No. of nodes exclusing depot.
+        m: No. of vehicles in the problem.
+        count: Total no. of instances to generate.
+        batch_size: Max no. of instances per batch. Defaults to 16.
+        seed: Seed value for a new numpy.random.Generator. Defaults to None, which sets a random seed.
+        rng: A numpy.random.Generator to draw from instead of seeding. Defaults to None.
+        dtype: Data type of the coordinates and cost matrices, e.g. np.float32. Defaults to float64.
+    Yields:
+        A batch of cost matrices with shape (b, n + 1, n + 1), x and y coordinates with shape (b, n + 1), capacities
+        with shape (b, m) and demands with shape (b, n).
+    """
+
+    # Resolve random number source
+    rng = np.random.default_rng(seed) if rng is None else rng
+
+    # Generate batches
+    for instances, xc, yc in generate_vrp_instances(n, count, batch_size, rng=rng, dtype=dtype):
+        capacities, demands = generate_capacities(m, n, rng, count=len(instances))
+        yield instances, xc, yc, capacities, demands
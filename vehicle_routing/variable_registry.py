@@ -0,0 +1,196 @@
+import numpy as np
+
+
+class VariableRegistry:
+
+    """Registry mapping variable keys, i.e. tuples of integers such as (vehicle, node, step), to contiguous integer
+    indices and back. Both directions are held as precomputed NumPy arrays, so solutions and whole sample matrices
+    can be decoded with array operations instead of parsing variable names."""
+
+    def __init__(self, keys, fields, prefix='x', delimiter='.'):
+
+        """Initializes the registry and builds the dense lookup table from keys to indices.
+        Args:
+            keys: Integer array of shape (num_variables, len(fields)). Row i holds the key of variable i.
+            fields: Names of the key fields, e.g. ('vehicle', 'node', 'step').
+            prefix: Prefix of the variable names. Defaults to 'x'.
+            delimiter: Delimiter between the prefix and the key fields in variable names. Defaults to '.'.
+        """
+
+        # Store inputs
+        self.fields = tuple(fields)
+        self.keys = np.asarray(keys, dtype=int).reshape(-1, len(self.fields))
+        self.prefix = prefix
+        self.delimiter = delimiter
+
+        # Build dense lookup table
+        self.offset = self.keys.min(axis=0) if len(self.keys) else np.zeros(len(self.fields), dtype=int)
+        shape = self.keys.max(axis=0) - self.offset + 1 if len(self.keys) else np.zeros(len(self.fields), dtype=int)
+        self.lookup = np.full(shape, -1, dtype=int)
+        self.lookup[tuple((self.keys - self.offset).T)] = np.arange(len(self.keys))
+
+        # Initialize caches
+        self._names = None
+        self._label_index = None
+
+    @classmethod
+    def from_product(cls, fields, ranges, prefix='x', delimiter='.'):
+
+        """Builds a registry over the cartesian product of the given ranges, with the last field varying fastest.
+        Args:
+            fields: Names of the key fields.
+            ranges: One iterable of key values per field.
+            prefix: Prefix of the variable names. Defaults to 'x'.
+            delimiter: Delimiter used in variable names. Defaults to '.'.
+        Returns:
+            The VariableRegistry.
+        """
+
+        # Build keys
+        grids = np.meshgrid(*[np.asarray(list(r), dtype=int) for r in ranges], indexing='ij')
+        keys = np.stack([grid.reshape(-1) for grid in grids], axis=1)
+        return cls(keys, fields, prefix, delimiter)
+
+    @classmethod
+    def from_names(cls, names, fields, delimiter='.'):
+
+        """Builds a registry from existing variable names of the form prefix{delimiter}key_1{delimiter}key_2...,
+        parsing every name exactly once.
+        Args:
+            names: Variable names in index order.
+            fields: Names of the key fields.
+            delimiter: Delimiter used in variable names. Defaults to '.'.
+        Returns:
+            The VariableRegistry.
+        """
+
+        # Parse names
+        parts = [name.split(delimiter) for name in names]
+        keys = np.array([[int(p) for p in part[1:]] for part in parts], dtype=int)
+        prefix = parts[0][0] if parts else 'x'
+        return cls(keys.reshape(len(parts), len(fields)), fields, prefix, delimiter)
+
+    def __len__(self):
+
+        """Returns the number of registered variables."""
+
+        return len(self.keys)
+
+    def field(self, name):
+
+        """Returns the values of a key field for all variables in index order.
+        Args:
+            name: Name of the key field.
+        """
+
+        return self.keys[:, self.fields.index(name)]
+
+    def index(self, *keys):
+
+        """Maps keys to variable indices.
+        Args:
+            keys: One integer or integer array per field. Arrays are broadcast against each other.
+        Returns:
+            Variable indices with the broadcast shape of the inputs. Keys that are not registered map to -1.
+        """
+
+        # Resolve positions in the lookup table
+        positions = [np.asarray(key) - offset for key, offset in zip(keys, self.offset)]
+        positions = np.broadcast_arrays(*positions)
+        valid = np.ones(positions[0].shape, dtype=bool)
+        for position, size in zip(positions, self.lookup.shape):
+            valid &= (position >= 0) & (position < size)
+
+        # Look up indices
+        index = np.full(positions[0].shape, -1, dtype=int)
+        index[valid] = self.lookup[tuple(position[valid] for position in positions)]
+        return index
+
+    def names(self):
+
+        """Returns the variable names in index order as a numpy array of strings."""
+
+        # Build names once
+        if self._names is None:
+            self._names = np.array([self.prefix + ''.join(f'{self.delimiter}{k}' for k in key)
+                                    for key in self.keys.tolist()])
+
+        return self._names
+
+    def columns(self, labels):
+
+        """Maps variable labels, e.g. the variables of a sampleset, to variable indices.
+        Args:
+            labels: Iterable of variable names.
+        Returns:
+            Array of variable indices, with -1 for labels that are not registered such as slack variables.
+        """
+
+        # Build label index once
+        if self._label_index is None:
+            self._label_index = {name: i for i, name in enumerate(self.names())}
+
+        return np.array([self._label_index.get(label, -1) for label in labels], dtype=int)
+
+    def samples(self, sampleset):
+
+        """Extracts the sample matrix of a sampleset with columns in index order.
+        Args:
+            sampleset: A dimod SampleSet containing all registered variables.
+        Returns:
+            Array of shape (num_reads, num_variables) taken directly from sampleset.record.sample.
+        """
+
+        # Reorder columns
+        columns = self.columns(sampleset.variables)
+        order = np.empty(len(self), dtype=int)
+        order[columns[columns >= 0]] = np.flatnonzero(columns >= 0)
+        return sampleset.record.sample[:, order]
+
+    def decode_routes(self, samples, group, node, step):
+
+        """Decodes position based samples into routes by ordering the active variables of every group by step.
+        Args:
+            samples: Array of shape (num_samples, num_variables) or (num_variables,) in index order.
+            group: Name of the field identifying a vehicle or cluster, or None if all variables form one route.
+            node: Name of the field holding the visited node.
+            step: Name of the field holding the position within the route.
+        Returns:
+            A list with one entry per sample, each a list with one array of visited nodes per group key, from the
+            smallest to the largest registered group key.
+        """
+
+        # Find active variables
+        samples = np.atleast_2d(samples)
+        reads, active = np.nonzero(samples)
+        nodes = self.field(node)[active]
+        if group is None:
+            num_groups, group_ids = 1, np.zeros_like(active)
+        else:
+            g = self.fields.index(group)
+            num_groups, group_ids = self.lookup.shape[g], self.keys[active, g] - self.offset[g]
+
+        # Sort by sample, group, step and node
+        order = np.lexsort((nodes, self.field(step)[active], group_ids, reads))
+        reads, group_ids, nodes = reads[order], group_ids[order], nodes[order]
+
+        # Split into routes
+        counts = np.bincount(reads * num_groups + group_ids, minlength=len(samples) * num_groups)
+        routes = np.split(nodes, np.cumsum(counts)[:-1])
+        return [routes[r * num_groups:(r + 1) * num_groups] for r in range(len(samples))]
+
+    def decode_edges(self, sample, source, target):
+
+        """Decodes an edge based sample into its list of active edges.
+        Args:
+            sample: Array of num_variables values in index order.
+            source: Name of the field holding the source node of an edge.
+            target: Name of the field holding the target node of an edge.
+        Returns:
+            List of (source, target) tuples of active edges.
+        """
+
+        # Extract active edges
+        active = np.flatnonzero(np.asarray(sample).reshape(-1))
+        return list(zip(self.field(source)[active].tolist(), self.field(target)[active].tolist()))
+
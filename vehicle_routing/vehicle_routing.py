@@ -1,12 +1,25 @@
 import numpy as np
-import dimod
 import time
+import copy
+import asyncio
 
 from functools import partial
+from sparse_model import SparseModel, upper_triangular, candidate_edges
+from qubo_compiler import QuboCompiler
+from variable_registry import VariableRegistry
 from solver_backend import SolverBackend
-from dwave.embedding.chain_strength import uniform_torque_compensation
-from qiskit_optimization.converters import QuadraticProgramToQubo
-from qiskit_optimization.algorithms import OptimizationResult
+from tracer import Tracer
+from memory_monitor import MemoryMonitor, BYTES_PER_INTERACTION
+from solve_result import SolveResult
+
+
+def default_chain_strength(bqm, embedding=None):
+
+    """Evaluates the default chain strength for D-Wave samplers by uniform torque compensation with a prefactor of 2.
+    Defined at module level so that dwave.embedding is only imported when a chain strength is needed."""
+
+    from dwave.embedding.chain_strength import uniform_torque_compensation
+    return uniform_torque_compensation(bqm, embedding, prefactor=2)
 
 
 class VehicleRouter:
@@ -28,6 +41,30 @@ class VehicleRouter:
                 calculation via uniform torque compensation.
             num_reads: Number of samples to read. Defaults to 1000.
             solver: Select a backend solver. Defaults to 'dwave'.
+            build_qp: Set to False to skip building the qiskit quadratic program in solvers with a vectorized build
+                mode. The BQM and the feasibility report are then evaluated from the index based model in self.model,
+                and the quadratic program is only built on demand by require_quadratic_program, e.g. for the qaoa
+                backend. Defaults to False in the vectorized build mode and to True otherwise.
+            embedding_cache: An EmbeddingCache instance used by the dwave backend, which may be shared by instances
+                with the same interaction graph. Defaults to a new in-memory cache per instance.
+            qaoa_cache: A QaoaCache instance used by the qaoa_cached backend, which may be shared by instances to reuse
+                transpiled circuits and warm start variational parameters. Defaults to a new cache per instance.
+            build_cache: A BuildCache instance in which built quadratic structures are looked up before building and
+                stored after building. Instances restored from the cache build their quadratic program on demand from
+                the cached index based model, and builds without an index based model are not cached. Defaults to None.
+            neighbors: Set to k to couple consecutive steps of position based formulations only along the edges to
+                the k nearest neighbours of every node, see sparse_model.candidate_edges. Other edges are charged the
+                max cost. Defaults to None, which couples all edges.
+            tracer: A Tracer instance recording timing spans of the build, solve and post-processing stages, which may
+                be shared by instances and is never cleared by the solver. Defaults to a new tracer per instance, which
+                only keeps the spans of the latest build or update and of the latest solve, see reset_spans.
+            track_memory: Set to True to account the traced and resident memory of the build and solve stages in
+                self.timing['memory'], see MemoryMonitor. Defaults to False.
+            max_memory: Max resident set size of the process in bytes. The estimated peak memory of the build is
+                checked before building, and the resident set size after every build and solve stage, raising a
+                MemoryBudgetError if the budget is exceeded. Defaults to None, which sets no budget.
+            memory_fallback: Set to True to fall back to sparser formulations instead of raising if the estimated
+                build exceeds max_memory, see enforce_memory_budget. Defaults to False.
         """
 
         # Store critical inputs
@@ -37,23 +74,42 @@ class VehicleRouter:
 
         # Extract parameters
         self.penalty = params.setdefault('constraint_penalty', None)
-        self.chain_strength = params.setdefault('chain_strength', partial(uniform_torque_compensation, prefactor=2))
+        self.chain_strength = params.setdefault('chain_strength', default_chain_strength)
         self.num_reads = params.setdefault('num_reads', 1000)
         self.solver = params.setdefault('solver', 'dwave')
+        self.build_qp = params.setdefault('build_qp', True)
+        self.build_cache = params.setdefault('build_cache', None)
+        self.embedding_cache = params.setdefault('embedding_cache', None)
+        self.qaoa_cache = params.setdefault('qaoa_cache', None)
+        self.neighbors = params.setdefault('neighbors', None)
+        self.tracer = params.setdefault('tracer', None) or Tracer()
+        self.own_tracer = params['tracer'] is None
+        self.build_spans = None
+        self.max_memory = params.setdefault('max_memory', None)
+        self.memory_fallback = params.setdefault('memory_fallback', False)
+        self.memory = MemoryMonitor(self.max_memory, params.setdefault('track_memory', False))
 
         # Initialize quadratic structures
         self.qp = None
         self.qubo = None
         self.bqm = None
+        self.model = None
+        self.compiler = None
+        self.registry = None
         self.variables = None
+        self.candidates = None
 
         # Initialize result containers
         self.result = None
         self.solution = None
+        self.sample_index = None
+        self.sample_metrics = None
 
         # Initialize timer
         self.clock = None
         self.timing = {}
+        if self.memory.track:
+            self.timing['memory'] = self.memory.stages
 
         # Initialize backend
         self.backend = SolverBackend(self)
@@ -64,27 +120,66 @@ class VehicleRouter:
     def build_quadratic_program(self):
 
         """Dummy function to be overriden in child class. Required to set self.variables to contain the names of all
-        variables in the form of a numpy array and self.qp to contain the quadratic program to be solved."""
+        variables in the form of a numpy array and self.qp to contain the quadratic program to be solved. Solvers with
+        an index based build may set self.model to a SparseModel instead of, or in addition to, self.qp. Solvers should
+        also set self.registry to a VariableRegistry mapping variable keys to the indices of self.variables."""
 
         # Dummy. Override in child class.
         pass
 
+    def build_objective(self):
+
+        """Dummy function to be overriden in child classes that support incremental cost updates. Required to build the
+        objective function for the current self.cost over the existing variables of self.registry, without building
+        any constraints.
+        Returns:
+            The linear objective coefficients as an array in the index order of self.registry and the quadratic
+            objective coefficients as a scipy sparse matrix, or None if incremental cost updates are not supported.
+        """
+
+        # Dummy. Override in child class.
+        return None
+
     def build_bqm(self):
 
-        """Converts the quadratic program in self.qp to a QUBO by appending all constraints to the objective function
-        in the form of penalties and then builds a BQM from the QUBO for solving by D-Wave."""
+        """Compiles the problem to a QUBO by appending all constraints to the objective function in the form of
+        penalties and builds a BQM for solving by D-Wave. The BQM is compiled from the sparse constraint matrix of the
+        index based model in self.model, which is extracted from self.qp if the solver did not build it directly.
+        Quadratic programs with non-binary variables are converted by qiskit converters instead, in which case the
+        converted QUBO is stored in self.qubo."""
+
+        # Extract index based model from quadratic program
+        if self.model is None and self.qp.get_num_binary_vars() == self.qp.get_num_vars() and \
+                not self.qp.quadratic_constraints:
+            self.model = SparseModel.from_quadratic_program(self.qp)
+
+        # Compile BQM from sparse constraint matrix
+        if self.model is not None:
+            self.qubo = None
+            self.compiler = QuboCompiler(penalty=self.penalty)
+            with self.tracer.span('bqm_build', compiler='sparse') as span:
+                self.bqm = self.compiler.compile(self.model, self.variables.reshape(-1))
+                span.update(variables=self.bqm.num_variables, interactions=self.bqm.num_interactions)
+            return
 
         # Convert to QUBO
-        converter = QuadraticProgramToQubo(penalty=self.penalty)
-        self.qubo = converter.convert(self.qp)
+        import dimod
+        from qiskit_optimization.converters import QuadraticProgramToQubo
+        self.compiler = None
+        with self.tracer.span('qubo_conversion', variables=self.qp.get_num_vars(),
+                              constraints=self.qp.get_num_linear_constraints()):
+            converter = QuadraticProgramToQubo(penalty=self.penalty)
+            self.qubo = converter.convert(self.qp)
 
         # Extract qubo data
-        Q = self.qubo.objective.quadratic.to_dict(use_name=True)
-        g = self.qubo.objective.linear.to_dict(use_name=True)
-        c = self.qubo.objective.constant
+        with self.tracer.span('bqm_build', compiler='qiskit') as span:
+            Q = self.qubo.objective.quadratic.to_dict(use_name=True)
+            g = self.qubo.objective.linear.to_dict(use_name=True)
+            c = self.qubo.objective.constant
 
-        # Build BQM
-        self.bqm = dimod.BQM(g, Q, c, dimod.BINARY)
+            # Build BQM
+            self.bqm = dimod.BQM(g, Q, c, dimod.BINARY)
+            span.update(variables=self.bqm.num_variables, interactions=self.bqm.num_interactions)
 
     def rebuild(self):
 
@@ -92,42 +187,419 @@ class VehicleRouter:
         build_bqm."""
 
         # Begin stopwatch
-        self.clock = time.time()
+        self.clock = time.perf_counter_ns()
+        self.reset_spans(build=True)
+
+        with self.tracer.span('rebuild', solver=type(self).__name__, n=self.n, m=self.m) as span:
+
+            # Select candidate edges and check memory budget
+            self.build_candidates()
+            self.enforce_memory_budget()
+
+            # Load quadratic models from build cache
+            key = None if self.build_cache is None else self.build_cache.fingerprint(self)
+            data = None if key is None else self.build_cache.get(key)
+            if data is not None:
+                with self.tracer.span('build_cache_load'):
+                    self.import_build(data)
+                self.timing['qubo_cache_load_time'] = (time.perf_counter_ns() - self.clock) / 1e3
+                span.update(cached=True, variables=self.bqm.num_variables)
+                return
+
+            # Rebuild quadratic models
+            self.model = None
+            with self.tracer.span('build_quadratic_program') as stage, self.memory.stage('build_quadratic_program'):
+                self.build_quadratic_program()
+                stage.update(variables=int(self.variables.size))
+            with self.memory.stage('build_bqm'):
+                self.build_bqm()
+
+            # Record build time
+            self.timing['qubo_build_time'] = (time.perf_counter_ns() - self.clock) / 1e3
+            span.update(cached=False, variables=self.bqm.num_variables)
+            if self.candidates is not None:
+                self.timing['candidate_edges'].update(interactions=self.bqm.num_interactions,
+                                                      build_time=self.timing['qubo_build_time'])
+
+            # Store quadratic models in build cache, if the quadratic program can be rebuilt from them
+            if key is not None and self.model is not None:
+                self.build_cache.put(key, self.export_build())
+
+    def build_candidates(self):
+
+        """Selects the candidate edges of the current cost matrix into self.candidates if self.neighbors is set, and
+        records their count in self.timing['candidate_edges']. For formulations that estimate their size, the
+        estimated interactions and build memory of the dense and the sparsified formulation and the savings are
+        recorded as well. Called by rebuild and by update whenever the cost matrix changes."""
+
+        # Skip dense formulations
+        if self.neighbors is None:
+            self.candidates = None
+            return
+
+        # Select candidate edges
+        self.candidates = candidate_edges(self.cost, self.neighbors)
+        self.timing['candidate_edges'] = {'num_candidate_edges': int(self.candidates.sum()),
+                                          'num_edges': self.candidates.size}
+
+        # Estimate savings relative to the dense formulation
+        dense, sparse = self.estimate_size(dense=True), self.estimate_size()
+        if dense is not None:
+            dense_memory, sparse_memory = self.estimate_memory(dense=True), self.estimate_memory()
+            self.timing['candidate_edges'].update({
+                'dense_interactions': dense['num_interactions'], 'sparse_interactions': sparse['num_interactions'],
+                'saved_interactions': dense['num_interactions'] - sparse['num_interactions'],
+                'dense_memory': dense_memory, 'sparse_memory': sparse_memory,
+                'saved_memory': dense_memory - sparse_memory})
+
+    def require_quadratic_program(self):
+
+        """Returns the quadratic program in self.qp, building it from the index based model in self.model if it was
+        skipped with build_qp=False or not restored from the build cache.
+        Returns:
+            The quadratic program.
+        Raises:
+            ValueError: If neither a quadratic program nor an index based model is available.
+        """
+
+        # Build quadratic program from index based model
+        if self.qp is None:
+            if self.model is None:
+                raise ValueError('No quadratic program or index based model is available. Rebuild the solver with '
+                                 'build_qp=True and without a build cache.')
+            self.qp = self.model.to_quadratic_program(self.variables.reshape(-1))
+
+        # Return output
+        return self.qp
+
+    def estimate_size(self, dense=False):
+
+        """Dummy function to be overriden in child classes that can estimate their size before building. Required to
+        return an upper bound on the size of the BQM built by rebuild for the current parameters and candidate edges.
+        Args:
+            dense: Set to True to estimate the size with all edges instead of the candidate edges. Defaults to False.
+        Returns:
+            Dictionary containing the no. of variables and the max no. of interactions, or None if the size cannot be
+            estimated before building.
+        """
+
+        # Dummy. Override in child class.
+        return None
+
+    def estimate_memory(self, dense=False):
+
+        """Estimates the peak memory of a build in bytes from the no. of interactions returned by estimate_size, using
+        the per-interaction footprint of index based builds without a quadratic program if selected and of builds with
+        per-term dictionaries otherwise.
+        Args:
+            dense: Set to True to estimate the memory with all edges instead of the candidate edges. Defaults to False.
+        Returns:
+            The estimate in bytes, or None if the size cannot be estimated before building.
+        """
+
+        # Estimate size
+        size = self.estimate_size(dense)
+        if size is None:
+            return None
+
+        # Return output
+        mode = 'sparse' if getattr(self, 'vectorized', False) and not self.build_qp else 'dict'
+        return size['num_interactions'] * BYTES_PER_INTERACTION[mode]
+
+    def enforce_memory_budget(self):
+
+        """Checks the estimated peak memory of the build against self.max_memory before building. If
+        self.memory_fallback is set, sparser formulations are selected until the estimate fits: first the index based
+        build without quadratic program in solvers with a vectorized build mode, then candidate edges to half as many
+        nearest neighbours in every step. The estimate is recorded in self.timing['memory_estimate'] and the fallbacks
+        in self.timing['memory_fallback'].
+        Raises:
+            MemoryBudgetError: If the estimate exceeds the budget after all fallbacks.
+        """
+
+        # Estimate build
+        estimate = self.estimate_memory()
+        if self.max_memory is None or estimate is None:
+            return
+
+        # Fall back to sparser formulations
+        fallbacks = []
+        while self.memory_fallback and not self.memory.fits(estimate):
+
+            # Select index based build
+            if getattr(self, 'vectorized', None) is not None and (not self.vectorized or self.build_qp):
+                self.vectorized, self.build_qp = True, False
+                fallbacks.append('index_build')
+
+            # Select fewer nearest neighbours
+            elif (self.neighbors is None or self.neighbors > 1) and self.n > 1:
+                self.neighbors = max((self.n if self.neighbors is None else min(self.neighbors, self.n)) // 2, 1)
+                self.build_candidates()
+                fallbacks.append(f'neighbors_{self.neighbors}')
 
-        # Rebuild quadratic models
-        self.build_quadratic_program()
-        self.build_bqm()
+            else:
+                break
 
-        # Record build time
-        self.timing['qubo_build_time'] = (time.time() - self.clock) * 1e6
+            # Stop if the formulation does not shrink
+            previous, estimate = estimate, self.estimate_memory()
+            if estimate >= previous:
+                break
+
+        # Record estimate and check budget
+        self.timing['memory_estimate'] = estimate
+        if fallbacks:
+            self.timing['memory_fallback'] = fallbacks
+        self.memory.check('build', estimate)
+
+    def build_inputs(self):
+
+        """Returns the list of inputs that determine the quadratic structures built by rebuild, used to fingerprint
+        instances for the build cache. Child classes with additional inputs extend this list."""
+
+        return [self.n, self.m, self.cost, self.penalty, self.build_qp, self.neighbors]
+
+    def bqm_size(self):
+
+        """Returns the size of the BQM as a dictionary containing the no. of variables, the no. of interactions and
+        the memory of its bias arrays in bytes, e.g. to compare dense and sparsified formulations."""
+
+        # Evaluate size of bias arrays
+        linear, (row, col, quadratic), _ = self.bqm.to_numpy_vectors()
+        nbytes = linear.nbytes + row.nbytes + col.nbytes + quadratic.nbytes
+
+        # Return output
+        return {'num_variables': self.bqm.num_variables, 'num_interactions': self.bqm.num_interactions,
+                'nbytes': nbytes}
+
+    def export_build(self):
+
+        """Exports the BQM, the variables, the registry and the index based model as a dictionary of NumPy arrays for
+        the build cache.
+        Returns:
+            Dictionary of NumPy arrays.
+        """
+
+        # Export BQM in its own variable order
+        labels = list(self.bqm.variables)
+        linear, (row, col, quadratic), offset = self.bqm.to_numpy_vectors(variable_order=labels)
+        data = {'bqm_linear': linear, 'bqm_row': row, 'bqm_col': col, 'bqm_quadratic': quadratic,
+                'bqm_offset': np.array(offset), 'bqm_labels': np.array(labels, dtype=str)}
+
+        # Export variables and registry
+        data.update({'variables': self.variables, 'registry_keys': self.registry.keys,
+                     'registry_fields': np.array(self.registry.fields),
+                     'registry_format': np.array([self.registry.prefix, self.registry.delimiter])})
+
+        # Export index based model
+        if self.model is not None:
+            data.update({f'model_{name}': value for name, value in self.model.to_arrays().items()})
+
+        # Return output
+        return data
+
+    def import_build(self, data):
+
+        """Restores the quadratic structures from a dictionary of NumPy arrays returned by export_build. The quadratic
+        program is not restored, but is built from the restored index based model by require_quadratic_program when
+        needed, e.g. by the QAOA backend. Incremental updates fall back to rebuild.
+        Args:
+            data: Dictionary of NumPy arrays.
+        """
+
+        # Restore variables and registry
+        self.variables = data['variables']
+        prefix, delimiter = data['registry_format'].tolist()
+        self.registry = VariableRegistry(data['registry_keys'], data['registry_fields'].tolist(), prefix, delimiter)
+
+        # Restore index based model
+        model = {name[6:]: value for name, value in data.items() if name.startswith('model_')}
+        self.model = SparseModel.from_arrays(model) if model else None
+
+        # Restore BQM
+        import dimod
+        self.qp = None
+        self.qubo = None
+        self.compiler = None
+        self.bqm = dimod.BQM.from_numpy_vectors(data['bqm_linear'], (data['bqm_row'], data['bqm_col'],
+                                                                     data['bqm_quadratic']),
+                                                float(data['bqm_offset']), dimod.BINARY,
+                                                variable_order=data['bqm_labels'].tolist())
+
+    def update(self, cost_matrix=None, **params):
+
+        """Updates the cost matrix and/or the constraint penalty of an existing problem with the same variables and
+        constraints. Only the objective is rebuilt via build_objective, and only the affected biases of the existing
+        BQM are rewritten by the QUBO compiler. Falls back to rebuild for formulations without incremental support.
+        Records the update time in self.timing['qubo_update_time'].
+        Args:
+            cost_matrix: New (n_clients + 1) x (n_clients + 1) cost matrix. Defaults to None, which keeps the current
+                cost matrix.
+            constraint_penalty: New penalty value to use for constraints in the QUBO. None selects automatic
+                calculation. Defaults to the current penalty.
+        """
+
+        # Begin stopwatch
+        self.clock = time.perf_counter_ns()
+        self.reset_spans(build=True)
+
+        with self.tracer.span('update', cost=cost_matrix is not None) as span:
+
+            # Store inputs and reselect candidate edges of the new costs
+            if cost_matrix is not None:
+                self.cost = np.array(cost_matrix)
+                self.build_candidates()
+            self.penalty = params.setdefault('constraint_penalty', self.penalty)
+
+            # Rebuild objective
+            objective = self.build_objective() if cost_matrix is not None else None
+            if self.compiler is None or (cost_matrix is not None and objective is None):
+                span.update(incremental=False)
+                self.rebuild()
+                self.timing['qubo_update_time'] = (time.perf_counter_ns() - self.clock) / 1e3
+                return
+            if objective is not None:
+                self.model.set_objective(*objective, self.model.constant)
+                if self.qp is not None:
+                    self.qp.minimize(constant=self.model.constant, linear=self.model.linear,
+                                     quadratic=upper_triangular(self.model.quadratic))
+
+            # Update BQM
+            self.compiler.penalty = self.penalty
+            self.bqm = self.compiler.update(self.bqm, self.model)
+            span.update(incremental=True, variables=self.bqm.num_variables)
+
+        # Record update time
+        self.timing['qubo_update_time'] = (time.perf_counter_ns() - self.clock) / 1e3
 
     def extract_solution(self, result_dict):
 
         """Uses a result dictionary mapping variable names to the solved solution to build the self.solution variable
         in the same shape as self.variables and containing the corresponding solutions.
         Args:
-            result_dict: Dictionary mapping variable names to solved values for these variables.
+            result_dict: Dictionary mapping variable names to solved values for these variables, or an array of
+                solved values in the index order of self.registry.
         """
 
-        # Extract solution from result dictionary
+        # Extract solution from sample array or result dictionary
         var_list = self.variables.reshape(-1)
-        self.solution = np.zeros(var_list.shape)
-        for i in range(len(var_list)):
-            self.solution[i] = result_dict[var_list[i]]
+        if isinstance(result_dict, np.ndarray):
+            self.solution = result_dict.astype(float)
+        else:
+            self.solution = np.fromiter((result_dict[var] for var in var_list), dtype=float, count=len(var_list))
 
         # Reshape result
         self.solution = self.solution.reshape(self.variables.shape)
 
+    def extract_best_solution(self):
+
+        """Evaluates every sample in the sampleset stored in self.result and extracts the feasible sample with the
+        lowest routing cost into self.solution. Falls back to the lowest energy sample if no sample is feasible or the
+        formulation has no index based model. The index of the selected read is stored in self.sample_index and the
+        per-read metrics returned by evaluate_samples in self.sample_metrics.
+        Returns:
+            Dictionary mapping variable names to the values of the selected sample.
+        """
+
+        with self.tracer.span('post_processing', samples=len(self.result.record)) as span:
+
+            # Select lowest energy sample by default
+            self.sample_index = int(np.argmin(self.result.record.energy))
+            self.sample_metrics = None
+
+            # Select feasible sample with lowest routing cost
+            if self.model is not None:
+                costs, violations, feasible = self.evaluate_samples(self.result)
+                self.sample_metrics = {'routing_cost': costs, 'violation': violations, 'feasible': feasible}
+                span.update(feasible=int(feasible.sum()))
+                if feasible.any():
+                    self.sample_index = int(np.flatnonzero(feasible)[np.argmin(costs[feasible])])
+
+            # Extract solution
+            result_dict = dict(zip(self.result.variables, self.result.record.sample[self.sample_index].tolist()))
+            self.extract_solution(result_dict)
+            return result_dict
+
+    def evaluate_samples(self, samples=None):
+
+        """Evaluates the routing cost and the constraint violation of many samples at once using the index based model
+        in self.model.
+        Args:
+            samples: Samples to evaluate, in any format accepted by resolve_samples. Defaults to self.solution.
+        Returns:
+            A 3-tuple of arrays with one entry per sample, containing the routing cost excluding constraint penalties,
+            the total constraint violation and a boolean mask of feasible samples.
+        """
+
+        # Evaluate samples
+        samples = self.resolve_samples(samples)
+        costs = self.model.evaluate(samples)
+        violations = self.model.violations(samples)
+
+        # Return output
+        return costs, violations.sum(axis=1), (violations <= self.model.tolerance).all(axis=1)
+
+    def resolve_samples(self, samples=None):
+
+        """Resolves samples to a sample matrix with columns in the index order of self.registry.
+        Args:
+            samples: A dimod SampleSet, an array of shape (num_samples, num_variables) or (num_variables,), or None
+                to use self.solution.
+        Returns:
+            Array of shape (num_samples, num_variables).
+        """
+
+        # Resolve samples
+        import dimod
+        if samples is None:
+            return self.solution.reshape(1, -1)
+        elif isinstance(samples, dimod.SampleSet):
+            return self.registry.samples(samples)
+        else:
+            return np.atleast_2d(samples)
+
+    def decode_routes(self, samples=None):
+
+        """Dummy function to be overriden in child classes with position based formulations. Decodes samples into
+        routes using the array mappings in self.registry.
+        Args:
+            samples: Samples to decode, in any format accepted by resolve_samples. Defaults to self.solution.
+        Returns:
+            A list with one entry per sample, each a list with one array of visited nodes per vehicle.
+        """
+
+        # Dummy. Override in child class.
+        raise NotImplementedError('Route decoding is not supported for this formulation.')
+
+    def decode_solution_routes(self):
+
+        """Decodes self.solution into routes via decode_routes.
+        Returns:
+            A list with one list of visited nodes per vehicle, or None if the formulation does not support route
+            decoding.
+        """
+
+        try:
+            return [route.tolist() for route in self.decode_routes()[0]]
+        except NotImplementedError:
+            return None
+
     def evaluate_vrp_cost(self):
 
-        """Evaluate the optimized VRP cost under the optimized solution stored in self.solution.
+        """Evaluate the optimized VRP cost under the optimized solution stored in self.solution. The routing cost of
+        the selected sample excludes constraint penalties, e.g. of misaligned slack bits, if the sample was evaluated
+        with the index based model, and is its energy otherwise.
         Returns:
             Optimized VRP cost as a float value.
         """
 
-        # Return optimized energy
-        if type(self.result) == OptimizationResult:
+        # Return routing cost or optimized energy
+        import dimod
+        if not isinstance(self.result, dimod.SampleSet):
             return self.result.fval
+        elif self.sample_index is not None and self.sample_metrics is not None:
+            return self.sample_metrics['routing_cost'][self.sample_index]
+        elif self.sample_index is not None:
+            return self.result.record.energy[self.sample_index]
         else:
             return self.result.first.energy
 
@@ -138,8 +610,10 @@ class VehicleRouter:
         Args:
             data: Values of the variables in the solution to be tested. Defaults to self.solution.
         Returns:
-            A 3-tuple containing a boolean value indicating whether the QUBO is feasible or not, a list of variables
-            that violate constraints, and the list of violated constraints. If feasible, (True, [], []) is returned.
+            A 3-tuple containing a boolean value indicating whether the QUBO is feasible or not, a list of names of
+            variables that violate their bounds, and a list of names of violated constraints. If feasible,
+            (True, [], []) is returned. The names are the same whether the index based model or the quadratic program
+            is evaluated.
         """
 
         # Resolve data
@@ -149,7 +623,27 @@ class VehicleRouter:
             data = np.array(data).reshape(-1)
 
         # Get constraint violation data
-        return self.qp.get_feasibility_info(data)
+        if self.qp is None and self.model is not None:
+            return self.model.get_feasibility_info(data, self.variables.reshape(-1))
+        feasible, variables, constraints = self.require_quadratic_program().get_feasibility_info(data)
+
+        # Return names of qiskit variables and constraints
+        return feasible, [variable.name for variable in variables], [constraint.name for constraint in constraints]
+
+    def evaluate_qubo_feasibility_batch(self, samples=None):
+
+        """Evaluates whether the QUBO is feasible under many solutions at once, using the sparse constraint matrix of
+        the index based model in self.model instead of checking every solution with the quadratic program.
+        Args:
+            samples: Solutions to be tested, in any format accepted by resolve_samples. Defaults to self.solution.
+        Returns:
+            A 3-tuple containing a boolean array indicating whether each solution is feasible, a boolean array of shape
+            (num_samples, num_constraints) marking violated constraints and an array counting the solutions that
+            violate each constraint. Constraints are ordered as in self.model.constraint_names.
+        """
+
+        # Get constraint violation data
+        return self.model.get_feasibility_masks(self.resolve_samples(samples))
 
     def solve(self, **params):
 
@@ -161,6 +655,119 @@ class VehicleRouter:
 
         # Resolve solver
         params.setdefault('solver', self.solver)
+        self.reset_spans()
 
         # Solve
-        self.backend.solve(**params)
+        with self.memory.stage('solve'):
+            self.backend.solve(**params)
+
+    def reset_spans(self, build=False):
+
+        """Removes the spans of earlier stages from the tracer of the solver, so that it does not grow over repeated
+        updates and solves. A build or update removes all spans, and a solve removes the spans of earlier solves while
+        keeping the spans of the build. Tracers supplied as the tracer parameter may be shared and are left unchanged.
+        Args:
+            build: Set to True before a build or update and to False before a solve. Defaults to False.
+        """
+
+        # Skip shared tracers
+        if not self.own_tracer:
+            return
+
+        # Remove spans
+        if build:
+            self.tracer.clear()
+            self.build_spans = None
+        elif self.build_spans is None:
+            self.build_spans = len(self.tracer.spans)
+        else:
+            self.tracer.truncate(self.build_spans)
+
+    def detach(self):
+
+        """Returns a shallow copy of the solver that shares the built quadratic structures and the caches of the
+        backend, but has its own result containers, timing dictionary, tracer, memory monitor and backend, so that
+        solving the copy, e.g. in another thread, leaves this instance unchanged. The memory monitor of the copy
+        enforces self.max_memory but does not account stages, as tracemalloc is global to the process and cannot be
+        started and stopped by concurrent solves."""
+
+        # Copy solver
+        vrp = copy.copy(self)
+
+        # Reset result containers
+        vrp.result = None
+        vrp.solution = None
+        vrp.sample_index = None
+        vrp.sample_metrics = None
+
+        # Separate instrumentation
+        vrp.timing = dict(self.timing)
+        vrp.timing.pop('memory', None)
+        vrp.tracer = Tracer()
+        vrp.own_tracer = True
+        vrp.build_spans = None
+        vrp.memory = MemoryMonitor(self.max_memory)
+
+        # Separate backend, sharing its caches
+        vrp.backend = SolverBackend(vrp)
+        vrp.backend.embedding_cache = self.backend.embedding_cache
+        vrp.backend.qaoa_cache = self.backend.qaoa_cache
+
+        # Return output
+        return vrp
+
+    def solve_detached(self, **params):
+
+        """Solves a detached copy of the solver, see detach.
+        Args:
+            params: Parameters to send to the selected backend solver, as in solve.
+        Returns:
+            A SolveResult of the solved copy.
+        """
+
+        vrp = self.detach()
+        vrp.solve(**params)
+        return SolveResult(vrp)
+
+    async def solve_async(self, executor=None, timeout=None, **params):
+
+        """Solves a detached copy of the solver in an executor without blocking the event loop, so that many solves,
+        e.g. waiting in cloud queues, can be in flight at once. This instance is not modified.
+        Cancelling the call or exceeding the timeout stops waiting for the solve and discards its result. A solve
+        that has already started in a thread keeps running until its sampler returns, but it cannot affect this
+        instance.
+        Args:
+            executor: Executor to run the blocking solve in. Defaults to None, which selects the default thread pool
+                of the event loop. Process pools require a picklable solver.
+            timeout: Max no. of seconds to wait for the solve. Defaults to None, which waits indefinitely.
+            params: Parameters to send to the selected backend solver, as in solve.
+        Returns:
+            A SolveResult of the solved copy.
+        Raises:
+            TimeoutError: If the solve does not finish within the timeout.
+        """
+
+        # Run solve in executor
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(executor, partial(self.solve_detached, **params))
+
+        # Wait for result
+        return await asyncio.wait_for(future, timeout)
+
+    def apply_result(self, result):
+
+        """Stores the result containers, timing and any other state set by the solve of a SolveResult in this
+        instance, e.g. the route of SPS, as if it had been solved with solve, and adds its spans to self.tracer.
+        Args:
+            result: A SolveResult returned by solve_detached or solve_async.
+        """
+
+        # Copy solved state
+        for name, value in vars(result.vrp).items():
+            if name not in ('backend', 'memory', 'timing', 'tracer', 'own_tracer', 'build_spans'):
+                setattr(self, name, value)
+
+        # Merge instrumentation, replacing the spans of earlier solves
+        self.timing.update(result.timing)
+        self.reset_spans()
+        self.tracer.extend(result.spans)